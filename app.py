@@ -1,32 +1,51 @@
+import time
+
+# Taken before the heavier imports so --profile-startup can report them.
+_PROCESS_START = time.perf_counter()
+
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
-import requests
 import os
 import sys
-import re
-import urllib3
-import zipfile
-import shutil
 import threading
 import webbrowser
-from PIL import Image, ImageOps, ImageDraw
-from customtkinter import CTkImage
 import io
-from bs4 import BeautifulSoup
-import time
 import json
+from core import (
+    APP_NAME,
+    APP_VERSION,
+    CAPSULE_IMAGE_WIDTH,
+    DEFAULT_REPO,
+    ArchiveCache,
+    ManifestIndex,
+    ManifestStore,
+    SteamInfoCache,
+    TransferMonitor,
+    fetch_steam_app_info,
+    find_lua_files,
+    format_transfer_progress,
+    get_cache_dir,
+    get_game_id_from_content,
+    http_get,
+    read_lua_text,
+)
+from pipeline import PIPELINE_STAGES, UpdatePipeline
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-
-APP_NAME = "Lua Manifest Updater"
-APP_VERSION = "1.0.3"
 WINDOW_WIDTH = 550
-WINDOW_HEIGHT = 830
+WINDOW_HEIGHT = 860
 DEFAULT_OUTPUT_SUBDIR = "Updated Files"
 TELEGRAM_LINK = "https://t.me/FairyRoot"
+AVATAR_PATH = "imgs/FairyRoot.png"
+AVATAR_SIZE = (80, 80)
+STATUS_TICK_MS = 50
+JOB_STATUS_MAX_CHARS = 42
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
 
 
 APP_BG_COLOR = "#222222"
@@ -37,256 +56,148 @@ DND_FRAME_FG_COLOR = "#333333"
 DND_FRAME_BORDER_COLOR = "#5D5FEF"
 
 
-def get_game_id_from_content(content):
-    """Extracts game ID from manifest content using regex."""
-    match = re.search(r'addappid\s*\(\s*(\d+|"(\d+)")', content)
-    if match:
-        game_id = match.group(2) if match.group(2) else match.group(1)
-        return game_id
-    return None
+class StartupProfile:
+    """Records wall-clock checkpoints from process start to a usable window."""
 
+    def __init__(self, start=_PROCESS_START):
+        self.start = start
+        self.marks = []
 
-def download_file(url, filename, status_callback):
-    """Downloads a file from a URL, updating status via callback.
+    def mark(self, label):
+        """Records a checkpoint named ``label`` at the current time."""
+        self.marks.append((label, time.perf_counter()))
 
-    Args:
-        url (str): The URL to download from.
-        filename (str): The local path to save the downloaded file.
-        status_callback (function): Callback to report status (message, color).
+    def report(self):
+        """Prints each checkpoint with its own and its cumulative duration."""
+        print("Startup profile:")
+        previous = self.start
+        for label, stamp in self.marks:
+            step_ms = (stamp - previous) * 1000
+            total_ms = (stamp - self.start) * 1000
+            print(f"  {label:<18} {step_ms:8.1f} ms  (at {total_ms:8.1f} ms)")
+            previous = stamp
 
-    Returns:
-        bool: True if download was successful, False otherwise.
-    """
-    try:
-        status_callback(f"Downloading: {os.path.basename(filename)}...", "orange")
-        response = requests.get(url, verify=False, stream=True, timeout=30)
-        response.raise_for_status()
-        with open(filename, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        status_callback(
-            f"Successfully downloaded {os.path.basename(filename)}", "lightgreen"
-        )
-        return True
-    except requests.exceptions.Timeout:
-        status_callback(
-            f"Error: Download timed out for {os.path.basename(filename)}", "red"
-        )
-        return False
-    except requests.exceptions.RequestException as e:
-        status_callback(f"Error downloading {os.path.basename(filename)}: {e}", "red")
-        return False
-    except Exception as e:
-        status_callback(
-            f"Error during download of {os.path.basename(filename)}: {e}", "red"
-        )
-        return False
 
+class StatusChannel:
+    """Thread-safe mailbox between update threads and the Tk status widgets.
 
-def extract_files_gui(filename, extract_dir, status_callback):
-    """Extracts .manifest files from a zip archive, updating status via callback.
-
-    Args:
-        filename (str): Path to the zip file.
-        extract_dir (str): Directory to extract manifest files into.
-        status_callback (function): Callback to report status.
-
-    Returns:
-        list or None: A list of paths to extracted manifest files, or None on error.
+    Posting only stores the message, progress fraction, download snapshot or
+    per-job status in a slot, so background work never waits for the GUI. The
+    Tk thread drains the slot on a fixed tick and shows the newest values;
+    messages that were superseded before the tick are dropped.
     """
-    try:
-        status_callback("Extracting files...", "orange")
-        os.makedirs(extract_dir, exist_ok=True)
-        extracted_manifests = []
-        with zipfile.ZipFile(filename, "r") as zip_ref:
-            for file_info in zip_ref.infolist():
-                if file_info.filename.startswith("/") or ".." in file_info.filename:
-                    continue
-                if file_info.filename.endswith(".manifest"):
-                    target_path = os.path.join(
-                        extract_dir, os.path.basename(file_info.filename)
-                    )
-                    with zip_ref.open(file_info) as source, open(
-                        target_path, "wb"
-                    ) as target:
-                        shutil.copyfileobj(source, target)
-                    extracted_manifests.append(target_path)
-
-        if not extracted_manifests:
-            status_callback(
-                "Warning: No .manifest files found in the downloaded archive.", "orange"
-            )
-
-        status_callback("Successfully extracted manifest files", "lightgreen")
-        return extracted_manifests
-    except zipfile.BadZipFile:
-        status_callback(
-            f"Error: Downloaded file '{os.path.basename(filename)}' is not a valid zip archive.",
-            "red",
-        )
-        return None
-    except Exception as e:
-        status_callback(f"Error extracting files: {e}", "red")
-        return None
 
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._message = None
+        self._progress = None
+        self._transfer = None
+        self._jobs = {}
+        self.last_message = None
+
+    def post(self, message, color="white"):
+        """Queues ``message`` for display. Safe to call from any thread."""
+        with self._lock:
+            self._message = (message, color)
+            self.last_message = self._message
+
+    def set_progress(self, fraction):
+        """Queues a progress fraction between 0 and 1. Safe from any thread."""
+        with self._lock:
+            self._progress = min(1.0, max(0.0, fraction))
+
+    def set_transfer(self, snapshot):
+        """Queues a TransferMonitor snapshot. Safe to call from any thread."""
+        with self._lock:
+            self._transfer = snapshot
+
+    def post_job(self, key, message, color="white", state=JOB_RUNNING):
+        """Queues the status of the job ``key``. Safe to call from any thread."""
+        with self._lock:
+            self._jobs[key] = (message, color, state)
+
+    def drain(self):
+        """Takes the pending updates.
+
+        Returns:
+            tuple: (message, progress, transfer, jobs). ``message`` is the
+                newest (text, color) tuple, ``progress`` the newest fraction
+                and ``transfer`` the newest download snapshot; each is None if
+                nothing was posted since the last drain. ``jobs`` maps job keys
+                to their newest (text, color, state) tuple.
+        """
+        with self._lock:
+            pending = (self._message, self._progress, self._transfer, self._jobs)
+            self._message = None
+            self._progress = None
+            self._transfer = None
+            self._jobs = {}
+        return pending
 
-def delete_item(item_path):
-    """Deletes a file or directory recursively, without status updates to GUI.
 
-    Args:
-        item_path (str): Path to the file or directory to delete.
+def load_avatar_image(source_path=AVATAR_PATH, size=AVATAR_SIZE):
+    """Returns the round header avatar as a PIL image of ``size``.
 
-    Returns:
-        bool: True if deletion was successful or item didn't exist, False on error.
-    """
-    try:
-        if os.path.exists(item_path):
-            if os.path.isfile(item_path):
-                os.remove(item_path)
-            elif os.path.isdir(item_path):
-                shutil.rmtree(item_path)
-            return True
-        return True
-    except Exception as e:
-        print(f"Warn: Error deleting {os.path.basename(item_path)}: {e}")
-        return False
-
-
-def update_lua_file_gui(
-    original_lua_path, extracted_manifest_paths, game_id, temp_dir, status_callback
-):
-    """Updates the lua file content with new manifest IDs from extracted files.
+    Masking and resizing the full-size source is done once; the result is
+    kept as a small PNG in the cache directory and rebuilt only when the
+    source image is newer than the cached copy.
 
     Args:
-        original_lua_path (str): Path to the original Lua file.
-        extracted_manifest_paths (list): List of paths to extracted .manifest files.
-        game_id (str): The game ID.
-        temp_dir (str): Directory to save the temporary updated Lua file.
-        status_callback (function): Callback to report status.
+        source_path (str): Path to the full-size avatar image.
+        size (tuple): Target (width, height) in pixels.
 
     Returns:
-        str or None: Path to the temporary updated Lua file, or None on error.
+        PIL.Image.Image: The masked RGBA avatar.
     """
-    temp_lua_filename = f"temp_{game_id}_{os.path.basename(original_lua_path)}"
-    temp_lua_filepath = os.path.join(temp_dir, temp_lua_filename)
-    try:
-        status_callback("Updating Lua file with new Manifest IDs...", "orange")
-        with open(original_lua_path, "r", encoding="utf-8") as f:
-            lua_content = f.read()
-
-        manifest_map = {}
-        for manifest_path in extracted_manifest_paths:
-            match = re.match(r"(\d+)_(\d+)\.manifest", os.path.basename(manifest_path))
-            if match:
-                app_id, manifest_id = match.groups()
-                manifest_map[app_id] = manifest_id
-
-        def replace_manifest_id(match):
-            app_id = match.group(1)
-            new_id = manifest_map.get(app_id)
-            return (
-                f'setManifestid({app_id}, "{new_id}", 0)' if new_id else match.group(0)
-            )
-
-        updated_content, num_replacements = re.subn(
-            r'setManifestid\s*\(\s*(\d+)\s*,\s*"(\d+)"\s*,\s*0\s*\)',
-            replace_manifest_id,
-            lua_content,
-        )
-
-        status_msg = (
-            f"Updated {num_replacements} Manifest ID(s)."
-            if num_replacements > 0
-            else "No Manifest IDs needed updating."
-        )
-        status_callback(status_msg, "lightblue")
+    from PIL import Image
 
-        os.makedirs(os.path.dirname(temp_lua_filepath), exist_ok=True)
-        with open(temp_lua_filepath, "w", encoding="utf-8") as f:
-            f.write(updated_content)
-
-        status_callback("Successfully prepared updated Lua file", "lightgreen")
-        return temp_lua_filepath
-
-    except FileNotFoundError:
-        status_callback(
-            f"Error: Original Lua file not found at {original_lua_path}", "red"
-        )
-        return None
-    except Exception as e:
-        status_callback(f"Error updating lua file: {e}", "red")
-        if os.path.exists(temp_lua_filepath):
-            delete_item(temp_lua_filepath)
-        return None
-
-
-def zip_files_gui(
-    output_zip_path,
-    updated_lua_path,
-    game_id,
-    extracted_manifest_paths,
-    status_callback,
-):
-    """Zips the updated lua file and extracted manifest files.
-
-    Args:
-        output_zip_path (str): Path for the output zip file.
-        updated_lua_path (str): Path to the updated Lua file.
-        game_id (str): The game ID.
-        extracted_manifest_paths (list): List of paths to extracted .manifest files.
-        status_callback (function): Callback to report status.
-
-    Returns:
-        bool: True if zipping was successful, False otherwise.
-    """
+    source_mtime = os.path.getmtime(source_path)
+    base_name = os.path.splitext(os.path.basename(source_path))[0]
+    cache_path = None
     try:
-        status_callback(
-            f"Creating final zip: {os.path.basename(output_zip_path)}...", "orange"
+        cache_path = os.path.join(
+            get_cache_dir("assets"), f"{base_name}-{size[0]}x{size[1]}.png"
         )
-        os.makedirs(os.path.dirname(output_zip_path), exist_ok=True)
-
-        with zipfile.ZipFile(output_zip_path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
-            if updated_lua_path and os.path.exists(updated_lua_path):
-                zip_ref.write(updated_lua_path, f"{game_id}.lua")
-            else:
-                status_callback(
-                    "Error: Temporary updated Lua file not found for zipping.", "red"
-                )
-                return False
-
-            manifest_added = False
-            for manifest_path in extracted_manifest_paths:
-                if os.path.exists(manifest_path):
-                    zip_ref.write(manifest_path, os.path.basename(manifest_path))
-                    manifest_added = True
-
-            if not manifest_added and extracted_manifest_paths:
-                status_callback(
-                    "Warning: No extracted .manifest files were added to the zip (they might be missing).",
-                    "orange",
-                )
-
-        status_callback(
-            f"Successfully created {os.path.basename(output_zip_path)}", "lightgreen"
-        )
-        return True
-    except Exception as e:
-        status_callback(f"Error creating zip file: {e}", "red")
-        return False
+        if os.path.getmtime(cache_path) >= source_mtime:
+            cached_image = Image.open(cache_path)
+            cached_image.load()
+            if cached_image.size == tuple(size):
+                return cached_image
+    except OSError:
+        pass
+
+    from PIL import ImageDraw, ImageOps
+
+    original_image = Image.open(source_path).convert("RGBA")
+    mask = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(mask)
+    draw.ellipse((0, 0) + tuple(size), fill=255)
+    masked_image = ImageOps.fit(original_image, size, centering=(0.5, 0.5))
+    masked_image.putalpha(mask)
+
+    if cache_path:
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            masked_image.save(temp_path, format="PNG")
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"Warn: Could not cache header image: {e}")
+    return masked_image
 
 
 class App(TkinterDnD.Tk):
     """Main application class for Lua Manifest Updater."""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, startup_profile=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.startup_profile = startup_profile
+        self._startup_finished = False
 
         self.selected_file_path = ctk.StringVar()
         self.repos_config = {}
         self.selected_repo_key = ctk.StringVar()
-
-        self._load_repos_config()
+        self.race_repos_enabled = ctk.BooleanVar(value=False)
+        self.include_extras_enabled = ctk.BooleanVar(value=False)
 
         try:
             desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
@@ -302,6 +213,20 @@ class App(TkinterDnD.Tk):
         self.status_message = ctk.StringVar(value="Select or drop a .lua file")
         self.is_processing = False
         self.current_game_id = None
+        self.archive_cache = None
+        self.manifest_store = None
+        self.manifest_index = None
+        self.pipeline = None
+        self.status_channel = StatusChannel()
+        self._stage_progress = 0.0
+        self._transfer_fraction = 0.0
+        self.job_rows = {}
+        self.job_list_frame = None
+        self.batch_running = False
+        self._pending_jobs = []
+        self._jobs_lock = threading.Lock()
+        self.steam_info_cache = SteamInfoCache()
+        threading.Thread(target=self.steam_info_cache.load, daemon=True).start()
 
         self.title(f"{APP_NAME} v{APP_VERSION}")
         self.geometry(f"{WINDOW_WIDTH}x{WINDOW_HEIGHT}")
@@ -323,50 +248,16 @@ class App(TkinterDnD.Tk):
         )
         self.header_frame.pack(pady=(5, 10), padx=10, fill="x")
 
-        try:
-            img_path = "imgs/FairyRoot.png"
-            original_image = Image.open(img_path).convert("RGBA")
-            size = (80, 80)
-
-            mask = Image.new("L", size, 0)
-            draw = ImageDraw.Draw(mask)
-            draw.ellipse((0, 0) + size, fill=255)
-
-            masked_image = ImageOps.fit(original_image, size, centering=(0.5, 0.5))
-            masked_image.putalpha(mask)
-
-            self.fairyroot_image = CTkImage(
-                light_image=masked_image, dark_image=masked_image, size=size
-            )
-
-            self.image_label = ctk.CTkLabel(
-                self.header_frame, text="", image=self.fairyroot_image, cursor="hand2"
-            )
-            self.image_label.pack(side="left", padx=15, pady=10)
-            self.image_label.bind("<Button-1>", lambda e: self.join_telegram())
-
-        except FileNotFoundError:
-            print(f"Warning: Header image not found at {img_path}")
-            self.image_label = ctk.CTkLabel(
-                self.header_frame,
-                text="[IMG]",
-                width=size[0],
-                height=size[1],
-                cursor="hand2",
-            )
-            self.image_label.pack(side="left", padx=15, pady=10)
-            self.image_label.bind("<Button-1>", lambda e: self.join_telegram())
-        except Exception as e:
-            print(f"Error loading header image: {e}")
-            self.image_label = ctk.CTkLabel(
-                self.header_frame,
-                text="[ERR]",
-                width=size[0],
-                height=size[1],
-                cursor="hand2",
-            )
-            self.image_label.pack(side="left", padx=15, pady=10)
-            self.image_label.bind("<Button-1>", lambda e: self.join_telegram())
+        self.fairyroot_image = None
+        self.image_label = ctk.CTkLabel(
+            self.header_frame,
+            text="",
+            width=AVATAR_SIZE[0],
+            height=AVATAR_SIZE[1],
+            cursor="hand2",
+        )
+        self.image_label.pack(side="left", padx=15, pady=10)
+        self.image_label.bind("<Button-1>", lambda e: self.join_telegram())
 
         self.text_frame = ctk.CTkFrame(self.header_frame, fg_color="transparent")
         self.text_frame.pack(side="left", fill="x", expand=True, pady=10, padx=(0, 10))
@@ -428,22 +319,36 @@ class App(TkinterDnD.Tk):
         )
         self.repo_label.pack(pady=(10, 0))
 
-        dropdown_values = (
-            list(self.repos_config.keys()) if self.repos_config else ["N/A"]
-        )
         self.repo_dropdown = ctk.CTkOptionMenu(
             self.file_repo_frame,
             variable=self.selected_repo_key,
-            values=dropdown_values,
+            values=["Loading..."],
             command=self.on_repo_select,
             width=180,
             height=35,
             font=ctk.CTkFont(size=14),
         )
-        if not self.repos_config:
-            self.repo_dropdown.set("N/A")
-            self.repo_dropdown.configure(state="disabled")
-        self.repo_dropdown.pack(pady=(5, 10))
+        self.repo_dropdown.set("Loading...")
+        self.repo_dropdown.configure(state="disabled")
+        self.repo_dropdown.pack(pady=(5, 5))
+
+        self.race_repos_checkbox = ctk.CTkCheckBox(
+            self.file_repo_frame,
+            text="Try all repositories",
+            variable=self.race_repos_enabled,
+            font=ctk.CTkFont(size=12),
+            text_color="gray",
+        )
+        self.race_repos_checkbox.pack(pady=(0, 5))
+
+        self.include_extras_checkbox = ctk.CTkCheckBox(
+            self.file_repo_frame,
+            text="Include unreferenced manifests",
+            variable=self.include_extras_enabled,
+            font=ctk.CTkFont(size=12),
+            text_color="gray",
+        )
+        self.include_extras_checkbox.pack(pady=(0, 10))
 
         self.output_action_frame = ctk.CTkFrame(
             self.main_frame,
@@ -517,6 +422,15 @@ class App(TkinterDnD.Tk):
         )
         self.status_label.pack(pady=8, padx=10, fill="x")
 
+        self.progress_bar = ctk.CTkProgressBar(self.status_display_frame, height=8)
+        self.progress_bar.set(0)
+        self.progress_label = ctk.CTkLabel(
+            self.status_display_frame,
+            text="",
+            font=ctk.CTkFont(size=11),
+            text_color="gray",
+        )
+
         self.dnd_frame = ctk.CTkFrame(
             self.main_frame,
             border_width=2,
@@ -545,6 +459,43 @@ class App(TkinterDnD.Tk):
         self.dnd_placeholder_label.drop_target_register(DND_FILES)
         self.dnd_placeholder_label.dnd_bind("<<Drop>>", self.handle_drop)
 
+        if self.startup_profile:
+            self.startup_profile.mark("widgets built")
+        self.bind("<Map>", self._on_first_map, add="+")
+        self.after(STATUS_TICK_MS, self._drain_status)
+
+    def _on_first_map(self, event):
+        """Schedules the deferred startup work once the window is on screen."""
+        if event.widget is not self or self._startup_finished:
+            return
+        self._startup_finished = True
+        self.after_idle(self._finish_startup)
+
+    def _finish_startup(self):
+        """Loads the repository list and header image after the first paint."""
+        if self.startup_profile:
+            self.startup_profile.mark("first paint")
+        self._load_repos_config()
+        self._load_header_image()
+        if self.startup_profile:
+            self.startup_profile.mark("assets loaded")
+            self.startup_profile.report()
+
+    def _load_header_image(self):
+        """Puts the round avatar into the header, or a text fallback."""
+        try:
+            masked_image = load_avatar_image()
+            self.fairyroot_image = ctk.CTkImage(
+                light_image=masked_image, dark_image=masked_image, size=AVATAR_SIZE
+            )
+            self.image_label.configure(image=self.fairyroot_image)
+        except FileNotFoundError:
+            print(f"Warning: Header image not found at {AVATAR_PATH}")
+            self.image_label.configure(text="[IMG]")
+        except Exception as e:
+            print(f"Error loading header image: {e}")
+            self.image_label.configure(text="[ERR]")
+
     def _load_repos_config(self):
         """Loads repository configuration from repo.json.
         Sets default repository and updates dropdown options.
@@ -636,7 +587,8 @@ class App(TkinterDnD.Tk):
         ):
             current_keys = list(self.repos_config.keys())
             self.repo_dropdown.configure(
-                values=current_keys if current_keys else ["N/A"]
+                values=current_keys if current_keys else ["N/A"],
+                state="disabled" if self.is_processing else "normal",
             )
             if self.selected_repo_key.get() in current_keys:
                 self.repo_dropdown.set(self.selected_repo_key.get())
@@ -677,7 +629,7 @@ class App(TkinterDnD.Tk):
         """Updates the DND frame with game info or an error message.
         Uses CTkTextbox for description. Click to refresh for actual errors.
         """
-        if not self.dnd_frame.winfo_exists():
+        if not self.dnd_frame.winfo_exists() or self.job_list_frame is not None:
             return
         self._clear_dnd_area()
 
@@ -745,7 +697,7 @@ class App(TkinterDnD.Tk):
 
     def _show_dnd_placeholder(self, text="Drag and drop .lua file here"):
         """Displays the default placeholder text in the DND area."""
-        if not self.dnd_frame.winfo_exists():
+        if not self.dnd_frame.winfo_exists() or self.job_list_frame is not None:
             return
         self._clear_dnd_area()
         self.dnd_placeholder_label = ctk.CTkLabel(
@@ -762,68 +714,49 @@ class App(TkinterDnD.Tk):
         )
 
     def _fetch_game_info_thread(self, game_id):
-        """Fetches game info (image, description) from Steam widget in a background thread."""
-        widget_url = f"https://store.steampowered.com/widget/{game_id}/"
-        headers = {"User-Agent": "Mozilla/5.0", "Accept-Language": "en-US,en;q=0.5"}
-        image_url, description, error_msg, ctk_image = None, None, None, None
-
-        try:
-            response = requests.get(
-                widget_url, headers=headers, timeout=10, verify=False
-            )
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-            desc_div = soup.find("div", class_="desc")
-
-            if desc_div:
-                img_tag = desc_div.find("img", class_="capsule")
-                if img_tag and img_tag.get("src"):
-                    image_url = img_tag["src"]
-
-                link_tag = desc_div.find("a")
-                if link_tag:
-
-                    name_span = link_tag.find("span", class_="title")
-                    if name_span:
-                        description = name_span.get_text(strip=True)
-                    else:
-                        description = link_tag.get_text(strip=True)
+        """Fetches game info (image, description) in a background thread.
 
-                if not description or len(description) < 5:
-                    description = desc_div.get_text(separator=" ", strip=True)
-                    if img_tag:
-                        img_alt_text = img_tag.get("alt", "")
-                        if img_alt_text:
-                            description = description.replace(img_alt_text, "").strip()
+        Uses the Steam info cache when possible and only scrapes the Steam
+        widget for unknown or expired app IDs.
+        """
+        description, error_msg, ctk_image = None, None, None
 
-                if not description:
-                    description = f"Game ID: {game_id}"
-            else:
-                error_msg = f"Game info not found for ID: {game_id}"
+        cached = self.steam_info_cache.get(game_id)
+        from PIL import Image
 
+        if cached:
+            description = cached["description"]
+            if cached["image"]:
+                try:
+                    pil_image = Image.open(io.BytesIO(cached["image"]))
+                    ctk_image = self._make_capsule_image(pil_image)
+                except Exception as img_e:
+                    print(f"Error loading cached image for {game_id}: {img_e}")
+        else:
+            title, description, image_url, error_msg = fetch_steam_app_info(game_id)
+            image_png = None
             if image_url:
                 try:
-                    img_response = requests.get(image_url, timeout=10, verify=False)
+                    img_response = http_get(image_url, timeout=10)
                     img_response.raise_for_status()
                     pil_image = Image.open(io.BytesIO(img_response.content))
-                    target_width = 184
-                    scale = target_width / pil_image.width
-                    target_height = int(pil_image.height * scale)
-                    ctk_image = ctk.CTkImage(
-                        light_image=pil_image,
-                        dark_image=pil_image,
-                        size=(target_width, target_height),
+                    target_height = int(
+                        pil_image.height * CAPSULE_IMAGE_WIDTH / pil_image.width
                     )
+                    pil_image = pil_image.convert("RGBA").resize(
+                        (CAPSULE_IMAGE_WIDTH, target_height)
+                    )
+                    png_buffer = io.BytesIO()
+                    pil_image.save(png_buffer, format="PNG")
+                    image_png = png_buffer.getvalue()
+                    ctk_image = self._make_capsule_image(pil_image)
                 except Exception as img_e:
                     print(f"Error downloading/processing image for {game_id}: {img_e}")
                     ctk_image = None
-
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Network error fetching game info for {game_id}."
-            print(f"{error_msg} Details: {e}")
-        except Exception as e:
-            error_msg = f"Error parsing game info for {game_id}."
-            print(f"{error_msg} Details: {e}")
+            if error_msg is None:
+                self.steam_info_cache.put(
+                    game_id, title, description, image_url, image_png
+                )
 
         try:
             self.after(
@@ -832,50 +765,59 @@ class App(TkinterDnD.Tk):
         except tk.TclError:
             print("App window closed before game info update could be scheduled.")
 
+    @staticmethod
+    def _make_capsule_image(pil_image):
+        """Wraps a capsule image in a CTkImage scaled to the capsule width."""
+        target_height = int(pil_image.height * CAPSULE_IMAGE_WIDTH / pil_image.width)
+        return ctk.CTkImage(
+            light_image=pil_image,
+            dark_image=pil_image,
+            size=(CAPSULE_IMAGE_WIDTH, target_height),
+        )
+
     def _start_fetch_game_info(self, filepath):
-        """Reads Lua file, extracts Game ID, and starts fetching game info if ID found."""
-        game_id = None
+        """Reads the Lua file's Game ID in the background, then fetches its info.
+
+        Large files are read off the GUI thread so the window stays responsive.
+        """
+        threading.Thread(
+            target=self._read_game_id_thread, args=(filepath,), daemon=True
+        ).start()
+
+    def _read_game_id_thread(self, filepath):
+        """Extracts the Game ID of ``filepath`` and hands it to the GUI thread."""
+        game_id, error_msg = None, None
+        if not os.path.isfile(filepath):
+            error_msg = "Selected file no longer exists."
+        else:
+            try:
+                game_id = get_game_id_from_content(read_lua_text(filepath))
+                if not game_id:
+                    error_msg = "Could not find Game ID in file."
+            except Exception as e:
+                error_msg = f"Error reading file: {e}"
         try:
-            if not os.path.isfile(filepath):
-                self.after(
-                    0,
-                    self._update_dnd_area_display,
-                    None,
-                    None,
-                    "Selected file no longer exists.",
-                )
-                return
-
-            with open(filepath, "r", encoding="utf-8") as f:
-                content = f.read()
-            game_id = get_game_id_from_content(content)
-
-            if game_id:
-                self.current_game_id = game_id
-                self.after(
-                    0,
-                    self._update_dnd_area_display,
-                    None,
-                    None,
-                    f"Loading info for Game ID: {game_id}...",
-                )
-                threading.Thread(
-                    target=self._fetch_game_info_thread, args=(game_id,), daemon=True
-                ).start()
-            else:
-                self.current_game_id = None
-                self.after(
-                    0,
-                    self._update_dnd_area_display,
-                    None,
-                    None,
-                    "Could not find Game ID in file.",
-                )
-        except Exception as e:
-            self.current_game_id = None
-            self.after(
-                0, self._update_dnd_area_display, None, None, f"Error reading file: {e}"
-            )
+            self.after(0, self._apply_game_id, filepath, game_id, error_msg)
+        except (tk.TclError, RuntimeError):
+            print("App window closed before the Game ID could be shown.")
+
+    def _apply_game_id(self, filepath, game_id, error_msg):
+        """Shows the Game ID read from ``filepath`` and starts fetching its info.
+
+        Results for a file that is no longer selected are ignored.
+        """
+        if filepath != self.selected_file_path.get():
+            return
+        self.current_game_id = game_id
+        if not game_id:
+            self._update_dnd_area_display(None, None, error_msg)
+            return
+        self._update_dnd_area_display(
+            None, None, f"Loading info for Game ID: {game_id}..."
+        )
+        threading.Thread(
+            target=self._fetch_game_info_thread, args=(game_id,), daemon=True
+        ).start()
 
     def _retry_fetch_game_info(self, event=None):
         """Retries fetching game info if a file is currently selected."""
@@ -900,28 +842,129 @@ class App(TkinterDnD.Tk):
         self._start_fetch_game_info(filepath)
 
     def update_status(self, message, color="white"):
-        """Updates the status label text and color on the GUI thread."""
-
-        def _update():
-            if hasattr(self, "status_label") and self.status_label.winfo_exists():
-                self.status_message.set(message)
-                self.status_label.configure(text_color=color)
-            if (
-                hasattr(self, "output_path_label")
-                and self.output_path_label.winfo_exists()
-                and "Saved in:" in message
-            ):
-                try:
-                    saved_path = message.split("Saved in: ")[1]
-                    if os.path.dirname(saved_path):
-                        self.output_folder_path.set(os.path.dirname(saved_path))
-                except IndexError:
-                    pass
+        """Shows a status message. Safe to call from any thread.
 
+        The message is posted to the status channel and shown at the next
+        status tick, unless a newer message replaces it first.
+        """
+        self.status_channel.post(message, color)
+
+    def _drain_status(self):
+        """Applies pending status updates; runs every STATUS_TICK_MS on Tk."""
+        message, progress, transfer, jobs = self.status_channel.drain()
         try:
-            self.after(0, _update)
+            if message is not None:
+                self._apply_status(*message)
+            for key, (job_message, color, state) in jobs.items():
+                self._apply_job_status(key, job_message, color, state)
+            if progress is not None:
+                self._stage_progress = progress
+                self._transfer_fraction = 0.0
+            if transfer is not None:
+                self._transfer_fraction = (
+                    (transfer["fraction"] or 0.0) if transfer["active"] else 0.0
+                )
+                self.progress_label.configure(text=format_transfer_progress(transfer))
+            if progress is not None or transfer is not None:
+                # A single file's running download fills its share of the
+                # download stage; batches advance per finished stage only.
+                share = 0.0
+                if not self.batch_running:
+                    share = self._transfer_fraction / len(PIPELINE_STAGES)
+                self.progress_bar.set(min(1.0, self._stage_progress + share))
+            self.after(STATUS_TICK_MS, self._drain_status)
         except tk.TclError:
-            print("App window closed, cannot update status.")
+            print("App window closed, status updates stopped.")
+
+    def _apply_status(self, message, color):
+        """Sets the status label text and color."""
+        if self.status_label.winfo_exists():
+            self.status_message.set(message)
+            self.status_label.configure(text_color=color)
+        if self.output_path_label.winfo_exists() and "Saved in:" in message:
+            try:
+                saved_path = message.split("Saved in: ")[1]
+                if os.path.dirname(saved_path):
+                    self.output_folder_path.set(os.path.dirname(saved_path))
+            except IndexError:
+                pass
+
+    def _show_job_list(self):
+        """Replaces the DND area content with the list of queued jobs."""
+        if self.job_list_frame is not None:
+            return
+        self._clear_dnd_area()
+        self.current_game_id = None
+        self.job_list_frame = ctk.CTkScrollableFrame(
+            self.dnd_frame, fg_color="transparent"
+        )
+        self.job_list_frame.grid(
+            row=0, column=0, rowspan=2, sticky="nsew", padx=5, pady=5
+        )
+        self.job_list_frame.grid_columnconfigure(0, weight=1)
+        self.job_list_frame.drop_target_register(DND_FILES)
+        self.job_list_frame.dnd_bind("<<Drop>>", self.handle_drop)
+
+    def _clear_job_list(self):
+        """Removes the job list and shows the DND placeholder again."""
+        if self.job_list_frame is None:
+            return
+        self.job_list_frame.destroy()
+        self.job_list_frame = None
+        self.job_rows = {}
+        with self._jobs_lock:
+            self._pending_jobs = []
+        self._show_dnd_placeholder()
+
+    def _add_jobs(self, lua_paths):
+        """Adds a status row per .lua file to the job list and queues it.
+
+        Files that are already queued or running are skipped; finished ones
+        are queued again.
+
+        Returns:
+            int: The number of files queued.
+        """
+        self._show_job_list()
+        queued = []
+        for path in lua_paths:
+            row = self.job_rows.get(path)
+            if row is not None and row["state"] in (JOB_QUEUED, JOB_RUNNING):
+                continue
+            if row is None:
+                index = len(self.job_rows)
+                name_label = ctk.CTkLabel(
+                    self.job_list_frame,
+                    text=os.path.basename(path),
+                    font=ctk.CTkFont(size=12),
+                    anchor="w",
+                )
+                name_label.grid(row=index, column=0, sticky="w", padx=(5, 10))
+                status_label = ctk.CTkLabel(
+                    self.job_list_frame, text="", font=ctk.CTkFont(size=11), anchor="e"
+                )
+                status_label.grid(row=index, column=1, sticky="e", padx=(0, 5))
+                self.job_rows[path] = {"status_label": status_label}
+            self._apply_job_status(path, "Queued", "gray", JOB_QUEUED)
+            queued.append(path)
+        with self._jobs_lock:
+            self._pending_jobs.extend(queued)
+        return len(queued)
+
+    def _apply_job_status(self, key, message, color, state):
+        """Shows the status of one job in its row of the job list."""
+        row = self.job_rows.get(key)
+        if row is None:
+            return
+        row["state"] = state
+        first_line = message.splitlines()[0] if message else ""
+        if len(first_line) > JOB_STATUS_MAX_CHARS:
+            first_line = first_line[: JOB_STATUS_MAX_CHARS - 3] + "..."
+        row["status_label"].configure(text=first_line, text_color=color)
+
+    def _post_job_status(self, lua_path, message, color="white"):
+        """Pipeline job callback; forwards a job's message to its row."""
+        self.status_channel.post_job(lua_path, message, color)
 
     def select_file(self):
         """Opens a dialog to select a .lua file."""
@@ -933,6 +976,7 @@ class App(TkinterDnD.Tk):
         )
         if filepath:
             if filepath.lower().endswith(".lua"):
+                self._clear_job_list()
                 self.selected_file_path.set(filepath)
                 base_name = os.path.basename(filepath)
                 display_text = (
@@ -966,18 +1010,39 @@ class App(TkinterDnD.Tk):
             self.update_status("Output folder selected", "lightblue")
 
     def handle_drop(self, event):
-        """Handles a file drop event, processing a single .lua file."""
-        if self.is_processing:
-            return
-        filepaths_str = event.data.strip()
+        """Handles dropped files and folders.
 
-        filepath = (
-            filepaths_str[1:-1]
-            if filepaths_str.startswith("{") and filepaths_str.endswith("}")
-            else filepaths_str
-        )
+        A single .lua file is selected as before. Several files or a folder
+        (searched recursively for .lua files) are added to the job list, also
+        while a batch is running.
+        """
+        if self.is_processing and not self.batch_running:
+            return
+        paths = self.tk.splitlist(event.data)
+        lua_files = find_lua_files(paths)
+        if not lua_files:
+            if self.is_processing:
+                self.update_status("No .lua files in the dropped items.", "orange")
+            elif len(paths) == 1 and os.path.isfile(paths[0]):
+                messagebox.showerror(
+                    "Invalid File Type",
+                    f"Dropped file is not a .lua file:\n{os.path.basename(paths[0])}",
+                )
+            else:
+                messagebox.showwarning(
+                    "Drop Error",
+                    "Could not process dropped items.\n"
+                    "Please drop .lua files or folders containing them.",
+                )
+            return
 
-        if os.path.isfile(filepath) and filepath.lower().endswith(".lua"):
+        if not self.is_processing and not any(
+            row["state"] == JOB_QUEUED for row in self.job_rows.values()
+        ):
+            self._clear_job_list()
+        single_file = len(paths) == 1 and os.path.isfile(paths[0])
+        if single_file and self.job_list_frame is None:
+            filepath = lua_files[0]
             self.selected_file_path.set(filepath)
             base_name = os.path.basename(filepath)
             display_text = (
@@ -987,22 +1052,17 @@ class App(TkinterDnD.Tk):
             )
             self.update_status(display_text, "lightblue")
             self._start_fetch_game_info(filepath)
-        elif os.path.isfile(filepath):
-            messagebox.showerror(
-                "Invalid File Type",
-                f"Dropped file is not a .lua file:\n{os.path.basename(filepath)}",
-            )
-            self.selected_file_path.set("")
-            self.current_game_id = None
-            self._show_dnd_placeholder()
+            return
+
+        self.selected_file_path.set("")
+        added = self._add_jobs(lua_files)
+        waiting = sum(1 for row in self.job_rows.values() if row["state"] == JOB_QUEUED)
+        if self.is_processing:
+            self.update_status(f"Queued {added} more Lua file(s).", "lightblue")
         else:
-            messagebox.showwarning(
-                "Drop Error",
-                "Could not process dropped item.\nPlease drop a single .lua file.",
+            self.update_status(
+                f"{waiting} Lua file(s) queued. Press Update to start.", "lightblue"
             )
-            self.selected_file_path.set("")
-            self.current_game_id = None
-            self._show_dnd_placeholder()
 
     def join_telegram(self):
         """Opens the Telegram link in a web browser."""
@@ -1018,22 +1078,35 @@ class App(TkinterDnD.Tk):
         self.is_processing = processing
         state = "disabled" if processing else "normal"
 
+        if processing:
+            self._stage_progress = 0.0
+            self._transfer_fraction = 0.0
+            self.progress_bar.set(0)
+            self.progress_label.configure(text="")
+            self.progress_bar.pack(pady=(0, 2), padx=10, fill="x")
+            self.progress_label.pack(pady=(0, 6), padx=10, fill="x")
+        else:
+            self.progress_bar.pack_forget()
+            self.progress_label.pack_forget()
+
         widgets_to_toggle = [
             self.select_file_button,
             self.browse_button,
-            self.update_button,
             self.repo_dropdown,
+            self.race_repos_checkbox,
+            self.include_extras_checkbox,
         ]
 
         try:
             dnd_target = self.dnd_frame
             placeholder_target = self.dnd_placeholder_label
-            if processing:
+            # While a batch runs, drops add more jobs to it.
+            if processing and not self.batch_running:
                 if dnd_target and dnd_target.winfo_exists():
                     dnd_target.drop_target_unregister()
                 if placeholder_target and placeholder_target.winfo_exists():
                     placeholder_target.drop_target_unregister()
-            else:
+            elif not processing:
                 if dnd_target and dnd_target.winfo_exists():
                     dnd_target.drop_target_register(DND_FILES)
                 if placeholder_target and placeholder_target.winfo_exists():
@@ -1057,16 +1130,33 @@ class App(TkinterDnD.Tk):
 
         if self.update_button and self.update_button.winfo_exists():
             self.update_button.configure(
-                text="Processing..." if processing else "Update"
+                text="Cancel" if processing else "Update",
+                command=(
+                    self.cancel_update_process
+                    if processing
+                    else self.start_update_process
+                ),
+                state="normal",
             )
 
+    def cancel_update_process(self):
+        """Asks the running update pipeline to stop."""
+        pipeline = self.pipeline
+        if not self.is_processing or pipeline is None or pipeline.cancelled:
+            return
+        pipeline.cancel()
+        self.update_button.configure(text="Cancelling...", state="disabled")
+        self.update_status("Cancelling update...", "orange")
+
     def start_update_process(self):
         """Initiates the manifest update process in a new thread."""
         if self.is_processing:
             return
+        if any(row["state"] == JOB_QUEUED for row in self.job_rows.values()):
+            self._start_batch()
+            return
 
         original_lua_path = self.selected_file_path.get()
-        output_dir = self.output_folder_path.get()
 
         if not original_lua_path:
             messagebox.showerror(
@@ -1081,6 +1171,22 @@ class App(TkinterDnD.Tk):
             self._show_dnd_placeholder()
             return
 
+        output_dir = self._prepare_output_dir()
+        if not output_dir:
+            return
+
+        self.set_processing_state(True)
+        self.update_status("Starting update process...", "lightblue")
+
+        threading.Thread(
+            target=self._update_thread_target,
+            args=(original_lua_path, output_dir),
+            daemon=True,
+        ).start()
+
+    def _prepare_output_dir(self):
+        """Returns the output folder, creating it if needed, or None on error."""
+        output_dir = self.output_folder_path.get()
         if not output_dir:
             if self.default_output_dir:
                 output_dir = self.default_output_dir
@@ -1090,129 +1196,152 @@ class App(TkinterDnD.Tk):
                 messagebox.showerror(
                     "Output Missing", "Please select an output folder."
                 )
-                return
+                return None
         try:
             os.makedirs(output_dir, exist_ok=True)
         except OSError as e:
             messagebox.showerror(
                 "Output Error", f"Could not create output directory:\n{output_dir}\n{e}"
             )
-            return
+            return None
+        return output_dir
+
+    def _create_pipeline(self, output_base_dir, **options):
+        """Creates an UpdatePipeline for the selected repository and options."""
+        selected_repo_display_name = self.selected_repo_key.get()
+        repo_path_to_use = self.repos_config.get(
+            selected_repo_display_name, DEFAULT_REPO
+        )
+        if self.archive_cache is None:
+            try:
+                self.archive_cache = ArchiveCache()
+            except Exception as e:
+                print(f"Warn: Archive cache unavailable: {e}")
+        if self.manifest_store is None:
+            try:
+                self.manifest_store = ManifestStore()
+            except Exception as e:
+                print(f"Warn: Manifest store unavailable: {e}")
+        if self.manifest_index is None:
+            try:
+                self.manifest_index = ManifestIndex()
+            except Exception as e:
+                print(f"Warn: Manifest index unavailable: {e}")
+        race_repos = None
+        if self.race_repos_enabled.get():
+            race_repos = [repo_path_to_use] + list(self.repos_config.values())
+        return UpdatePipeline(
+            repo_path_to_use,
+            output_base_dir,
+            self.update_status,
+            cache=self.archive_cache,
+            manifest_store=self.manifest_store,
+            manifest_index=self.manifest_index,
+            race_repos=race_repos,
+            include_extras=self.include_extras_enabled.get(),
+            progress_callback=self.status_channel.set_progress,
+            monitor=TransferMonitor(self.status_channel.set_transfer),
+            **options,
+        )
 
+    def _start_batch(self):
+        """Starts updating every queued job of the job list."""
+        output_dir = self._prepare_output_dir()
+        if not output_dir:
+            return
+        self.batch_running = True
         self.set_processing_state(True)
-        self.update_status("Starting update process...", "lightblue")
-
+        self.update_status("Starting batch update...", "lightblue")
         threading.Thread(
-            target=self._update_thread_target,
-            args=(original_lua_path, output_dir),
-            daemon=True,
+            target=self._batch_thread_target, args=(output_dir,), daemon=True
         ).start()
 
-    def _update_thread_target(self, original_lua_path, output_base_dir):
-        """Core logic for updating manifests, run in a background thread."""
-        game_id = None
-
-        temp_base_dir = os.path.join(
-            os.getenv("TEMP", "/tmp"),
-            f"lua_manifest_updater_{os.getpid()}_{int(time.time())}",
-        )
-        temp_extract_dir, downloaded_zip_path, temp_updated_lua_path, final_zip_path = (
-            None,
-            None,
-            None,
-            None,
-        )
-        extracted_manifest_paths = []
-        success = False
-        final_save_path = ""
+    def _batch_thread_target(self, output_base_dir):
+        """Runs queued jobs through the pipeline until none are left.
 
+        Jobs queued while a round runs are picked up by the next round, so
+        files dropped during a batch join it.
+        """
+        succeeded = 0
+        total = 0
+        cancelled = False
         try:
-            self.update_status(
-                f"Reading file: {os.path.basename(original_lua_path)}", "orange"
-            )
-            try:
-                if not os.path.isfile(original_lua_path):
-                    self.update_status(
-                        f"Error: Input file disappeared: {os.path.basename(original_lua_path)}",
-                        "red",
-                    )
-                    return
-                with open(original_lua_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                game_id = get_game_id_from_content(content)
-                if not game_id:
-                    self.update_status(
-                        "Error: Game ID not found in the Lua file.", "red"
-                    )
-                    return
-                self.update_status(f"Found Game ID: {game_id}", "lightblue")
-            except Exception as e:
-                self.update_status(f"Error reading input Lua file: {e}", "red")
-                return
-
-            temp_extract_dir = os.path.join(temp_base_dir, f"extracted_{game_id}")
-            downloaded_zip_path = os.path.join(
-                temp_base_dir, f"downloaded_{game_id}.zip"
-            )
-            final_zip_name = f"{game_id}.zip"
-            final_zip_path = os.path.join(output_base_dir, final_zip_name)
-            final_save_path = final_zip_path
-
-            if os.path.exists(temp_base_dir):
-                delete_item(temp_base_dir)
-            os.makedirs(temp_base_dir, exist_ok=True)
-            os.makedirs(temp_extract_dir, exist_ok=True)
-
-            selected_repo_display_name = self.selected_repo_key.get()
-            repo_path_to_use = self.repos_config.get(
-                selected_repo_display_name, "Fairyvmos/BlankTMing"
-            )
-
-            url = f"https://github.com/{repo_path_to_use}/archive/refs/heads/{game_id}.zip"
-            self.update_status(
-                f"Using repo: {repo_path_to_use} for branch {game_id}", "lightblue"
-            )
-
-            if not download_file(url, downloaded_zip_path, self.update_status):
+            while not cancelled:
+                with self._jobs_lock:
+                    lua_paths, self._pending_jobs = self._pending_jobs, []
+                if not lua_paths:
+                    break
+                self.pipeline = self._create_pipeline(
+                    output_base_dir, job_callback=self._post_job_status
+                )
+                results = self.pipeline.run(lua_paths)
+                cancelled = self.pipeline.cancelled
+                for result in results:
+                    total += 1
+                    if result["success"]:
+                        succeeded += 1
+                        self.status_channel.post_job(
+                            result["lua_path"], "Done", "lime", JOB_DONE
+                        )
+                    elif cancelled and result["error"] == "Cancelled.":
+                        self.status_channel.post_job(
+                            result["lua_path"], "Cancelled", "orange", JOB_CANCELLED
+                        )
+                    else:
+                        self.status_channel.post_job(
+                            result["lua_path"],
+                            result["error"] or "Failed",
+                            "red",
+                            JOB_FAILED,
+                        )
+        except Exception as e:
+            self.update_status(f"An unexpected error occurred: {e}", "red")
+            import traceback
 
+            traceback.print_exc()
+        finally:
+            self.pipeline = None
+            if cancelled:
+                with self._jobs_lock:
+                    leftover, self._pending_jobs = self._pending_jobs, []
+                for lua_path in leftover:
+                    self.status_channel.post_job(
+                        lua_path, "Cancelled", "orange", JOB_CANCELLED
+                    )
                 self.update_status(
-                    f"Download from GitHub ({repo_path_to_use}, branch {game_id}) failed.",
-                    "red",
+                    f"Batch cancelled: {succeeded}/{total} succeeded.", "orange"
                 )
-
-                return
-
-            extracted_manifest_paths = extract_files_gui(
-                downloaded_zip_path, temp_extract_dir, self.update_status
-            )
-            if extracted_manifest_paths is None:
-                return
-
-            if not extracted_manifest_paths:
+            else:
                 self.update_status(
-                    "No manifest files found in the archive to process.", "orange"
+                    f"Batch finished: {succeeded}/{total} succeeded.",
+                    "lime" if succeeded == total else "orange",
                 )
+            try:
+                self.after(100, self._finish_batch)
+            except tk.TclError:
+                print("App window closed, final UI updates skipped.")
 
-            temp_updated_lua_path = update_lua_file_gui(
-                original_lua_path,
-                extracted_manifest_paths,
-                game_id,
-                temp_base_dir,
-                self.update_status,
-            )
-            if not temp_updated_lua_path:
-                return
+    def _finish_batch(self):
+        """Leaves batch mode; starts another batch if jobs arrived meanwhile."""
+        self.batch_running = False
+        self.set_processing_state(False)
+        with self._jobs_lock:
+            pending = bool(self._pending_jobs)
+        if pending:
+            self._start_batch()
 
-            if not zip_files_gui(
-                final_zip_path,
-                temp_updated_lua_path,
-                game_id,
-                extracted_manifest_paths,
-                self.update_status,
-            ):
-                return
+    def _update_thread_target(self, original_lua_path, output_base_dir):
+        """Core logic for updating manifests, run in a background thread."""
+        success = False
+        cancelled = False
+        final_save_path = ""
 
-            success = True
+        try:
+            self.pipeline = self._create_pipeline(output_base_dir)
+            results = self.pipeline.run([original_lua_path])
+            cancelled = self.pipeline.cancelled
+            success = bool(results) and results[0]["success"] and not cancelled
+            final_save_path = results[0]["output_path"] if success else ""
 
         except Exception as e:
             self.update_status(f"An unexpected error occurred: {e}", "red")
@@ -1221,10 +1350,8 @@ class App(TkinterDnD.Tk):
             traceback.print_exc()
             success = False
         finally:
-            self.update_status("Cleaning up temporary files...", "gray")
+            self.pipeline = None
             time.sleep(0.1)
-            if temp_base_dir and os.path.exists(temp_base_dir):
-                delete_item(temp_base_dir)
 
             final_msg = (
                 f"Process completed successfully!\nSaved in: {final_save_path}"
@@ -1233,14 +1360,14 @@ class App(TkinterDnD.Tk):
             )
             final_color = "lime" if success else "red"
 
-            if not success and (
-                "Error" in self.status_message.get()
-                or "failed" in self.status_message.get()
-            ):
-                final_msg = self.status_message.get()
+            last_message = (self.status_channel.last_message or ("", None))[0]
+            if cancelled:
+                final_msg, final_color = "Update cancelled.", "orange"
+            elif not success and ("Error" in last_message or "failed" in last_message):
+                final_msg = last_message
 
+            self.update_status(final_msg, final_color)
             try:
-                self.after(0, lambda: self.update_status(final_msg, final_color))
                 self.current_game_id = None
                 self.after(100, lambda: self.set_processing_state(False))
             except tk.TclError:
@@ -1248,15 +1375,14 @@ class App(TkinterDnD.Tk):
 
 
 if __name__ == "__main__":
-    try:
+    profile = None
+    if "--profile-startup" in sys.argv[1:]:
+        profile = StartupProfile()
+        profile.mark("imports")
 
-        root_test = TkinterDnD.Tk()
-        root_test.withdraw()
-        label_test = tk.Label(root_test, text="TestDND")
-        label_test.drop_target_register(DND_FILES)
-
-        root_test.destroy()
-    except Exception as e:
+    try:
+        app = App(startup_profile=profile)
+    except (RuntimeError, tk.TclError) as e:
         print(f"Critical Error: Failed to initialize TkinterDnD: {e}")
         print(
             "This usually means 'python-tkdnd2' is not installed correctly or its dependencies are missing."
@@ -1273,5 +1399,4 @@ if __name__ == "__main__":
         root_err.destroy()
         sys.exit(1)
 
-    app = App()
     app.mainloop()
@@ -0,0 +1,388 @@
+"""Benchmarks Lua updates end to end against a local fake GitHub.
+
+Generates Lua files from 1 KB to 50 MB, serves synthetic branch archives from
+bench/fake_github.py and runs single-file and batch updates through the
+update engines. Every scenario runs in a fresh interpreter, so its peak RSS is
+its own. Reports end-to-end time, per-stage time (from the metrics events),
+peak RSS and throughput, saves them as JSON in bench/results and compares them
+with an earlier results file.
+
+Usage:
+    python bench/bench_pipeline.py [--sizes 1K,100K,1M,10M,50M] [--batch-files 32]
+        [--engines pipeline,threads,threads-mem] [--repeat 3]
+        [--baseline bench/results/pipeline-....json] [--threshold 10]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_github import (  # noqa: E402
+    DEFAULT_MANIFEST_SIZE,
+    DEFAULT_MANIFESTS,
+    branch_depots,
+    start_server,
+)
+
+ENGINES = ("pipeline", "threads", "threads-mem")
+SIZE_UNITS = {"K": 1024, "M": 1024 * 1024, "G": 1024 * 1024 * 1024}
+BENCH_REPO = "bench/manifests"
+SINGLE_GAME_BASE = 100000
+BATCH_GAME_BASE = 500000
+# Compared against the baseline; True means higher is better.
+COMPARED_METRICS = {"wall": False, "peak_rss": False, "throughput": True}
+
+
+def parse_size(text):
+    """Parses sizes such as "512", "1K" or "50M" into bytes."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def format_size(size):
+    """Formats a byte count with the largest fitting unit."""
+    for unit in ("G", "M", "K"):
+        if size >= SIZE_UNITS[unit] and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]}{unit}"
+    return str(size)
+
+
+def write_lua(path, game_id, size, manifests):
+    """Writes a Lua file of about ``size`` bytes for a synthetic branch.
+
+    Every depot of the branch gets an addappid and an outdated setManifestid
+    line, so each run rewrites all of them. The rest of the file is filled with
+    addappid lines for unrelated apps and comments, like large real files.
+    """
+    lines = [f"-- Benchmark Lua for {game_id}", f"addappid({game_id})"]
+    for depot, manifest_id in branch_depots(str(game_id), manifests):
+        lines.append(f'addappid({depot}, 1, "{"ab" * 32}")')
+        lines.append(f'setManifestid({depot}, "{int(manifest_id) - 1}", 0)')
+    text = "\n".join(lines) + "\n"
+    filler = []
+    written = len(text)
+    app_id = 900000000
+    while written < size:
+        line = f'addappid({app_id}, 0, "{"cd" * 32}") -- dlc {app_id}\n'
+        filler.append(line)
+        written += len(line)
+        app_id += 1
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(text)
+        f.write("".join(filler))
+
+
+def build_scenarios(args, work_dir):
+    """Generates the Lua inputs and returns the scenario specs to run."""
+    scenarios = []
+    for index, size in enumerate(args.sizes):
+        game_id = SINGLE_GAME_BASE + index
+        lua_dir = os.path.join(work_dir, f"single-{format_size(size)}")
+        os.makedirs(lua_dir, exist_ok=True)
+        lua_path = os.path.join(lua_dir, f"{game_id}.lua")
+        write_lua(lua_path, game_id, size, args.manifests)
+        for engine in args.engines:
+            scenarios.append(
+                {
+                    "name": f"single-{format_size(size)}-{engine}",
+                    "engine": engine,
+                    "paths": [lua_path],
+                    "branches": [str(game_id)],
+                }
+            )
+    if args.batch_files:
+        lua_dir = os.path.join(work_dir, "batch")
+        os.makedirs(lua_dir, exist_ok=True)
+        branches = []
+        for index in range(args.batch_files):
+            game_id = BATCH_GAME_BASE + index
+            write_lua(
+                os.path.join(lua_dir, f"{game_id}.lua"),
+                game_id,
+                args.batch_lua_size,
+                args.manifests,
+            )
+            branches.append(str(game_id))
+        for engine in args.engines:
+            scenarios.append(
+                {
+                    "name": f"batch-{args.batch_files}-{engine}",
+                    "engine": engine,
+                    "paths": [lua_dir],
+                    "branches": branches,
+                }
+            )
+    return scenarios
+
+
+def peak_rss_bytes():
+    """Returns this process's peak resident set size, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_scenario(spec):
+    """Runs one scenario in this process and returns its measurements.
+
+    Called in a child interpreter by run_child; the parent passes the spec,
+    the fake GitHub URL and the output directory as JSON.
+    """
+    from core import batch_update, configure_github, find_lua_files
+    from metrics import AggregateSink, add_sink
+    from pipeline import run_pipeline
+
+    configure_github(
+        web_url=spec["base_url"], api_url=spec["base_url"], raw_url=spec["base_url"]
+    )
+    aggregate = AggregateSink()
+    add_sink(aggregate)
+    quiet = lambda message, color="white": None  # noqa: E731
+    lua_files = find_lua_files(spec["paths"])
+
+    start = time.perf_counter()
+    if spec["engine"] == "pipeline":
+        results = run_pipeline(
+            spec["paths"], BENCH_REPO, spec["out_dir"], status_callback=quiet
+        )
+    else:
+        results = batch_update(
+            spec["paths"],
+            BENCH_REPO,
+            spec["out_dir"],
+            status_callback=quiet,
+            in_memory=spec["engine"] == "threads-mem",
+        )
+    wall = time.perf_counter() - start
+
+    lua_bytes = sum(os.path.getsize(path) for path in lua_files)
+    output_bytes = sum(
+        os.path.getsize(r["output_path"]) for r in results if r.get("output_path")
+    )
+    return {
+        "wall": wall,
+        "files": len(results),
+        "succeeded": sum(1 for r in results if r["success"]),
+        "lua_bytes": lua_bytes,
+        "output_bytes": output_bytes,
+        "throughput": output_bytes / wall if wall else 0.0,
+        "files_per_second": len(results) / wall if wall else 0.0,
+        "peak_rss": peak_rss_bytes(),
+        "stages": aggregate.snapshot(),
+    }
+
+
+def run_child(spec):
+    """Runs a scenario in a fresh interpreter and returns its measurements."""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+        capture_output=True,
+        text=True,
+    )
+    if output.returncode != 0:
+        raise RuntimeError(f"Scenario {spec['name']} failed:\n{output.stderr.strip()}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    """Combines repeated runs of a scenario, taking the median run."""
+    median_run = sorted(runs, key=lambda run: run["wall"])[len(runs) // 2]
+    summary = dict(median_run)
+    summary["runs"] = len(runs)
+    summary["wall_min"] = min(run["wall"] for run in runs)
+    summary["wall_stdev"] = (
+        statistics.stdev(run["wall"] for run in runs) if len(runs) > 1 else 0.0
+    )
+    rss_values = [run["peak_rss"] for run in runs if run["peak_rss"]]
+    summary["peak_rss"] = max(rss_values) if rss_values else None
+    return summary
+
+
+def git_commit():
+    """Returns the current commit of the checkout, or None."""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+def format_scenario(name, result):
+    """Formats one scenario's summary as a table line plus its stages."""
+    rss = (
+        f"{result['peak_rss'] / (1024 * 1024):7.1f} MB"
+        if result["peak_rss"]
+        else "    n/a"
+    )
+    lines = [
+        f"{name:<28} {result['wall']:8.3f}s  "
+        f"(min {result['wall_min']:.3f}s, sd {result['wall_stdev']:.3f}s)  "
+        f"{result['throughput'] / (1024 * 1024):7.2f} MB/s  "
+        f"{result['files_per_second']:7.1f} files/s  rss {rss}  "
+        f"ok {result['succeeded']}/{result['files']}"
+    ]
+    for stage, totals in sorted(result["stages"].items()):
+        average = totals["duration"] / totals["runs"] if totals["runs"] else 0.0
+        lines.append(
+            f"    {stage:<9} avg {average * 1000:9.1f} ms  "
+            f"max {totals['max_duration'] * 1000:9.1f} ms  "
+            f"{totals['throughput'] / (1024 * 1024):8.2f} MB/s"
+        )
+    return "\n".join(lines)
+
+
+def compare(results, baseline, threshold):
+    """Prints the change against a baseline results file.
+
+    Returns:
+        int: The number of metrics that got worse by more than ``threshold``
+            percent.
+    """
+    regressions = 0
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    for name, result in results["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            print(f"{name:<28} (new scenario)")
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if not result.get(metric) or not old.get(metric):
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = " REGRESSION"
+                regressions += 1
+            changes.append(f"{metric} {change:+6.1f}%{flag}")
+        print(f"{name:<28} " + "  ".join(changes))
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--child", help=argparse.SUPPRESS)
+    arg_parser.add_argument(
+        "--sizes",
+        type=lambda text: [parse_size(part) for part in text.split(",")],
+        default="1K,100K,1M,10M,50M",
+        help="Lua file sizes for the single-file runs.",
+    )
+    arg_parser.add_argument("--batch-files", type=int, default=32)
+    arg_parser.add_argument("--batch-lua-size", type=parse_size, default="4K")
+    arg_parser.add_argument("--manifests", type=int, default=DEFAULT_MANIFESTS)
+    arg_parser.add_argument(
+        "--manifest-size", type=parse_size, default=str(DEFAULT_MANIFEST_SIZE)
+    )
+    arg_parser.add_argument(
+        "--engines",
+        type=lambda text: text.split(","),
+        default=",".join(ENGINES),
+        help=f"Comma-separated engines to run: {', '.join(ENGINES)}.",
+    )
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--output", help="Results file (default: bench/results).")
+    arg_parser.add_argument("--baseline", help="Earlier results file to compare with.")
+    arg_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="Percent change counted as a regression (default: 10).",
+    )
+    args = arg_parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(json.loads(args.child))))
+        return 0
+    unknown = [engine for engine in args.engines if engine not in ENGINES]
+    if unknown:
+        arg_parser.error(f"unknown engine(s): {', '.join(unknown)}")
+
+    server, base_url = start_server(0, args.manifests, args.manifest_size)
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "sizes": args.sizes,
+            "batch_files": args.batch_files,
+            "batch_lua_size": args.batch_lua_size,
+            "manifests": args.manifests,
+            "manifest_size": args.manifest_size,
+            "repeat": args.repeat,
+        },
+        "scenarios": {},
+    }
+    try:
+        with tempfile.TemporaryDirectory(prefix="lmu-bench-") as work_dir:
+            scenarios = build_scenarios(args, work_dir)
+            # Build the archives up front so the server's work is not timed.
+            for spec in scenarios:
+                for branch in spec["branches"]:
+                    server.fake.archive(branch)
+            for spec in scenarios:
+                runs = []
+                for attempt in range(args.repeat):
+                    out_dir = os.path.join(work_dir, "out", f"{spec['name']}-{attempt}")
+                    child_spec = {
+                        "name": spec["name"],
+                        "engine": spec["engine"],
+                        "paths": spec["paths"],
+                        "base_url": base_url,
+                        "out_dir": out_dir,
+                    }
+                    runs.append(run_child(child_spec))
+                summary = summarize(runs)
+                results["scenarios"][spec["name"]] = summary
+                print(format_scenario(spec["name"], summary), flush=True)
+    finally:
+        server.shutdown()
+
+    output_path = args.output or os.path.join(
+        RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output_path}")
+
+    failed = sum(
+        result["files"] - result["succeeded"]
+        for result in results["scenarios"].values()
+    )
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
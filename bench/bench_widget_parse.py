@@ -0,0 +1,80 @@
+"""Benchmarks Steam widget parsing: streaming parser vs. BeautifulSoup.
+
+Runs both parsers over the saved widget pages in bench/fixtures, checks that
+they extract the same parts, and prints the time per page for each.
+
+Usage:
+    python bench/bench_widget_parse.py [--repeat N]
+"""
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT_DIR, "bench", "fixtures")
+sys.path.insert(0, ROOT_DIR)
+
+from core import _parse_steam_widget_bs4, _parse_steam_widget_fast  # noqa: E402
+
+
+def time_parser(parser, pages, repeat):
+    """Returns the best-of-3 average seconds per page for a parser."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for html in pages:
+                parser(html)
+        elapsed = (time.perf_counter() - start) / (repeat * len(pages))
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_bs4_import():
+    """Returns the seconds a fresh interpreter needs to import bs4."""
+    code = (
+        "import time; s = time.perf_counter(); import bs4; "
+        "print(time.perf_counter() - s)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip())
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, "steam_widget_*.html")))
+    if not paths:
+        print(f"No widget fixtures found in {FIXTURES_DIR}")
+        return 1
+    pages = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+
+    mismatches = 0
+    for path, html in zip(paths, pages):
+        if _parse_steam_widget_fast(html) != _parse_steam_widget_bs4(html):
+            print(f"MISMATCH: {os.path.basename(path)}")
+            mismatches += 1
+
+    fast = time_parser(_parse_steam_widget_fast, pages, args.repeat)
+    slow = time_parser(_parse_steam_widget_bs4, pages, args.repeat)
+    print(f"Fixtures:        {len(pages)} pages x {args.repeat} repeats")
+    print(f"Streaming:       {fast * 1e6:8.1f} us/page")
+    print(f"BeautifulSoup:   {slow * 1e6:8.1f} us/page")
+    print(f"Speedup:         {slow / fast:8.1f}x")
+    print(f"bs4 import:      {time_bs4_import() * 1e3:8.1f} ms (avoided unless needed)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Local stand-in for GitHub that serves synthetic manifest branches.
+
+Every branch name is treated as a game ID. Its archive holds ``manifests``
+files named "<depot>_<manifest>.manifest" of ``manifest_size`` random bytes
+each, so downloads and zip writes have realistic, incompressible sizes. The
+server answers the same URLs core.py uses:
+
+    /<user>/<repo>/archive/refs/heads/<branch>.zip   branch archive
+    /repos/<user>/<repo>/git/trees/<branch>           Git tree API listing
+    /<user>/<repo>/<branch>/<path>                    raw branch file
+
+Archives honour If-None-Match, and Range requests guarded by If-Range, so
+resumed downloads can be exercised too. Set ``digest`` on the FakeGitHub to
+announce a Repr-Digest header. Every request is logged in ``requests``.
+
+Usage:
+    python bench/fake_github.py [--port 8000] [--manifests 20] [--manifest-size 262144]
+
+Then point the app at it with configure_github(web_url=..., api_url=...,
+raw_url=...) or the CLI's --github-url/--github-api-url/--github-raw-url.
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MANIFESTS = 20
+DEFAULT_MANIFEST_SIZE = 256 * 1024
+
+
+def branch_depots(branch, manifests):
+    """Returns the (depot, manifest_id) pairs of a synthetic branch."""
+    rng = random.Random(f"depots-{branch}")
+    base = int(branch) if branch.isdigit() else rng.randrange(10**5, 10**6)
+    return [
+        (str(base + index + 1), str(rng.randrange(10**18, 10**19)))
+        for index in range(manifests)
+    ]
+
+
+class FakeGitHub:
+    """Generates and caches synthetic branch archives."""
+
+    def __init__(
+        self, manifests=DEFAULT_MANIFESTS, manifest_size=DEFAULT_MANIFEST_SIZE
+    ):
+        self.manifests = manifests
+        self.manifest_size = manifest_size
+        self.digest = False
+        self.requests = []
+        self._archives = {}
+        self._lock = threading.Lock()
+
+    def log_request(self, path, headers):
+        """Records a request as a (path, headers dict) tuple in ``requests``."""
+        with self._lock:
+            self.requests.append((path, dict(headers)))
+
+    def files(self, branch):
+        """Returns {path: bytes} for the files of a branch."""
+        files = {}
+        for depot, manifest_id in branch_depots(branch, self.manifests):
+            rng = random.Random(f"{branch}/{depot}")
+            files[f"{depot}_{manifest_id}.manifest"] = rng.getrandbits(
+                self.manifest_size * 8
+            ).to_bytes(self.manifest_size, "little")
+        files[f"{branch}.lua"] = f"addappid({branch})\n".encode()
+        return files
+
+    def archive(self, branch):
+        """Returns (zip bytes, ETag) of a branch, building them on first use."""
+        with self._lock:
+            cached = self._archives.get(branch)
+        if cached is None:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zip_ref:
+                for path, content in self.files(branch).items():
+                    zip_ref.writestr(f"repo-{branch}/{path}", content)
+            data = buffer.getvalue()
+            cached = (data, f'"{hashlib.md5(data).hexdigest()}"')
+            with self._lock:
+                self._archives[branch] = cached
+        return cached
+
+
+def make_handler(fake):
+    """Returns a request handler class serving ``fake``."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(
+            self,
+            status,
+            body=b"",
+            content_type="application/octet-stream",
+            etag=None,
+            headers=None,
+        ):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if etag:
+                self.send_header("ETag", etag)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_archive(self, data, etag):
+            headers = {"Accept-Ranges": "bytes"}
+            if fake.digest:
+                encoded = base64.b64encode(hashlib.sha256(data).digest()).decode()
+                headers["Repr-Digest"] = f"sha-256=:{encoded}:"
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, etag=etag)
+            match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+            if_range = self.headers.get("If-Range")
+            if match and (if_range is None or if_range == etag):
+                start = int(match.group(1))
+                if start >= len(data):
+                    headers["Content-Range"] = f"bytes */{len(data)}"
+                    return self._send(416, headers=headers)
+                headers["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+                return self._send(206, data[start:], "application/zip", etag, headers)
+            return self._send(200, data, "application/zip", etag, headers)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            fake.log_request(path, self.headers)
+            match = re.fullmatch(r"/[^/]+/[^/]+/archive/refs/heads/([^/]+)\.zip", path)
+            if match:
+                return self._send_archive(*fake.archive(match.group(1)))
+            match = re.fullmatch(r"/repos/[^/]+/[^/]+/git/trees/([^/]+)", path)
+            if match:
+                tree = [
+                    {"path": name, "type": "blob", "size": len(content)}
+                    for name, content in fake.files(match.group(1)).items()
+                ]
+                body = json.dumps({"tree": tree, "truncated": False}).encode()
+                return self._send(200, body, "application/json")
+            match = re.fullmatch(r"/[^/]+/[^/]+/([^/]+)/(.+)", path)
+            if match:
+                content = fake.files(match.group(1)).get(match.group(2))
+                if content is not None:
+                    return self._send(200, content)
+            self._send(404, b"Not Found", "text/plain")
+
+    return Handler
+
+
+def start_server(
+    port=0, manifests=DEFAULT_MANIFESTS, manifest_size=DEFAULT_MANIFEST_SIZE
+):
+    """Starts the fake GitHub on a background thread.
+
+    Returns:
+        tuple: (server, base_url). Call server.shutdown() to stop it; the
+            FakeGitHub instance is available as server.fake.
+    """
+    fake = FakeGitHub(manifests, manifest_size)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fake))
+    server.daemon_threads = True
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--port", type=int, default=8000)
+    arg_parser.add_argument("--manifests", type=int, default=DEFAULT_MANIFESTS)
+    arg_parser.add_argument("--manifest-size", type=int, default=DEFAULT_MANIFEST_SIZE)
+    args = arg_parser.parse_args()
+    server, base_url = start_server(args.port, args.manifests, args.manifest_size)
+    print(f"Fake GitHub serving on {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,556 @@
+"""Command-line interface for Lua Manifest Updater.
+
+Runs the same update pipeline as the GUI without importing Tk, so it works
+on machines without a display.
+
+Usage:
+    python cli.py update *.lua --repo Fairyvmos/BlankTMing --out DIR -j 16
+    python cli.py scan DIR
+    python cli.py inventory DIR
+"""
+
+import argparse
+import os
+import sys
+import zipfile
+
+from core import (
+    APP_NAME,
+    APP_VERSION,
+    ARCHIVE_MAX_BYTES,
+    ARCHIVE_MAX_ENTRIES,
+    BATCH_MAX_WORKERS,
+    IN_MEMORY_SPOOL_LIMIT,
+    LUA_COMPRESS_LEVEL,
+    LUA_SCAN_CHUNK_FILES,
+    MANIFEST_STORE_MAX_BYTES,
+    RACE_FIRST,
+    RACE_NEWEST,
+    SCAN_CURRENT,
+    SCAN_OUTDATED,
+    ArchiveCache,
+    ManifestIndex,
+    ManifestStore,
+    TransferMonitor,
+    batch_update,
+    compression_policy,
+    configure_extraction,
+    configure_github,
+    configure_http,
+    inventory_lua_files,
+    format_batch_report,
+    format_inventory_summary,
+    format_transfer_progress,
+    format_scan_report,
+    format_transfer_summary,
+    load_repo_config,
+    print_status,
+    scan_lua_files,
+    summarize_lua_inventory,
+    write_batch_report,
+)
+from metrics import (
+    AggregateSink,
+    JsonLinesSink,
+    add_sink,
+    format_stage_report,
+    remove_sink,
+    write_prometheus_textfile,
+)
+from pipeline import DEFAULT_QUEUE_SIZE, PIPELINE_STAGES, STAGE_DOWNLOAD, run_pipeline
+
+DEFAULT_CLI_OUTPUT_DIR = "Updated Files"
+ENGINE_PIPELINE = "pipeline"
+ENGINE_THREADS = "threads"
+PROGRESS_LOG_INTERVAL = 5.0
+
+
+def _find_repo_config():
+    """Returns the repo.json to use: the current directory's, else the app's."""
+    if os.path.isfile("repo.json"):
+        return "repo.json"
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "repo.json")
+
+
+def _resolve_repo(name, repos, default_repo):
+    """Maps a repo.json display name or a "user/repo" path to a repository path."""
+    if not name:
+        return default_repo
+    return repos.get(name, name)
+
+
+def _stage_value(text):
+    """Parses a STAGE=NUMBER argument into a (stage, float) pair."""
+    stage, sep, value = text.partition("=")
+    if not sep or stage not in PIPELINE_STAGES:
+        raise argparse.ArgumentTypeError(
+            f"expected STAGE=NUMBER with STAGE one of {', '.join(PIPELINE_STAGES)}"
+        )
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number: {value!r}")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive: {value!r}")
+    return stage, number
+
+
+def build_parser():
+    """Builds the argument parser for all subcommands."""
+    parser = argparse.ArgumentParser(
+        prog="lua-manifest-updater",
+        description=f"{APP_NAME} v{APP_VERSION} command-line interface.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update = subparsers.add_parser(
+        "update", help="Update .lua files and build <game_id>.zip outputs."
+    )
+    update.add_argument(
+        "paths", nargs="+", help=".lua files and/or folders to search recursively."
+    )
+    update.add_argument(
+        "--repo",
+        help="Repository to use: a repo.json name or a user/repo path "
+        "(default: the repo.json default).",
+    )
+    update.add_argument(
+        "--out",
+        default=DEFAULT_CLI_OUTPUT_DIR,
+        help=f"Output directory (default: {DEFAULT_CLI_OUTPUT_DIR!r}).",
+    )
+    update.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=BATCH_MAX_WORKERS,
+        help="Files processed concurrently; with the pipeline engine, concurrent "
+        f"downloads (default: {BATCH_MAX_WORKERS}).",
+    )
+    update.add_argument(
+        "--engine",
+        choices=[ENGINE_PIPELINE, ENGINE_THREADS],
+        default=ENGINE_PIPELINE,
+        help="pipeline: asyncio stages with bounded queues (archives are kept "
+        "in memory); threads: one worker thread per file (default: %(default)s).",
+    )
+    update.add_argument(
+        "--stage-limit",
+        action="append",
+        type=_stage_value,
+        default=[],
+        metavar="STAGE=N",
+        help=f"Concurrent jobs for a pipeline stage ({', '.join(PIPELINE_STAGES)}); "
+        "repeatable.",
+    )
+    update.add_argument(
+        "--stage-timeout",
+        action="append",
+        type=_stage_value,
+        default=[],
+        metavar="STAGE=SECONDS",
+        help="Fail a job that spends longer than this in a pipeline stage; "
+        "repeatable.",
+    )
+    update.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help="Jobs waiting in front of each pipeline stage (default: %(default)s).",
+    )
+    update.add_argument(
+        "--max-archives",
+        type=int,
+        help="Downloaded archives the pipeline holds at once, each with up to "
+        f"{IN_MEMORY_SPOOL_LIMIT // (1024 * 1024)} MB in memory (default: the "
+        "download, rewrite and zip limits added up).",
+    )
+    update.add_argument(
+        "--in-memory",
+        action="store_true",
+        help="Keep archives in memory instead of a temporary directory "
+        "(requires --engine threads; the pipeline always does).",
+    )
+    update.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use the on-disk archive cache.",
+    )
+    update.add_argument(
+        "--no-manifest-store",
+        action="store_true",
+        help="Do not keep manifests in the shared on-disk manifest store.",
+    )
+    update.add_argument(
+        "--manifest-store-mb",
+        type=int,
+        default=MANIFEST_STORE_MAX_BYTES // (1024 * 1024),
+        help="Size limit of the manifest store in MB (default: %(default)s).",
+    )
+    update.add_argument(
+        "--index",
+        help="Manifest index to record the current manifest IDs in "
+        "(default: in the cache directory).",
+    )
+    update.add_argument(
+        "--ids-only",
+        action="store_true",
+        help="Read manifest IDs from the branch file listing instead of the archive.",
+    )
+    update.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report which files are outdated (requires --ids-only).",
+    )
+    update.add_argument(
+        "--race",
+        action="append",
+        metavar="REPO",
+        help="Also query this repository and use the best archive "
+        "(repeatable; see --race-all).",
+    )
+    update.add_argument(
+        "--race-all",
+        action="store_true",
+        help="Query every repository from repo.json for each branch.",
+    )
+    update.add_argument(
+        "--race-strategy",
+        choices=[RACE_FIRST, RACE_NEWEST],
+        default=RACE_FIRST,
+        help="Which raced archive to use (default: %(default)s).",
+    )
+    update.add_argument(
+        "--include-extras",
+        action="store_true",
+        help="Also zip manifests of depots the .lua file does not reference.",
+    )
+    update.add_argument(
+        "--lua-level",
+        type=int,
+        default=LUA_COMPRESS_LEVEL,
+        help="Deflate level for the Lua script (default: %(default)s).",
+    )
+    update.add_argument(
+        "--deflate-manifests",
+        action="store_true",
+        help="Deflate .manifest files instead of storing them.",
+    )
+    update.add_argument(
+        "--compress-workers",
+        type=int,
+        default=0,
+        help="Threads used to compress zip entries in parallel.",
+    )
+    update.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Always rebuild output zips, even if they are up to date.",
+    )
+    update.add_argument(
+        "--max-archive-entries",
+        type=int,
+        default=ARCHIVE_MAX_ENTRIES,
+        help="Reject archives with more manifest files than this "
+        "(default: %(default)s).",
+    )
+    update.add_argument(
+        "--max-archive-mb",
+        type=int,
+        default=ARCHIVE_MAX_BYTES // (1024 * 1024),
+        help="Reject archives whose manifests unpack to more than this many MB "
+        "(default: %(default)s).",
+    )
+    update.add_argument(
+        "--http-pool", type=int, help="Keep-alive connections per host."
+    )
+    update.add_argument(
+        "--http-retries", type=int, help="Retries for failed HTTP requests."
+    )
+    update.add_argument(
+        "--github-url", help="Base URL serving branch archives (for mirrors/stubs)."
+    )
+    update.add_argument("--github-api-url", help="Base URL of the GitHub REST API.")
+    update.add_argument("--github-raw-url", help="Base URL serving raw branch files.")
+    update.add_argument("--report", help="Also write the results as JSON to this file.")
+    update.add_argument(
+        "--events", help="Append per-stage timing events to this JSON-lines file."
+    )
+    update.add_argument(
+        "--metrics",
+        help="Write per-stage totals in the Prometheus text format to this file.",
+    )
+    update.add_argument(
+        "--stage-report",
+        action="store_true",
+        help="Print time, bytes and throughput per stage after the report.",
+    )
+    update.add_argument(
+        "--progress",
+        action="store_true",
+        help="Show download progress, speed and ETA on stderr.",
+    )
+    update.add_argument(
+        "-q", "--quiet", action="store_true", help="Only print the final report."
+    )
+
+    scan = subparsers.add_parser(
+        "scan",
+        help="Report which .lua files are outdated according to the manifest "
+        "index, without network access.",
+    )
+    scan.add_argument(
+        "paths", nargs="+", help=".lua files and/or folders to search recursively."
+    )
+    scan.add_argument(
+        "--index",
+        help="Manifest index to compare with (default: in the cache directory).",
+    )
+    scan.add_argument("--report", help="Also write the results as JSON to this file.")
+    scan.add_argument(
+        "--list",
+        action="store_true",
+        help="Only print the paths of outdated files, one per line.",
+    )
+    scan.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Processes used to read the files (default: one per CPU).",
+    )
+
+    inventory = subparsers.add_parser(
+        "inventory",
+        help="Summarize the games, depots and manifest IDs of a .lua library.",
+    )
+    inventory.add_argument(
+        "paths", nargs="+", help=".lua files and/or folders to search recursively."
+    )
+    inventory.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Processes used to read the files (default: one per CPU).",
+    )
+    inventory.add_argument(
+        "--chunk-size",
+        type=int,
+        default=LUA_SCAN_CHUNK_FILES,
+        help="Files handed to a process at a time (default: %(default)s).",
+    )
+    inventory.add_argument(
+        "--report",
+        help="Also write every file's game ID and manifest IDs as JSON to this file.",
+    )
+    return parser
+
+
+def _progress_monitor(show_progress, stream=None):
+    """Returns the TransferMonitor for a run, printing progress if requested.
+
+    On a terminal the progress line is redrawn in place; otherwise a new
+    line is printed every PROGRESS_LOG_INTERVAL seconds.
+    """
+    if not show_progress:
+        return TransferMonitor()
+    stream = stream or sys.stderr
+    if not stream.isatty():
+        return TransferMonitor(
+            lambda snapshot: print(format_transfer_progress(snapshot), file=stream),
+            interval=PROGRESS_LOG_INTERVAL,
+        )
+    width = [0]
+
+    def redraw(snapshot):
+        line = format_transfer_progress(snapshot)
+        stream.write("\r" + line.ljust(width[0]))
+        stream.flush()
+        width[0] = len(line)
+
+    return TransferMonitor(redraw)
+
+
+def _run_engine(args, repo_path, options):
+    """Runs the update with the engine selected by --engine."""
+    if args.engine == ENGINE_PIPELINE:
+        stage_limits = {STAGE_DOWNLOAD: args.jobs}
+        stage_limits.update((stage, int(n)) for stage, n in args.stage_limit)
+        return run_pipeline(
+            args.paths,
+            repo_path,
+            args.out,
+            stage_limits=stage_limits,
+            stage_timeouts=dict(args.stage_timeout),
+            queue_size=args.queue_size,
+            max_archives=args.max_archives,
+            **options,
+        )
+    return batch_update(
+        args.paths,
+        repo_path,
+        args.out,
+        max_workers=args.jobs,
+        in_memory=args.in_memory,
+        **options,
+    )
+
+
+def run_update(args):
+    """Runs the "update" subcommand; returns the process exit code."""
+    repos, default_repo = load_repo_config(_find_repo_config())
+    repo_path = _resolve_repo(args.repo, repos, default_repo)
+
+    race_repos = None
+    if args.race or args.race_all:
+        race_repos = [repo_path]
+        race_repos += [
+            _resolve_repo(name, repos, default_repo) for name in args.race or []
+        ]
+        if args.race_all:
+            race_repos += list(repos.values())
+
+    configure_http(pool_size=args.http_pool, retries=args.http_retries)
+    configure_github(
+        web_url=args.github_url,
+        api_url=args.github_api_url,
+        raw_url=args.github_raw_url,
+    )
+    configure_extraction(
+        max_entries=args.max_archive_entries,
+        max_bytes=args.max_archive_mb * 1024 * 1024,
+    )
+
+    cache = None
+    if not args.no_cache and not args.ids_only:
+        cache = ArchiveCache()
+    manifest_store = None
+    if not args.no_manifest_store:
+        manifest_store = ManifestStore(max_bytes=args.manifest_store_mb * 1024 * 1024)
+
+    zip_options = {
+        "incremental": not args.rebuild,
+        "compression": compression_policy(
+            manifest_method=(
+                zipfile.ZIP_DEFLATED if args.deflate_manifests else zipfile.ZIP_STORED
+            ),
+            lua_level=args.lua_level,
+        ),
+        "compress_workers": args.compress_workers,
+    }
+
+    status_callback = (
+        (lambda message, color="white": None) if args.quiet else print_status
+    )
+    options = {
+        "status_callback": status_callback,
+        "cache": cache,
+        "ids_only": args.ids_only,
+        "dry_run": args.dry_run,
+        "race_repos": race_repos,
+        "race_strategy": args.race_strategy,
+        "include_extras": args.include_extras,
+        "zip_options": zip_options,
+        "monitor": _progress_monitor(args.progress),
+        "manifest_store": manifest_store,
+        "manifest_index": ManifestIndex(args.index),
+    }
+    sinks = []
+    aggregate = None
+    if args.events:
+        sinks.append(JsonLinesSink(args.events))
+    if args.metrics or args.stage_report:
+        aggregate = AggregateSink()
+        sinks.append(aggregate)
+    for sink in sinks:
+        add_sink(sink)
+    try:
+        results = _run_engine(args, repo_path, options)
+    finally:
+        options["manifest_index"].close()
+        for sink in sinks:
+            remove_sink(sink)
+            if isinstance(sink, JsonLinesSink):
+                sink.close()
+        if args.progress and sys.stderr.isatty():
+            sys.stderr.write("\n")
+
+    print(format_batch_report(results))
+    transfers = options["monitor"].snapshot()
+    if transfers["finished"]:
+        print(f"Downloads: {format_transfer_summary(transfers)}")
+    if manifest_store is not None:
+        stats = manifest_store.stats()
+        print(
+            f"Manifest store: {stats['hits']} reused, {stats['stored']} added, "
+            f"{stats['bytes'] / (1024 * 1024):.1f} MB stored"
+        )
+    if args.stage_report and aggregate.snapshot():
+        print()
+        print(format_stage_report(aggregate.snapshot()))
+    if args.metrics:
+        write_prometheus_textfile(aggregate, args.metrics)
+    if args.report:
+        write_batch_report(results, args.report)
+    if not results:
+        return 2
+    return 0 if all(r["success"] for r in results) else 1
+
+
+def run_scan(args):
+    """Runs the "scan" subcommand; returns the process exit code.
+
+    The exit code is 0 when every file is current, 2 when no usable .lua
+    file was found and 1 otherwise (outdated, not yet indexed or invalid).
+    """
+    manifest_index = ManifestIndex(args.index)
+    try:
+        results = scan_lua_files(args.paths, manifest_index, workers=args.jobs)
+    finally:
+        manifest_index.close()
+
+    if args.list:
+        for r in results:
+            if r["status"] == SCAN_OUTDATED:
+                print(r["lua_path"])
+    else:
+        print(format_scan_report(results))
+    if args.report:
+        write_batch_report(results, args.report)
+    if not any(r["game_id"] for r in results):
+        return 2
+    return 0 if all(r["status"] == SCAN_CURRENT for r in results) else 1
+
+
+def run_inventory(args):
+    """Runs the "inventory" subcommand; returns the process exit code."""
+    records = inventory_lua_files(
+        args.paths, workers=args.jobs, chunk_files=args.chunk_size
+    )
+    print(format_inventory_summary(summarize_lua_inventory(records)))
+    if args.report:
+        write_batch_report(records, args.report)
+    return 0 if records else 2
+
+
+def main(argv=None):
+    """Entry point; returns the process exit code."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "update":
+        if args.dry_run and not args.ids_only:
+            parser.error("--dry-run requires --ids-only")
+        if args.in_memory and args.engine == ENGINE_PIPELINE:
+            parser.error(
+                "--in-memory requires --engine threads "
+                "(the pipeline engine always keeps archives in memory)"
+            )
+        return run_update(args)
+    if args.command == "scan":
+        return run_scan(args)
+    if args.command == "inventory":
+        return run_inventory(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4156 @@
+"""GUI-free core of Lua Manifest Updater.
+
+Everything needed to download manifest archives, rewrite Lua files and build
+the output zips lives here, so it can be used from scripts and the command
+line without importing Tk.
+"""
+
+import base64
+import contextvars
+import importlib
+import io
+import os
+import re
+import zipfile
+import shutil
+import threading
+import time
+import json
+import tempfile
+import hashlib
+import mmap
+import struct
+import zlib
+from collections import deque
+from html.parser import HTMLParser
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from metrics import (
+    STAGE_DOWNLOAD,
+    STAGE_EXTRACT,
+    STAGE_REWRITE,
+    STAGE_ZIP,
+    reset_job_fields,
+    set_job_fields,
+    stage_timer,
+    submit_in_context,
+)
+
+
+class _LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    Keeps ``import core`` cheap for the GUI, which should not pay for
+    requests before the first network call.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+
+requests = _LazyModule("requests")
+urllib3 = _LazyModule("urllib3")
+sqlite3 = _LazyModule("sqlite3")
+
+
+APP_NAME = "Lua Manifest Updater"
+APP_VERSION = "1.0.3"
+DEFAULT_REPO = "Fairyvmos/BlankTMing"
+BATCH_MAX_WORKERS = 8
+IN_MEMORY_SPOOL_LIMIT = 64 * 1024 * 1024
+HTTP_POOL_SIZE = 16
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_PER_HOST_LIMIT = 8
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+DOWNLOAD_CONNECT_TIMEOUT = 10
+DOWNLOAD_STALL_SECONDS = 20
+DOWNLOAD_MIN_THROUGHPUT = 2 * 1024
+DOWNLOAD_MAX_ATTEMPTS = 5
+DOWNLOAD_MAX_RESUMES = 50
+DOWNLOAD_CHUNK_MIN = 16 * 1024
+DOWNLOAD_CHUNK_MAX = 4 * 1024 * 1024
+DOWNLOAD_CHUNK_TARGET_SECONDS = 0.25
+PROGRESS_INTERVAL = 0.5
+PROGRESS_SPEED_WINDOW = 5.0
+PROGRESS_IDLE_WARNING = 5.0
+CACHE_DIR_NAME = "lua-manifest-updater"
+ARCHIVE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+MANIFEST_STORE_MAX_BYTES = 1024 * 1024 * 1024
+MANIFEST_STORE_GRACE_SECONDS = 60
+MANIFEST_STORE_TEMP_MAX_AGE = 60 * 60
+MANIFEST_INDEX_FILE = "manifest-index.sqlite3"
+SCAN_CURRENT = "current"
+SCAN_OUTDATED = "outdated"
+SCAN_UNKNOWN = "unknown"
+SCAN_INVALID = "invalid"
+LUA_MMAP_THRESHOLD = 1024 * 1024
+LUA_SCAN_CHUNK_FILES = 256
+ARCHIVE_MAX_ENTRIES = 20000
+ARCHIVE_MAX_BYTES = 4 * 1024 * 1024 * 1024
+EXTRACT_BUFFER_SIZE = 1024 * 1024
+GITHUB_WEB_URL = "https://github.com"
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_RAW_URL = "https://raw.githubusercontent.com"
+RACE_FIRST = "first"
+RACE_NEWEST = "newest"
+RACE_CANCEL_POLL_SECONDS = 0.2
+STEAM_INFO_TTL = 7 * 24 * 60 * 60
+STEAM_INFO_MAX_ENTRIES = 5000
+STEAM_INFO_MAX_BYTES = 200 * 1024 * 1024
+CAPSULE_IMAGE_WIDTH = 184
+STEAM_WIDGET_PARSE_CHUNK = 4096
+LUA_COMPRESS_LEVEL = 6
+COMPRESS_WINDOW_PER_WORKER = 2
+
+
+_http_settings = {
+    "pool_size": HTTP_POOL_SIZE,
+    "retries": HTTP_RETRIES,
+    "backoff_factor": HTTP_BACKOFF_FACTOR,
+    "per_host_limit": HTTP_PER_HOST_LIMIT,
+}
+_github_endpoints = {
+    "web": GITHUB_WEB_URL,
+    "api": GITHUB_API_URL,
+    "raw": GITHUB_RAW_URL,
+    "token": os.getenv("GITHUB_TOKEN"),
+}
+_extract_limits = {"max_entries": ARCHIVE_MAX_ENTRIES, "max_bytes": ARCHIVE_MAX_BYTES}
+_http_session = None
+_raw_copy_support = None
+_store_pins = contextvars.ContextVar("manifest_store_pins", default=None)
+_http_lock = threading.Lock()
+_host_semaphores = {}
+
+
+def configure_http(
+    pool_size=None, retries=None, backoff_factor=None, per_host_limit=None
+):
+    """Changes the settings of the shared HTTP session.
+
+    Only the given settings are changed. The session is rebuilt on next use, so
+    this should be called before starting downloads.
+
+    Args:
+        pool_size (int): Keep-alive connections kept open per host.
+        retries (int): Retries for connection errors and 429/5xx responses.
+        backoff_factor (float): Exponential backoff factor between retries.
+        per_host_limit (int): Maximum concurrent requests to a single host.
+    """
+    global _http_session
+    updates = {
+        "pool_size": pool_size,
+        "retries": retries,
+        "backoff_factor": backoff_factor,
+        "per_host_limit": per_host_limit,
+    }
+    with _http_lock:
+        for key, value in updates.items():
+            if value is not None:
+                _http_settings[key] = value
+        if _http_session is not None:
+            _http_session.close()
+        _http_session = None
+        _host_semaphores.clear()
+
+
+def ensure_http_pool(size):
+    """Lets at least ``size`` requests to one host run at the same time.
+
+    Grows the shared connection pool and the per-host limit to ``size`` if
+    they are smaller; neither is ever shrunk.
+    """
+    pool_size = size if size > _http_settings["pool_size"] else None
+    per_host_limit = size if size > _http_settings["per_host_limit"] else None
+    if pool_size is not None or per_host_limit is not None:
+        configure_http(pool_size=pool_size, per_host_limit=per_host_limit)
+
+
+def get_http_session():
+    """Returns the shared, connection-pooling HTTP session, creating it if needed."""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            retry = Retry(
+                total=_http_settings["retries"],
+                backoff_factor=_http_settings["backoff_factor"],
+                status_forcelist=HTTP_RETRY_STATUSES,
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=_http_settings["pool_size"],
+                pool_maxsize=_http_settings["pool_size"],
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+
+@contextmanager
+def host_slot(url):
+    """Limits the number of concurrent requests to the host of ``url``.
+
+    Hold the slot for as long as the response body is being read.
+    """
+    host = urlsplit(url).netloc.lower()
+    with _http_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(_http_settings["per_host_limit"])
+            _host_semaphores[host] = semaphore
+    with semaphore:
+        yield
+
+
+def http_get(url, **kwargs):
+    """Performs a non-streaming GET through the shared session.
+
+    Args:
+        url (str): The URL to fetch.
+        **kwargs: Passed on to requests.Session.get.
+
+    Returns:
+        requests.Response: The response, with its body already read.
+    """
+    kwargs.setdefault("verify", False)
+    with host_slot(url):
+        response = get_http_session().get(url, **kwargs)
+        response.content  # Read the body while holding the host slot.
+        return response
+
+
+def configure_github(web_url=None, api_url=None, raw_url=None, token=None):
+    """Overrides the GitHub endpoints used for downloads, e.g. for a local stub.
+
+    Args:
+        web_url (str): Base URL serving "/{repo}/archive/refs/heads/{branch}.zip".
+        api_url (str): Base URL of the REST API serving git trees.
+        raw_url (str): Base URL serving raw files as "/{repo}/{branch}/{path}".
+        token (str): Optional API token, sent to the API endpoint only.
+    """
+    updates = {"web": web_url, "api": api_url, "raw": raw_url, "token": token}
+    for key, value in updates.items():
+        if value is not None:
+            _github_endpoints[key] = value.rstrip("/") if key != "token" else value
+
+
+def configure_extraction(max_entries=None, max_bytes=None):
+    """Changes the limits applied when reading manifests from branch archives.
+
+    An archive whose selected manifests exceed either limit is rejected
+    before anything is extracted, which also guards against zip bombs.
+
+    Args:
+        max_entries (int): Maximum number of manifests taken from one archive.
+        max_bytes (int): Maximum uncompressed size of those manifests together.
+    """
+    updates = {"max_entries": max_entries, "max_bytes": max_bytes}
+    for key, value in updates.items():
+        if value is not None:
+            _extract_limits[key] = value
+
+
+def archive_url(repo, branch):
+    """Returns the URL of the zip archive for a repository branch."""
+    return f"{_github_endpoints['web']}/{repo}/archive/refs/heads/{branch}.zip"
+
+
+def list_branch_files(repo, branch, status_callback):
+    """Lists the files of a repository branch through the Git tree API.
+
+    Only file names and sizes are transferred, which is a few kilobytes even for
+    branches whose archive is many megabytes.
+
+    Args:
+        repo (str): GitHub repository path.
+        branch (str): Branch name.
+        status_callback (function): Callback to report status (message, color).
+
+    Returns:
+        list or None: Dicts with "path" and "size" for every file in the branch,
+            or None on error.
+    """
+    url = f"{_github_endpoints['api']}/repos/{repo}/git/trees/{branch}?recursive=1"
+    headers = {"Accept": "application/vnd.github+json"}
+    if _github_endpoints["token"]:
+        headers["Authorization"] = f"Bearer {_github_endpoints['token']}"
+    try:
+        status_callback(f"Listing files of {repo} branch {branch}...", "orange")
+        response = http_get(url, headers=headers, timeout=30)
+        if response.status_code == 404:
+            status_callback(f"Error: Branch {branch} not found in {repo}.", "red")
+            return None
+        response.raise_for_status()
+        data = response.json()
+        if data.get("truncated"):
+            status_callback(
+                f"Warning: File listing for branch {branch} is truncated.", "orange"
+            )
+        return [
+            {"path": entry["path"], "size": entry.get("size", 0)}
+            for entry in data.get("tree", [])
+            if entry.get("type") == "blob"
+        ]
+    except requests.exceptions.RequestException as e:
+        status_callback(f"Error listing branch {branch}: {e}", "red")
+        return None
+    except (ValueError, KeyError) as e:
+        status_callback(
+            f"Error: Unexpected file listing for branch {branch}: {e}", "red"
+        )
+        return None
+
+
+def fetch_branch_file(repo, branch, path, status_callback):
+    """Downloads a single file from a repository branch.
+
+    Args:
+        repo (str): GitHub repository path.
+        branch (str): Branch name.
+        path (str): Path of the file inside the branch.
+        status_callback (function): Callback to report status (message, color).
+
+    Returns:
+        bytes or None: The file content, or None on error.
+    """
+    url = f"{_github_endpoints['raw']}/{repo}/{branch}/{path}"
+    try:
+        response = http_get(url, timeout=30)
+        response.raise_for_status()
+        return response.content
+    except requests.exceptions.RequestException as e:
+        status_callback(f"Error downloading {os.path.basename(path)}: {e}", "red")
+        return None
+
+
+def get_game_id_from_content(content):
+    """Extracts game ID from manifest content using regex."""
+    match = re.search(r'addappid\s*\(\s*(\d+|"(\d+)")', content)
+    if match:
+        game_id = match.group(2) if match.group(2) else match.group(1)
+        return game_id
+    return None
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed or fails verification."""
+
+
+class DownloadStalled(DownloadError):
+    """Raised when a download's throughput drops below DOWNLOAD_MIN_THROUGHPUT."""
+
+
+class _RollingRate:
+    """Bytes per second over the last ``window`` seconds."""
+
+    def __init__(self, window, now):
+        self.window = window
+        self.total = 0
+        self._samples = deque([(now, 0)])
+
+    def add(self, count, now):
+        self.total += count
+        if now - self._samples[-1][0] >= 0.1:
+            self._samples.append((now, self.total))
+        self._prune(now)
+
+    def rate(self, now):
+        self._prune(now)
+        start_time, start_total = self._samples[0]
+        elapsed = now - start_time
+        return (self.total - start_total) / elapsed if elapsed > 0 else 0.0
+
+    def _prune(self, now):
+        while len(self._samples) > 1 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+
+class Transfer:
+    """One download tracked by a TransferMonitor.
+
+    Created by TransferMonitor.start; the download code calls restart() at
+    the start of every attempt, advance() for every chunk and finish() once.
+    """
+
+    def __init__(self, monitor, label, now):
+        self.monitor = monitor
+        self.label = label
+        self.position = 0
+        self.total = None
+        self.last_activity = now
+        self._rate = _RollingRate(monitor.window, now)
+
+    def restart(self, position, total=None):
+        """Sets the bytes already on hand and the expected total size."""
+        with self.monitor._lock:
+            self.position = position
+            self.total = total
+        self.monitor._notify()
+
+    def advance(self, count):
+        """Counts ``count`` newly received bytes."""
+        now = time.monotonic()
+        with self.monitor._lock:
+            self.position += count
+            self.last_activity = now
+            self._rate.add(count, now)
+            self.monitor._rate.add(count, now)
+        self.monitor._notify()
+
+    def finish(self):
+        """Marks the transfer as done, successful or not."""
+        self.monitor._finish(self)
+
+    def _snapshot(self, now):
+        speed = self._rate.rate(now)
+        remaining = self.total - self.position if self.total is not None else None
+        return {
+            "label": self.label,
+            "bytes": self.position,
+            "total": self.total,
+            "speed": speed,
+            "eta": remaining / speed if remaining is not None and speed else None,
+            "idle": now - self.last_activity,
+        }
+
+
+class TransferMonitor:
+    """Byte-level progress, rolling speed and ETA of one or more downloads.
+
+    Pass one monitor to the download functions (or to update_single_lua,
+    batch_update or UpdatePipeline) to follow every download they make. The
+    monitor aggregates all of them, so a batch gets one overall throughput.
+
+    Args:
+        callback (function): Called with a snapshot() dict at most every
+            ``interval`` seconds while bytes arrive, and once more whenever
+            the last active transfer finishes. Runs on a downloading thread;
+            calls never overlap.
+        interval (float): Minimum seconds between callbacks.
+        window (float): Seconds the rolling speeds are averaged over.
+    """
+
+    def __init__(
+        self, callback=None, interval=PROGRESS_INTERVAL, window=PROGRESS_SPEED_WINDOW
+    ):
+        self.callback = callback
+        self.interval = interval
+        self.window = window
+        self._lock = threading.Lock()
+        self._callback_lock = threading.Lock()
+        now = time.monotonic()
+        self._started = now
+        self._rate = _RollingRate(window, now)
+        self._active = []
+        self._finished = 0
+        self._finished_bytes = 0
+        self._last_callback = now
+
+    def start(self, label):
+        """Registers a new transfer named ``label`` and returns it."""
+        now = time.monotonic()
+        transfer = Transfer(self, label, now)
+        with self._lock:
+            self._active.append(transfer)
+        return transfer
+
+    def snapshot(self):
+        """Returns the current progress.
+
+        Returns:
+            dict: "bytes" on hand and "total" expected over all transfers
+                (None while a size is unknown), "fraction", rolling "speed" in
+                bytes per second, "eta" in seconds, "received" bytes and their
+                "average_speed" since the monitor was created, "elapsed",
+                "active" and "finished" transfer counts, and "transfers", one
+                dict per active transfer with "label", "bytes", "total",
+                "speed", "eta" and "idle" (seconds since its last byte).
+        """
+        now = time.monotonic()
+        with self._lock:
+            transfers = [transfer._snapshot(now) for transfer in self._active]
+            speed = self._rate.rate(now)
+            received = self._rate.total
+            finished = self._finished
+            done = self._finished_bytes + sum(t["bytes"] for t in transfers)
+            total = None
+            if all(t["total"] is not None for t in transfers):
+                total = self._finished_bytes + sum(t["total"] for t in transfers)
+        elapsed = now - self._started
+        return {
+            "bytes": done,
+            "total": total,
+            "fraction": min(1.0, done / total) if total else None,
+            "speed": speed,
+            "eta": (total - done) / speed if total and speed else None,
+            "received": received,
+            "average_speed": received / elapsed if elapsed > 0 else 0.0,
+            "elapsed": elapsed,
+            "active": len(transfers),
+            "finished": finished,
+            "transfers": transfers,
+        }
+
+    def _finish(self, transfer):
+        with self._lock:
+            if transfer not in self._active:
+                return
+            self._active.remove(transfer)
+            self._finished += 1
+            self._finished_bytes += transfer.position
+            idle = not self._active
+        self._notify(force=idle)
+
+    def _notify(self, force=False):
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_callback < self.interval:
+                return
+            self._last_callback = now
+        with self._callback_lock:
+            self.callback(self.snapshot())
+
+
+def _format_mb(size):
+    return f"{size / (1024 * 1024):.1f}"
+
+
+def _format_speed(speed):
+    if speed < 1024 * 1024:
+        return f"{speed / 1024:.1f} KB/s"
+    return f"{_format_mb(speed)} MB/s"
+
+
+def format_transfer_progress(snapshot):
+    """Formats a TransferMonitor snapshot as a one-line progress message.
+
+    Example: "12.3/45.6 MB at 4.1 MB/s, ETA 0:08 (3 downloads)".
+    """
+    if snapshot["total"]:
+        text = f"{_format_mb(snapshot['bytes'])}/{_format_mb(snapshot['total'])} MB"
+    else:
+        text = f"{_format_mb(snapshot['bytes'])} MB"
+    text += f" at {_format_speed(snapshot['speed'])}"
+    if snapshot["eta"] is not None and snapshot["active"]:
+        minutes, seconds = divmod(int(snapshot["eta"] + 0.5), 60)
+        text += f", ETA {minutes}:{seconds:02d}"
+    if snapshot["active"] > 1:
+        text += f" ({snapshot['active']} downloads)"
+    idle = [t for t in snapshot["transfers"] if t["idle"] >= PROGRESS_IDLE_WARNING]
+    if idle:
+        text += f", {len(idle)} waiting for data"
+    return text
+
+
+def format_transfer_summary(snapshot):
+    """Formats the totals of a TransferMonitor snapshot, e.g. for batch reports.
+
+    Example: "45.6 MB downloaded at 9.8 MB/s".
+    """
+    return (
+        f"{_format_mb(snapshot['received'])} MB downloaded at "
+        f"{_format_speed(snapshot['average_speed'])}"
+    )
+
+
+def _parse_content_range(value):
+    """Returns (start, total) from a Content-Range header; unknown parts are None."""
+    match = re.match(r"bytes\s+(?:(\d+)-\d+|\*)/(\d+|\*)", value or "")
+    if not match:
+        return None, None
+    start = int(match.group(1)) if match.group(1) else None
+    total = int(match.group(2)) if match.group(2) != "*" else None
+    return start, total
+
+
+def _digest_sha256(headers):
+    """Returns the hex SHA-256 announced in Repr-Digest or Digest headers, if any."""
+    for header, pattern in (
+        ("Repr-Digest", r"sha-256=:([A-Za-z0-9+/=]+):"),
+        ("Digest", r"sha-256=([A-Za-z0-9+/=]+)"),
+    ):
+        match = re.search(pattern, headers.get(header, ""), re.IGNORECASE)
+        if match:
+            try:
+                return base64.b64decode(match.group(1)).hex()
+            except ValueError:
+                return None
+    return None
+
+
+def _is_retryable_download_error(error):
+    """True for network failures that are worth resuming after."""
+    return isinstance(
+        error,
+        (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            urllib3.exceptions.HTTPError,
+            ConnectionError,
+            DownloadError,
+        ),
+    )
+
+
+def _copy_adaptive(response, out, cancel_event=None, transfer=None):
+    """Copies a streamed response body into ``out`` with adaptive chunk sizes.
+
+    The chunk size doubles while reads finish well within
+    DOWNLOAD_CHUNK_TARGET_SECONDS and halves when they take much longer, so
+    fast links are read in large blocks and slow ones still report progress
+    often enough for stall detection. Received bytes are counted on
+    ``transfer`` (a Transfer), if given.
+
+    Returns:
+        bool: False if ``cancel_event`` was set, True once the body is done.
+
+    Raises:
+        DownloadStalled: If less than DOWNLOAD_MIN_THROUGHPUT bytes per second
+            arrived over the last DOWNLOAD_STALL_SECONDS.
+    """
+    if response.headers.get("Content-Encoding", "identity").lower() != "identity":
+        chunks = response.iter_content(chunk_size=DOWNLOAD_CHUNK_MIN)
+
+        def read(size):
+            return next(chunks, b"")
+
+    else:
+        read = response.raw.read
+
+    chunk_size = DOWNLOAD_CHUNK_MIN
+    window_start = time.monotonic()
+    window_bytes = 0
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            return False
+        read_start = time.monotonic()
+        chunk = read(chunk_size)
+        now = time.monotonic()
+        if not chunk:
+            return True
+        out.write(chunk)
+        if transfer is not None:
+            transfer.advance(len(chunk))
+
+        elapsed = now - read_start
+        if elapsed < DOWNLOAD_CHUNK_TARGET_SECONDS / 2 and len(chunk) >= chunk_size:
+            chunk_size = min(chunk_size * 2, DOWNLOAD_CHUNK_MAX)
+        elif elapsed > DOWNLOAD_CHUNK_TARGET_SECONDS * 2:
+            chunk_size = max(chunk_size // 2, DOWNLOAD_CHUNK_MIN)
+
+        window_bytes += len(chunk)
+        window = now - window_start
+        if window >= DOWNLOAD_STALL_SECONDS:
+            if window_bytes / window < DOWNLOAD_MIN_THROUGHPUT:
+                raise DownloadStalled(
+                    f"stalled at {window_bytes / window / 1024:.1f} KB/s"
+                )
+            window_start, window_bytes = now, 0
+
+
+def _stream_with_resume(
+    url,
+    out,
+    label,
+    status_callback,
+    headers=None,
+    state=None,
+    expected_sha256=None,
+    cancel_event=None,
+    save_state=None,
+    transfer=None,
+):
+    """Streams ``url`` into the binary file ``out``, resuming after failures.
+
+    Bytes already in ``out`` are treated as the start of the download and
+    continued with a Range request, guarded by If-Range with the validator in
+    ``state``; without a validator the download starts over. Interrupted
+    attempts that made progress are resumed straight away, up to
+    DOWNLOAD_MAX_RESUMES times. Stalls and attempts without progress are
+    retried with backoff up to DOWNLOAD_MAX_ATTEMPTS times.
+
+    Args:
+        url (str): The URL to download from.
+        out (file): Seekable binary file opened for reading and appending.
+        label (str): Name used for the download in status messages.
+        status_callback (function): Callback to report status (message, color).
+        headers (dict): Extra headers for a fresh (not resumed) request, such
+            as conditional headers.
+        state (dict): Validator, ETag, Last-Modified, total size and announced
+            checksum of the download; updated in place.
+        expected_sha256 (str): Hex SHA-256 the finished download must have.
+            Defaults to the one announced by the server, if any.
+        cancel_event (threading.Event): Optional event; once set, the download
+            stops and None is returned, keeping what was received.
+        save_state (function): Called with ``state`` whenever it changes.
+        transfer (Transfer): Optional progress tracker for the download.
+
+    Returns:
+        dict or None: "not_modified", "size", "sha256" (None unless verified),
+            "etag" and "last_modified", or None if cancelled.
+
+    Raises:
+        requests.exceptions.RequestException or DownloadError: If the download
+            failed for good.
+    """
+    state = state if state is not None else {}
+    failures = 0
+    resumes = 0
+    while True:
+        offset = out.seek(0, os.SEEK_END)
+        if offset and not state.get("validator"):
+            out.truncate(0)
+            offset = 0
+        request_headers = {"Accept-Encoding": "identity"}
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+            request_headers["If-Range"] = state["validator"]
+        elif headers:
+            request_headers.update(headers)
+
+        try:
+            with host_slot(url), get_http_session().get(
+                url,
+                headers=request_headers,
+                verify=False,
+                stream=True,
+                timeout=(DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_STALL_SECONDS),
+            ) as response:
+                if response.status_code == 304 and not offset:
+                    return {
+                        "not_modified": True,
+                        "size": 0,
+                        "sha256": None,
+                        "etag": None,
+                        "last_modified": None,
+                    }
+                start, total = _parse_content_range(
+                    response.headers.get("Content-Range")
+                )
+                if response.status_code == 416 and offset and total == offset:
+                    complete = True
+                elif response.status_code == 206 and offset and start == offset:
+                    status_callback(
+                        f"Resuming {label} at {offset / (1024 * 1024):.1f} MB...",
+                        "orange",
+                    )
+                    if transfer is not None:
+                        transfer.restart(offset, total)
+                    complete = _copy_adaptive(response, out, cancel_event, transfer)
+                else:
+                    if response.status_code != 416:
+                        response.raise_for_status()
+                    # A fresh body: the server ignored the range, the file
+                    # changed, or this is the first attempt.
+                    out.truncate(0)
+                    offset = 0
+                    if response.status_code == 416:
+                        raise DownloadError("server rejected the resume range")
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+                    encoding = response.headers.get("Content-Encoding", "identity")
+                    length = response.headers.get("Content-Length")
+                    strong_etag = etag if etag and not etag.startswith("W/") else None
+                    state.update(
+                        validator=(
+                            (strong_etag or last_modified)
+                            if encoding.lower() == "identity"
+                            else None
+                        ),
+                        etag=etag,
+                        last_modified=last_modified,
+                        total=(
+                            int(length)
+                            if length
+                            and length.isdigit()
+                            and encoding.lower() == "identity"
+                            else None
+                        ),
+                        sha256=_digest_sha256(response.headers),
+                    )
+                    if save_state:
+                        save_state(state)
+                    if transfer is not None:
+                        transfer.restart(0, state["total"])
+                    complete = _copy_adaptive(response, out, cancel_event, transfer)
+            if not complete:
+                return None
+
+            size = out.seek(0, os.SEEK_END)
+            total = state.get("total")
+            if total is not None and size != total:
+                if size > total:
+                    out.truncate(0)
+                raise DownloadError(f"received {size} of {total} bytes")
+            sha256 = None
+            expected = expected_sha256 or state.get("sha256")
+            if expected:
+                digest = hashlib.sha256()
+                out.seek(0)
+                for chunk in iter(lambda: out.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                sha256 = digest.hexdigest()
+                if sha256 != expected.lower():
+                    out.truncate(0)
+                    raise DownloadError("checksum mismatch")
+            return {
+                "not_modified": False,
+                "size": size,
+                "sha256": sha256,
+                "etag": state.get("etag"),
+                "last_modified": state.get("last_modified"),
+            }
+        except Exception as e:
+            if not _is_retryable_download_error(e):
+                raise
+            progressed = (
+                not isinstance(e, DownloadStalled)
+                and state.get("validator")
+                and out.seek(0, os.SEEK_END) > offset
+            )
+            if progressed:
+                resumes += 1
+                if resumes > DOWNLOAD_MAX_RESUMES:
+                    raise
+            else:
+                failures += 1
+                if failures >= DOWNLOAD_MAX_ATTEMPTS:
+                    raise
+            delay = 0 if progressed else min(HTTP_BACKOFF_FACTOR * 2**failures, 30)
+            if isinstance(e, DownloadError):
+                reason = str(e)
+            elif isinstance(e, requests.exceptions.Timeout):
+                reason = "timed out"
+            else:
+                reason = "connection interrupted"
+            status_callback(f"{label}: {reason}, retrying...", "orange")
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    return None
+            elif delay:
+                time.sleep(delay)
+
+
+def download_resumable(
+    url,
+    path,
+    status_callback,
+    label=None,
+    headers=None,
+    expected_sha256=None,
+    cancel_event=None,
+    monitor=None,
+):
+    """Downloads ``url`` to ``path`` through a resumable ``.part`` file.
+
+    The partial file and the validator needed to resume it are kept next to
+    ``path`` when a download fails or is cancelled, so a later call for the
+    same path and URL continues where the previous one stopped. ``path`` only
+    appears once the download is complete and verified.
+
+    Args:
+        url (str): The URL to download from.
+        path (str): Where to save the finished file.
+        status_callback (function): Callback to report status (message, color).
+        label (str): Name used in status messages; defaults to the file name.
+        headers (dict): Extra headers for a fresh request (e.g. conditional
+            headers). A 304 answer leaves ``path`` untouched.
+        expected_sha256 (str): Hex SHA-256 the download must have.
+        cancel_event (threading.Event): Optional event; once set, the download
+            stops and None is returned.
+        monitor (TransferMonitor): Optional monitor to report progress to.
+
+    Returns:
+        dict or None: See _stream_with_resume; None if cancelled.
+
+    Raises:
+        requests.exceptions.RequestException or DownloadError: If the download
+            failed for good.
+    """
+    label = label or os.path.basename(path)
+    part_path = f"{path}.part"
+    state_path = f"{part_path}.json"
+    state = {}
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.pop("url", None) == url:
+            state = saved
+    except (OSError, ValueError):
+        pass
+
+    def save_state(current):
+        try:
+            with open(state_path, "w", encoding="utf-8") as f:
+                json.dump(dict(current, url=url), f)
+        except OSError as e:
+            print(f"Warn: Could not save download state for {label}: {e}")
+
+    transfer = monitor.start(label) if monitor is not None else None
+    try:
+        with open(part_path, "a+b") as out:
+            info = _stream_with_resume(
+                url,
+                out,
+                label,
+                status_callback,
+                headers=headers,
+                state=state,
+                expected_sha256=expected_sha256,
+                cancel_event=cancel_event,
+                save_state=save_state,
+                transfer=transfer,
+            )
+    except requests.exceptions.HTTPError:
+        delete_item(part_path)
+        delete_item(state_path)
+        raise
+    finally:
+        if transfer is not None:
+            transfer.finish()
+    if info is None:
+        return None
+    if info["not_modified"]:
+        delete_item(part_path)
+    else:
+        os.replace(part_path, path)
+    delete_item(state_path)
+    return info
+
+
+def download_file(url, filename, status_callback, monitor=None):
+    """Downloads a file from a URL, updating status via callback.
+
+    The download goes through ``<filename>.part`` and is resumed after
+    network failures (see download_resumable).
+
+    Args:
+        url (str): The URL to download from.
+        filename (str): The local path to save the downloaded file.
+        status_callback (function): Callback to report status (message, color).
+        monitor (TransferMonitor): Optional monitor to report progress to.
+
+    Returns:
+        bool: True if download was successful, False otherwise.
+    """
+    with stage_timer(STAGE_DOWNLOAD, url=url) as event:
+        try:
+            status_callback(f"Downloading: {os.path.basename(filename)}...", "orange")
+            info = download_resumable(url, filename, status_callback, monitor=monitor)
+            event.update(ok=True, bytes=info["size"])
+            status_callback(
+                f"Successfully downloaded {os.path.basename(filename)}", "lightgreen"
+            )
+            return True
+        except requests.exceptions.Timeout:
+            status_callback(
+                f"Error: Download timed out for {os.path.basename(filename)}", "red"
+            )
+            return False
+        except (requests.exceptions.RequestException, DownloadError) as e:
+            status_callback(
+                f"Error downloading {os.path.basename(filename)}: {e}", "red"
+            )
+            return False
+        except Exception as e:
+            status_callback(
+                f"Error during download of {os.path.basename(filename)}: {e}", "red"
+            )
+            return False
+
+
+def download_to_buffer(
+    url,
+    label,
+    status_callback,
+    spool_limit=IN_MEMORY_SPOOL_LIMIT,
+    cancel_event=None,
+    monitor=None,
+):
+    """Downloads a file into an in-memory buffer, updating status via callback.
+
+    The buffer is a SpooledTemporaryFile, so it only rolls over to disk if the
+    download grows beyond ``spool_limit`` bytes. Interrupted transfers are
+    resumed into the same buffer (see _stream_with_resume).
+
+    Args:
+        url (str): The URL to download from.
+        label (str): Name used for the download in status messages.
+        status_callback (function): Callback to report status (message, color).
+        spool_limit (int): Maximum number of bytes to keep in memory.
+        cancel_event (threading.Event): Optional event; once set, the download
+            is abandoned and None is returned.
+        monitor (TransferMonitor): Optional monitor to report progress to.
+
+    Returns:
+        SpooledTemporaryFile or None: The downloaded data, rewound to the start,
+            or None if the download failed or was cancelled. The caller must
+            close it.
+    """
+    with stage_timer(STAGE_DOWNLOAD, url=url) as event:
+        buffer = tempfile.SpooledTemporaryFile(max_size=spool_limit)
+        transfer = monitor.start(label) if monitor is not None else None
+        try:
+            status_callback(f"Downloading: {label}...", "orange")
+            info = _stream_with_resume(
+                url,
+                buffer,
+                label,
+                status_callback,
+                cancel_event=cancel_event,
+                transfer=transfer,
+            )
+            if info is None:
+                buffer.close()
+                return None
+            buffer.seek(0)
+            event.update(ok=True, bytes=info["size"])
+            status_callback(f"Successfully downloaded {label}", "lightgreen")
+            return buffer
+        except requests.exceptions.Timeout:
+            status_callback(f"Error: Download timed out for {label}", "red")
+        except (requests.exceptions.RequestException, DownloadError) as e:
+            status_callback(f"Error downloading {label}: {e}", "red")
+        except Exception as e:
+            status_callback(f"Error during download of {label}: {e}", "red")
+        finally:
+            if transfer is not None:
+                transfer.finish()
+        buffer.close()
+        return None
+
+
+def get_cache_dir(*parts):
+    """Returns (and creates) the per-user cache directory for this application.
+
+    Args:
+        *parts (str): Optional sub-directories inside the cache directory.
+
+    Returns:
+        str: Path to the cache directory.
+    """
+    base = os.getenv("LOCALAPPDATA") or os.getenv("XDG_CACHE_HOME")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, CACHE_DIR_NAME, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_sha256(path):
+    """Returns the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArchiveCache:
+    """Persistent on-disk cache of downloaded branch archives.
+
+    Archives are keyed by (repository, branch). For each one the cache keeps the
+    ETag and Last-Modified headers GitHub returned, plus a SHA-256 of the file,
+    so later downloads can be made conditional and a 304 answered from disk.
+    The least recently used archives are evicted once the cache grows past
+    ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=ARCHIVE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir or get_cache_dir("archives")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self._lock = threading.Lock()
+        self._download_locks = {}
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        except Exception as e:
+            print(f"Warn: Error loading archive cache index: {e}")
+            return {}
+
+    def _save_index(self):
+        temp_path = f"{self.index_path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._index, f, indent=4)
+            os.replace(temp_path, self.index_path)
+        except Exception as e:
+            print(f"Warn: Error saving archive cache index: {e}")
+
+    @staticmethod
+    def _key(repo, branch):
+        return f"{repo}@{branch}"
+
+    def _archive_path(self, repo, branch):
+        safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", f"{repo}__{branch}")
+        return os.path.join(self.cache_dir, f"{safe_name}.zip")
+
+    def lookup(self, repo, branch, verify=False):
+        """Returns the cache entry for (repo, branch), or None if not cached.
+
+        Args:
+            repo (str): GitHub repository path.
+            branch (str): Branch name.
+            verify (bool): Re-hash the cached file and drop the entry on mismatch.
+
+        Returns:
+            dict or None: Entry with "path", "etag", "last_modified", "sha256",
+                "size" and "last_used".
+        """
+        key = self._key(repo, branch)
+        with self._lock:
+            entry = self._index.get(key)
+            if not entry:
+                return None
+            if not os.path.isfile(entry["path"]) or (
+                verify and file_sha256(entry["path"]) != entry["sha256"]
+            ):
+                self._index.pop(key, None)
+                delete_item(entry["path"])
+                self._save_index()
+                return None
+            entry["last_used"] = time.time()
+            self._save_index()
+            return dict(entry)
+
+    def conditional_headers(self, repo, branch):
+        """Returns If-None-Match/If-Modified-Since headers for a cached archive."""
+        with self._lock:
+            entry = self._index.get(self._key(repo, branch))
+        if not entry or not os.path.isfile(entry["path"]):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def download_path(self, repo, branch):
+        """Returns where a new archive for (repo, branch) is downloaded to.
+
+        The path is stable, so an interrupted download leaves a ``.part`` file
+        there that the next download resumes.
+        """
+        return f"{self._archive_path(repo, branch)}.download"
+
+    def download_lock(self, repo, branch):
+        """Returns the lock serializing downloads of one (repo, branch)."""
+        with self._lock:
+            return self._download_locks.setdefault(
+                self._key(repo, branch), threading.RLock()
+            )
+
+    def store(
+        self, repo, branch, source_path, etag=None, last_modified=None, sha256=None
+    ):
+        """Moves a downloaded archive into the cache and evicts old entries.
+
+        Args:
+            repo (str): GitHub repository path.
+            branch (str): Branch name.
+            source_path (str): Downloaded file; it is moved, not copied.
+            etag (str): ETag response header, if any.
+            last_modified (str): Last-Modified response header, if any.
+            sha256 (str): Hex SHA-256 of the file, if already known.
+
+        Returns:
+            str: Path of the archive inside the cache.
+        """
+        target_path = self._archive_path(repo, branch)
+        sha256 = sha256 or file_sha256(source_path)
+        os.replace(source_path, target_path)
+        entry = {
+            "repo": repo,
+            "branch": branch,
+            "path": target_path,
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": sha256,
+            "size": os.path.getsize(target_path),
+            "last_used": time.time(),
+        }
+        with self._lock:
+            self._index[self._key(repo, branch)] = entry
+            self._evict(keep=self._key(repo, branch))
+            self._save_index()
+        return target_path
+
+    def _evict(self, keep=None):
+        total = sum(entry["size"] for entry in self._index.values())
+        for key, entry in sorted(
+            self._index.items(), key=lambda item: item[1]["last_used"]
+        ):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            delete_item(entry["path"])
+            total -= entry["size"]
+            del self._index[key]
+
+    def clear(self):
+        """Removes every cached archive."""
+        with self._lock:
+            for entry in self._index.values():
+                delete_item(entry["path"])
+            self._index = {}
+            self._save_index()
+            for name in os.listdir(self.cache_dir):
+                if name.endswith((".part", ".part.json")):
+                    delete_item(os.path.join(self.cache_dir, name))
+
+
+def parse_manifest_name(name):
+    """Returns (depot ID, manifest ID) from a "<depot>_<manifest>.manifest" name.
+
+    Args:
+        name (str): Manifest file name or path.
+
+    Returns:
+        tuple or None: Both IDs as strings, or None if the name does not match.
+    """
+    match = re.match(r"(\d+)_(\d+)\.manifest", os.path.basename(name))
+    return match.groups() if match else None
+
+
+class ManifestStore:
+    """Persistent store of .manifest files shared by all runs and games.
+
+    A Steam manifest never changes once published, so (depot ID, manifest ID)
+    identifies its content and each blob is stored exactly once, named
+    "<depot>_<manifest>.manifest". Dependency depots shared by many games are
+    therefore extracted or fetched a single time; later jobs read the stored
+    copy. The file modification time records the last use, and gc() removes
+    the least recently used blobs once the store grows past ``max_bytes``.
+
+    A job keeps the blobs it uses by wrapping its work in pinned() (or
+    hold()/release()); gc() never removes pinned blobs. Blobs used in the last
+    ``grace_seconds`` are kept as well, which protects jobs running in other
+    processes between finding a blob and opening it.
+    """
+
+    def __init__(
+        self,
+        cache_dir=None,
+        max_bytes=MANIFEST_STORE_MAX_BYTES,
+        grace_seconds=MANIFEST_STORE_GRACE_SECONDS,
+    ):
+        self.cache_dir = cache_dir or get_cache_dir("manifests")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.grace_seconds = grace_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._pin_sets = []
+        self._warned_over_limit = False
+        self._total = sum(size for _path, size, _used in self._blobs())
+
+    def _blobs(self):
+        """Yields (path, size, last_used) for every stored blob."""
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".manifest"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Removed by another process meanwhile.
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def blob_path(self, name):
+        """Returns where the blob for a manifest name is stored.
+
+        Args:
+            name (str): "<depot>_<manifest>.manifest" name or path.
+
+        Returns:
+            str or None: The path (which may not exist yet), or None if the
+                name carries no depot and manifest ID.
+        """
+        key = parse_manifest_name(name)
+        if key is None:
+            return None
+        return os.path.join(self.cache_dir, f"{key[0]}_{key[1]}.manifest")
+
+    def key_lock(self, name):
+        """Returns the lock serializing fetches of one manifest."""
+        with self._lock:
+            return self._key_locks.setdefault(
+                parse_manifest_name(name), threading.Lock()
+            )
+
+    def hold(self):
+        """Pins every blob used from now on in this thread (or asyncio task).
+
+        Blobs found with lookup() or stored with put() are kept by gc() until
+        release() is called. Tasks submitted with submit_in_context share the
+        caller's pins.
+
+        Returns:
+            tuple: Token to pass to release().
+        """
+        pins = set()
+        with self._lock:
+            self._pin_sets.append(pins)
+        return pins, _store_pins.set(pins)
+
+    def release(self, token):
+        """Unpins the blobs pinned since the matching hold().
+
+        If the store is over its limit, gc() runs again now that they are free.
+        """
+        pins, var_token = token
+        _store_pins.reset(var_token)
+        with self._lock:
+            self._pin_sets = [other for other in self._pin_sets if other is not pins]
+            over_limit = pins and self._total > self.max_bytes
+        if over_limit:
+            self.gc()
+
+    @contextmanager
+    def pinned(self):
+        """Pins every blob used in this block (see hold)."""
+        token = self.hold()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def _pin(self, path):
+        """Adds a blob to the current pin set; call with ``_lock`` held."""
+        pins = _store_pins.get()
+        if pins is not None:
+            pins.add(path)
+
+    def lookup(self, name):
+        """Returns the stored blob's path and marks it used, or None if missing."""
+        path = self.blob_path(name)
+        if path is None:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self._pin(path)
+        return path
+
+    def put(self, name, source):
+        """Stores a manifest unless it is already present.
+
+        The data is written to a temporary file and moved into place, so a
+        blob is either complete or absent.
+
+        Args:
+            name (str): "<depot>_<manifest>.manifest" name or path.
+            source (bytes or file): The manifest content, or a binary file
+                object to stream it from.
+
+        Returns:
+            str or None: Path of the stored blob, or None if the name carries
+                no depot and manifest ID.
+        """
+        path = self.blob_path(name)
+        if path is None:
+            return None
+        with self._lock:
+            self._pin(path)
+        if os.path.isfile(path):
+            return path
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as target:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    target.write(source)
+                else:
+                    shutil.copyfileobj(source, target, EXTRACT_BUFFER_SIZE)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            delete_item(temp_path)
+            raise
+        with self._lock:
+            self.stored += 1
+            self._total += size
+            over_limit = self._total > self.max_bytes
+        if over_limit:
+            self.gc()
+        return path
+
+    def ensure(self, name, open_source):
+        """Stores a manifest streamed from ``open_source()`` unless it is present.
+
+        Args:
+            name (str): "<depot>_<manifest>.manifest" name or path.
+            open_source (function): Returns a binary file object with the
+                manifest content; only called if the manifest is missing.
+
+        Returns:
+            str or None: Path of the stored blob, or None if the name carries
+                no depot and manifest ID.
+        """
+        if self.blob_path(name) is None:
+            return None
+        with self.key_lock(name):
+            path = self.lookup(name)
+            if path is not None:
+                return path
+            with open_source() as source:
+                return self.put(name, source)
+
+    def fetch(self, name, load):
+        """Returns a manifest's bytes, calling ``load()`` only if it is not stored.
+
+        Concurrent calls for the same manifest wait for each other, so it is
+        loaded once even when several jobs need it at the same time.
+
+        Args:
+            name (str): "<depot>_<manifest>.manifest" name or path.
+            load (function): Returns the manifest's bytes.
+
+        Returns:
+            bytes: The manifest content.
+        """
+        if self.blob_path(name) is None:
+            return load()
+        with self.key_lock(name):
+            path = self.lookup(name)
+            if path is not None:
+                try:
+                    with open(path, "rb") as f:
+                        return f.read()
+                except OSError:
+                    pass  # Removed by gc() in another process; load it again.
+            data = load()
+            self.put(name, data)
+            return data
+
+    def gc(self, max_bytes=None):
+        """Removes least recently used blobs until the store fits ``max_bytes``.
+
+        Pinned blobs and blobs used in the last ``grace_seconds`` are kept, so
+        the store can stay over the limit while the jobs using them run; a
+        warning is printed then. Leftover temporary files are removed too.
+
+        Args:
+            max_bytes (int): Size limit; defaults to the store's ``max_bytes``.
+
+        Returns:
+            tuple: (number of blobs removed, bytes freed).
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        now = time.time()
+        cutoff = now - self.grace_seconds
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stale = (
+                        name.endswith(".tmp")
+                        and os.path.getmtime(path) < now - MANIFEST_STORE_TEMP_MAX_AGE
+                    )
+                except OSError:
+                    continue
+                if stale:
+                    delete_item(path)
+            pinned = set().union(*self._pin_sets)
+            blobs = sorted(self._blobs(), key=lambda blob: blob[2])
+            total = sum(size for _path, size, _used in blobs)
+            removed = 0
+            freed = 0
+            for path, size, last_used in blobs:
+                if total <= limit or last_used >= cutoff:
+                    break
+                if path in pinned:
+                    continue
+                if delete_item(path):
+                    total -= size
+                    removed += 1
+                    freed += size
+            self._total = total
+            warn = total > limit and not self._warned_over_limit
+            self._warned_over_limit = total > limit
+        if warn:
+            print(
+                f"Warn: Manifest store holds {_format_mb(total)} MB, over its "
+                f"{_format_mb(limit)} MB limit, because the rest is in use."
+            )
+        return removed, freed
+
+    def stats(self):
+        """Returns {"hits", "misses", "stored", "bytes"} for this store instance.
+
+        ``misses`` counts lookups that found nothing, ``stored`` the blobs this
+        instance actually wrote; they differ when another job or process stored
+        the manifest in between, or when a missing manifest was not added.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stored": self.stored,
+                "bytes": self._total,
+            }
+
+    def clear(self):
+        """Removes every stored manifest."""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                delete_item(os.path.join(self.cache_dir, name))
+            self._total = 0
+
+
+def download_archive_cached(
+    url, repo, branch, cache, status_callback, cancel_event=None, monitor=None
+):
+    """Downloads a branch archive through an ArchiveCache.
+
+    Sends a conditional request when the archive is already cached and reuses
+    the cached copy on 304 Not Modified. New archives are downloaded
+    resumably, so an interrupted download continues on the next call.
+
+    Args:
+        url (str): The archive URL.
+        repo (str): GitHub repository path.
+        branch (str): Branch name.
+        cache (ArchiveCache): The cache to read from and store into.
+        status_callback (function): Callback to report status (message, color).
+        cancel_event (threading.Event): Optional event; once set, the download
+            stops, keeping the partial file for the next attempt.
+        monitor (TransferMonitor): Optional monitor to report progress to.
+
+    Returns:
+        str or None: Path of the up-to-date archive inside the cache, or None if
+            the download failed or was cancelled. The file belongs to the cache; do not delete it.
+    """
+    with stage_timer(STAGE_DOWNLOAD, url=url, cached=False) as event:
+        label = f"{branch}.zip"
+        download_path = cache.download_path(repo, branch)
+        with cache.download_lock(repo, branch):
+            headers = cache.conditional_headers(repo, branch)
+            try:
+                status_callback(f"Downloading: {label}...", "orange")
+                info = download_resumable(
+                    url,
+                    download_path,
+                    status_callback,
+                    label=label,
+                    headers=headers,
+                    cancel_event=cancel_event,
+                    monitor=monitor,
+                )
+                if info is None:
+                    status_callback(f"Download of {label} cancelled.", "orange")
+                    return None
+                if info["not_modified"]:
+                    entry = cache.lookup(repo, branch, verify=True)
+                    if entry:
+                        event.update(ok=True, cached=True)
+                        status_callback(
+                            f"{label} unchanged, using cached copy", "lightgreen"
+                        )
+                        return entry["path"]
+                    # The cached copy vanished or is corrupt; the entry is gone
+                    # now, so this retry is unconditional.
+                    return download_archive_cached(
+                        url, repo, branch, cache, status_callback, cancel_event, monitor
+                    )
+
+                cached_path = cache.store(
+                    repo,
+                    branch,
+                    download_path,
+                    info["etag"],
+                    info["last_modified"],
+                    sha256=info["sha256"],
+                )
+                event.update(ok=True, bytes=info["size"])
+                status_callback(f"Successfully downloaded {label}", "lightgreen")
+                return cached_path
+            except requests.exceptions.Timeout:
+                status_callback(f"Error: Download timed out for {label}", "red")
+            except (requests.exceptions.RequestException, DownloadError) as e:
+                status_callback(f"Error downloading {label}: {e}", "red")
+            except Exception as e:
+                status_callback(f"Error during download of {label}: {e}", "red")
+            return None
+
+
+def _race_one(repo, branch, cancel_event, status_callback, spool_limit, monitor):
+    """Downloads and validates one candidate archive for race_repositories."""
+
+    def report(message, color="white"):
+        status_callback(f"{repo}: {message}", "orange" if color == "red" else color)
+
+    archive = download_to_buffer(
+        archive_url(repo, branch),
+        f"{branch}.zip",
+        report,
+        spool_limit=spool_limit,
+        cancel_event=cancel_event,
+        monitor=monitor,
+    )
+    if archive is None:
+        return None
+    try:
+        with zipfile.ZipFile(archive) as zip_ref:
+            manifest_entries = list_manifest_entries(zip_ref)
+    except zipfile.BadZipFile:
+        report(f"Error: {branch}.zip is not a valid zip archive.", "red")
+        archive.close()
+        return None
+    if not manifest_entries:
+        report(f"No manifest files in {branch}.zip.", "orange")
+        archive.close()
+        return None
+    if cancel_event.is_set():
+        archive.close()
+        return None
+    archive.seek(0)
+    newest = max(file_info.date_time for file_info in manifest_entries)
+    return repo, archive, newest
+
+
+def race_repositories(
+    repo_paths,
+    branch,
+    status_callback,
+    strategy=RACE_FIRST,
+    spool_limit=IN_MEMORY_SPOOL_LIMIT,
+    monitor=None,
+    cancel_event=None,
+    executor=None,
+):
+    """Fetches a branch archive from several repositories at the same time.
+
+    Args:
+        repo_paths (list): GitHub repository paths to query.
+        branch (str): Branch name.
+        status_callback (function): Callback to report status (message, color).
+        strategy (str): RACE_FIRST takes the first valid archive that contains
+            manifests and cancels the other downloads. RACE_NEWEST waits for all
+            of them and takes the one whose manifests were committed last.
+        spool_limit (int): Maximum bytes to keep in memory per download.
+        monitor (TransferMonitor): Optional monitor to report the progress of
+            every download to.
+        cancel_event (threading.Event): Optional event; once set, all downloads
+            are aborted and None is returned.
+        executor (concurrent.futures.Executor): Optional executor to run the
+            downloads on, e.g. one shared by many races to bound their threads.
+            By default the race starts one thread per repository.
+
+    Returns:
+        tuple or None: (repo_path, archive) where archive is a rewound
+            SpooledTemporaryFile the caller must close, or None if no repository
+            had a usable archive.
+    """
+    repo_paths = list(dict.fromkeys(repo_paths))
+    if not repo_paths:
+        return None
+    status_callback(
+        f"Querying {len(repo_paths)} repositories for branch {branch}...", "orange"
+    )
+    race_event = threading.Event()
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=len(repo_paths))
+    futures = [
+        submit_in_context(
+            executor,
+            _race_one,
+            repo,
+            branch,
+            race_event,
+            status_callback,
+            spool_limit,
+            monitor,
+        )
+        for repo in repo_paths
+    ]
+    winner = None
+    pending = set(futures)
+    try:
+        while pending and not (strategy == RACE_FIRST and winner is not None):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            done, pending = wait(
+                pending, timeout=RACE_CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                candidate = future.result()
+                if candidate is None:
+                    continue
+                if winner is None or (
+                    strategy != RACE_FIRST and candidate[2] > winner[2]
+                ):
+                    if winner is not None:
+                        winner[1].close()
+                    winner = candidate
+                else:
+                    candidate[1].close()
+    finally:
+        race_event.set()
+        for future in futures:
+            future.cancel()  # Only succeeds for downloads that have not started.
+            future.add_done_callback(lambda f: _close_race_loser(f, winner))
+        if own_executor:
+            executor.shutdown(wait=False)
+
+    if cancel_event is not None and cancel_event.is_set():
+        if winner is not None:
+            winner[1].close()
+        return None
+    if winner is None:
+        status_callback(f"No repository has a usable branch {branch}.", "red")
+        return None
+    status_callback(f"Using archive from {winner[0]}", "lightblue")
+    return winner[0], winner[1]
+
+
+def _close_race_loser(future, winner):
+    """Closes the archive of a race_repositories candidate that did not win."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    candidate = future.result()
+    if candidate is not None and (winner is None or candidate[1] is not winner[1]):
+        candidate[1].close()
+
+
+class ArchiveLimitError(Exception):
+    """Raised when an archive exceeds the limits set with configure_extraction."""
+
+
+def select_manifest_names(manifest_names, depot_ids):
+    """Keeps the manifest names or paths that belong to the given depots.
+
+    Args:
+        manifest_names (list): "<depot>_<manifest>.manifest" names or paths.
+        depot_ids (set): Depot IDs to keep, or None to keep every name.
+
+    Returns:
+        list: The selected names, in their original order.
+    """
+    if depot_ids is None:
+        return list(manifest_names)
+    selected = []
+    for manifest_name in manifest_names:
+        key = parse_manifest_name(manifest_name)
+        if key is not None and key[0] in depot_ids:
+            selected.append(manifest_name)
+    return selected
+
+
+def list_manifest_entries(zip_ref, depot_ids=None):
+    """Returns the safe .manifest entries of an open zip archive.
+
+    Args:
+        zip_ref (zipfile.ZipFile): The archive to inspect.
+        depot_ids (set): If given, only manifests of these depots are returned.
+
+    Returns:
+        list: zipfile.ZipInfo objects for .manifest files, skipping absolute
+            paths and paths containing "..".
+    """
+    entries = []
+    for file_info in zip_ref.infolist():
+        if file_info.filename.startswith("/") or ".." in file_info.filename:
+            continue
+        if file_info.filename.endswith(".manifest"):
+            entries.append(file_info)
+    if depot_ids is None:
+        return entries
+    selected = set(select_manifest_names([e.filename for e in entries], depot_ids))
+    return [file_info for file_info in entries if file_info.filename in selected]
+
+
+def select_manifest_entries(zip_ref, depot_ids=None):
+    """Returns the manifest entries to extract, enforcing the extraction limits.
+
+    Only the central directory is read. zipfile never inflates an entry past
+    the size it declares there, so checking the declared sizes bounds the
+    work and disk space extraction can take.
+
+    Args:
+        zip_ref (zipfile.ZipFile): The archive to inspect.
+        depot_ids (set): If given, only manifests of these depots are selected.
+
+    Returns:
+        list: zipfile.ZipInfo objects, as from list_manifest_entries.
+
+    Raises:
+        ArchiveLimitError: The selected entries exceed the entry or byte limit.
+    """
+    entries = list_manifest_entries(zip_ref, depot_ids)
+    limits = dict(_extract_limits)
+    if len(entries) > limits["max_entries"]:
+        raise ArchiveLimitError(
+            f"{len(entries)} manifest files exceed the limit of "
+            f"{limits['max_entries']}"
+        )
+    total = sum(file_info.file_size for file_info in entries)
+    if total > limits["max_bytes"]:
+        raise ArchiveLimitError(
+            f"{_format_mb(total)} MB of manifests exceed the limit of "
+            f"{_format_mb(limits['max_bytes'])} MB"
+        )
+    return entries
+
+
+def lua_depot_ids(content):
+    """Returns the IDs referenced by addappid and setManifestid calls.
+
+    Args:
+        content (str): The Lua source.
+
+    Returns:
+        set: App and depot IDs (str) whose manifests the Lua file needs.
+    """
+    return {
+        parsed["app_id"] for _name, parsed, _match in DEFAULT_LUA_REWRITER.scan(content)
+    }
+
+
+def _extract_to_store(zip_ref, file_info, manifest_store, event):
+    """Puts one archive entry into the manifest store unless it is already there.
+
+    Returns:
+        str or None: Path of the stored blob, or None without a store or for
+            entries not named "<depot>_<manifest>.manifest".
+    """
+    if manifest_store is None or manifest_store.blob_path(file_info.filename) is None:
+        return None
+    with manifest_store.key_lock(file_info.filename):
+        stored_path = manifest_store.lookup(file_info.filename)
+        if stored_path:
+            event["reused"] = event.get("reused", 0) + 1
+            return stored_path
+        with zip_ref.open(file_info) as source:
+            stored_path = manifest_store.put(file_info.filename, source)
+    event["bytes"] = event.get("bytes", 0) + file_info.file_size
+    return stored_path
+
+
+def extract_files_gui(
+    filename, extract_dir, status_callback, manifest_store=None, depot_ids=None
+):
+    """Extracts .manifest files from a zip archive, updating status via callback.
+
+    Entries are streamed to disk one at a time through a fixed-size buffer,
+    within the limits set with configure_extraction.
+
+    Args:
+        filename (str): Path to the zip file.
+        extract_dir (str): Directory to extract manifest files into.
+        status_callback (function): Callback to report status.
+        manifest_store (ManifestStore): Optional store to extract into instead
+            of ``extract_dir``. Manifests it already holds are not extracted
+            again; the returned paths then point into the store.
+        depot_ids (set): If given, only the manifests of these depots are
+            extracted (see lua_depot_ids); the rest of the archive is skipped.
+
+    Returns:
+        list or None: A list of paths to extracted manifest files, or None on error.
+    """
+    with stage_timer(STAGE_EXTRACT) as event:
+        try:
+            status_callback("Extracting files...", "orange")
+            os.makedirs(extract_dir, exist_ok=True)
+            extracted_manifests = []
+            with zipfile.ZipFile(filename, "r") as zip_ref:
+                for file_info in select_manifest_entries(zip_ref, depot_ids):
+                    stored_path = _extract_to_store(
+                        zip_ref, file_info, manifest_store, event
+                    )
+                    if stored_path:
+                        extracted_manifests.append(stored_path)
+                        continue
+                    target_path = os.path.join(
+                        extract_dir, os.path.basename(file_info.filename)
+                    )
+                    with zip_ref.open(file_info) as source, open(
+                        target_path, "wb"
+                    ) as target:
+                        shutil.copyfileobj(source, target, EXTRACT_BUFFER_SIZE)
+                    extracted_manifests.append(target_path)
+                    event["bytes"] = event.get("bytes", 0) + file_info.file_size
+
+            if not extracted_manifests:
+                status_callback(
+                    "Warning: No .manifest files found in the downloaded archive.",
+                    "orange",
+                )
+
+            event.update(ok=True, entries=len(extracted_manifests))
+            status_callback("Successfully extracted manifest files", "lightgreen")
+            return extracted_manifests
+        except zipfile.BadZipFile:
+            status_callback(
+                f"Error: Downloaded file '{os.path.basename(filename)}' is not a valid zip archive.",
+                "red",
+            )
+            return None
+        except ArchiveLimitError as e:
+            status_callback(f"Error: Archive rejected: {e}.", "red")
+            return None
+        except Exception as e:
+            status_callback(f"Error extracting files: {e}", "red")
+            return None
+
+
+def delete_item(item_path):
+    """Deletes a file or directory recursively, without status updates to GUI.
+
+    Args:
+        item_path (str): Path to the file or directory to delete.
+
+    Returns:
+        bool: True if deletion was successful or item didn't exist, False on error.
+    """
+    try:
+        if os.path.exists(item_path):
+            if os.path.isfile(item_path):
+                os.remove(item_path)
+            elif os.path.isdir(item_path):
+                shutil.rmtree(item_path)
+            return True
+        return True
+    except Exception as e:
+        print(f"Warn: Error deleting {os.path.basename(item_path)}: {e}")
+        return False
+
+
+class LuaDirective:
+    """A Lua function call understood by LuaRewriter.
+
+    Subclasses set ``name`` and implement parse(); directives that can change
+    manifest IDs also set ``rewrites`` and implement rewrite().
+    """
+
+    name = None
+    rewrites = False
+
+    def parse(self, args):
+        """Parses the raw argument text of a call.
+
+        Args:
+            args (str): Text between the call's parentheses.
+
+        Returns:
+            dict or None: Parsed values, or None if the call is not understood.
+        """
+        raise NotImplementedError
+
+    def rewrite(self, args, parsed, manifest_map):
+        """Returns new argument text for the call, or None to leave it alone.
+
+        Args:
+            args (str): Text between the call's parentheses.
+            parsed (dict): Result of parse() for ``args``.
+            manifest_map (dict): Depot ID (str) to new manifest ID (str).
+        """
+        return None
+
+
+class AddAppIdDirective(LuaDirective):
+    """``addappid(id)``, ``addappid(id, flag, "key")`` and quoted-ID variants."""
+
+    name = "addappid"
+    _args_re = re.compile(
+        r"""\s*(?P<q>["']?)(?P<app_id>\d+)(?P=q)\s*(?:,(?P<rest>.*))?\Z""", re.DOTALL
+    )
+
+    def parse(self, args):
+        match = self._args_re.match(args)
+        if not match:
+            return None
+        return {"app_id": match.group("app_id")}
+
+
+class SetManifestIdDirective(LuaDirective):
+    """``setManifestid(depot, "manifest"[, size])`` in all its spellings.
+
+    Depot and manifest IDs may be quoted with either quote style or unquoted,
+    spacing is free, and the optional size argument may be any value.
+    """
+
+    name = "setManifestid"
+    rewrites = True
+    _args_re = re.compile(
+        r"""\s*(?P<dq>["']?)(?P<app_id>\d+)(?P=dq)\s*,"""
+        r"""\s*(?P<mq>["']?)(?P<manifest_id>\d+)(?P=mq)\s*(?:,(?P<rest>.*))?\Z""",
+        re.DOTALL,
+    )
+
+    def parse(self, args):
+        match = self._args_re.match(args)
+        if not match:
+            return None
+        return {
+            "app_id": match.group("app_id"),
+            "manifest_id": match.group("manifest_id"),
+            "span": match.span("manifest_id"),
+        }
+
+    def rewrite(self, args, parsed, manifest_map):
+        new_id = manifest_map.get(parsed["app_id"])
+        if not new_id or new_id == parsed["manifest_id"]:
+            return None
+        start, end = parsed["span"]
+        return args[:start] + new_id + args[end:]
+
+
+class LuaRewriter:
+    """Single-pass scanner and rewriter for manifest Lua files.
+
+    The source is tokenized once with a precompiled pattern that recognises
+    comments, string literals and calls to the configured directives, so calls
+    inside comments or strings are left alone and large files are processed in
+    linear time. The engine is stateless after construction and can be shared
+    between threads.
+    """
+
+    def __init__(self, directives=None):
+        if directives is None:
+            directives = [AddAppIdDirective(), SetManifestIdDirective()]
+        self.directives = {directive.name: directive for directive in directives}
+        names = "|".join(re.escape(name) for name in self.directives)
+        self._token_re = re.compile(
+            r"--\[(?P<ceq>=*)\[.*?\](?P=ceq)\]"
+            r"|--[^\n]*"
+            r"|\[(?P<seq>=*)\[.*?\](?P=seq)\]"
+            r"""|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'"""
+            rf"|(?<![\w.:])(?P<name>{names})\s*\((?P<args>[^()]*)\)",
+            re.DOTALL,
+        )
+
+    def scan(self, content):
+        """Yields every understood directive call in the Lua source.
+
+        Args:
+            content (str): The Lua source.
+
+        Yields:
+            tuple: (directive_name, parsed, match) for each call, where
+                ``parsed`` is the directive's parse() result and ``match`` the
+                regex match of the whole call.
+        """
+        for match in self._token_re.finditer(content):
+            name = match.group("name")
+            if name is None:
+                continue
+            parsed = self.directives[name].parse(match.group("args"))
+            if parsed is not None:
+                yield name, parsed, match
+
+    def rewrite(self, content, manifest_map):
+        """Rewrites directive calls in the Lua source with new manifest IDs.
+
+        Only the changed values are replaced; quoting, spacing and any other
+        arguments are kept as written.
+
+        Args:
+            content (str): The Lua source.
+            manifest_map (dict): Depot ID (str) to new manifest ID (str).
+
+        Returns:
+            tuple: (updated_content, changes) where ``changes`` is a list of
+                dicts with "directive", "app_id", "old" and "new".
+        """
+        pieces = []
+        changes = []
+        position = 0
+        for match in self._token_re.finditer(content):
+            directive = self.directives.get(match.group("name"))
+            if directive is None or not directive.rewrites:
+                continue
+            args = match.group("args")
+            parsed = directive.parse(args)
+            if parsed is None:
+                continue
+            new_args = directive.rewrite(args, parsed, manifest_map)
+            if new_args is None:
+                continue
+            args_start, args_end = match.span("args")
+            pieces.append(content[position:args_start])
+            pieces.append(new_args)
+            position = args_end
+            changes.append(
+                {
+                    "directive": directive.name,
+                    "app_id": parsed["app_id"],
+                    "old": parsed.get("manifest_id"),
+                    "new": manifest_map.get(parsed["app_id"]),
+                }
+            )
+        if not changes:
+            return content, changes
+        pieces.append(content[position:])
+        return "".join(pieces), changes
+
+
+DEFAULT_LUA_REWRITER = LuaRewriter()
+
+
+def read_lua_manifests(content):
+    """Returns the game ID and the setManifestid pairs of Lua source.
+
+    Args:
+        content (str): The Lua source.
+
+    Returns:
+        tuple: (game_id, manifests) where ``game_id`` is as returned by
+            get_game_id_from_content and ``manifests`` maps depot IDs (str) to
+            the manifest IDs (str) the file sets.
+    """
+    manifests = {}
+    for name, parsed, _match in DEFAULT_LUA_REWRITER.scan(content):
+        if name == SetManifestIdDirective.name:
+            manifests[parsed["app_id"]] = parsed["manifest_id"]
+    return get_game_id_from_content(content), manifests
+
+
+def build_manifest_map(manifest_names):
+    """Maps depot IDs to manifest IDs from "<depot>_<manifest>.manifest" names.
+
+    Args:
+        manifest_names (list): Manifest file names or paths.
+
+    Returns:
+        dict: Depot ID (str) to manifest ID (str).
+    """
+    manifest_map = {}
+    for manifest_name in manifest_names:
+        key = parse_manifest_name(manifest_name)
+        if key:
+            app_id, manifest_id = key
+            manifest_map[app_id] = manifest_id
+    return manifest_map
+
+
+def update_lua_content(lua_content, manifest_names, status_callback):
+    """Rewrites setManifestid calls in Lua source with new manifest IDs.
+
+    Args:
+        lua_content (str): The original Lua source.
+        manifest_names (list): Manifest file names or paths to take IDs from.
+        status_callback (function): Callback to report status.
+
+    Returns:
+        str: The updated Lua source.
+    """
+    with stage_timer(STAGE_REWRITE, bytes=len(lua_content)) as event:
+        manifest_map = build_manifest_map(manifest_names)
+        updated_content, changes = DEFAULT_LUA_REWRITER.rewrite(
+            lua_content, manifest_map
+        )
+
+        status_msg = (
+            f"Updated {len(changes)} Manifest ID(s)."
+            if changes
+            else "No Manifest IDs needed updating."
+        )
+        event.update(ok=True, entries=len(changes))
+        status_callback(status_msg, "lightblue")
+        return updated_content
+
+
+def update_lua_file_gui(
+    original_lua_path, extracted_manifest_paths, game_id, temp_dir, status_callback
+):
+    """Updates the lua file content with new manifest IDs from extracted files.
+
+    Args:
+        original_lua_path (str): Path to the original Lua file.
+        extracted_manifest_paths (list): List of paths to extracted .manifest files.
+        game_id (str): The game ID.
+        temp_dir (str): Directory to save the temporary updated Lua file.
+        status_callback (function): Callback to report status.
+
+    Returns:
+        str or None: Path to the temporary updated Lua file, or None on error.
+    """
+    temp_lua_filename = f"temp_{game_id}_{os.path.basename(original_lua_path)}"
+    temp_lua_filepath = os.path.join(temp_dir, temp_lua_filename)
+    try:
+        status_callback("Updating Lua file with new Manifest IDs...", "orange")
+        with open(original_lua_path, "r", encoding="utf-8") as f:
+            lua_content = f.read()
+
+        updated_content = update_lua_content(
+            lua_content, extracted_manifest_paths, status_callback
+        )
+
+        os.makedirs(os.path.dirname(temp_lua_filepath), exist_ok=True)
+        with open(temp_lua_filepath, "w", encoding="utf-8") as f:
+            f.write(updated_content)
+
+        status_callback("Successfully prepared updated Lua file", "lightgreen")
+        return temp_lua_filepath
+
+    except FileNotFoundError:
+        status_callback(
+            f"Error: Original Lua file not found at {original_lua_path}", "red"
+        )
+        return None
+    except Exception as e:
+        status_callback(f"Error updating lua file: {e}", "red")
+        if os.path.exists(temp_lua_filepath):
+            delete_item(temp_lua_filepath)
+        return None
+
+
+def _read_raw_from(f, file_info):
+    """Reads an entry's compressed bytes from an open zip file object."""
+    f.seek(file_info.header_offset)
+    header = f.read(zipfile.sizeFileHeader)
+    if header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local header for {file_info.filename}")
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    f.seek(name_length + extra_length, os.SEEK_CUR)
+    return f.read(file_info.compress_size)
+
+
+def read_raw_entry(zip_path, file_info):
+    """Returns the still-compressed bytes of a zip entry.
+
+    Args:
+        zip_path (str): Path of the zip archive.
+        file_info (zipfile.ZipInfo): The entry, from the archive's infolist().
+
+    Returns:
+        bytes: The entry's data exactly as stored in the archive.
+    """
+    with open(zip_path, "rb") as f:
+        return _read_raw_from(f, file_info)
+
+
+def write_raw_entry(zip_ref, source_info, raw_data, arcname=None):
+    """Adds an already-compressed entry to a zip archive open for writing.
+
+    zipfile has no public API for this, so this does what ZipFile.write does
+    internally, minus the compression. It relies on private ZipFile attributes;
+    check raw_copy_supported() before using it.
+
+    Args:
+        zip_ref (zipfile.ZipFile): Archive open in "w" mode.
+        source_info (zipfile.ZipInfo): Entry the data belongs to; provides the
+            compression method, CRC and uncompressed size.
+        raw_data (bytes): The compressed data (see read_raw_entry).
+        arcname (str): Name in the new archive; defaults to the source name.
+    """
+    zinfo = zipfile.ZipInfo(arcname or source_info.filename, source_info.date_time)
+    zinfo.compress_type = source_info.compress_type
+    zinfo.external_attr = source_info.external_attr
+    zinfo.CRC = source_info.CRC
+    zinfo.file_size = source_info.file_size
+    zinfo.compress_size = len(raw_data)
+    zip64 = max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT
+    with zip_ref._lock:
+        zip_ref._writecheck(zinfo)
+        zip_ref._didModify = True
+        zip_ref.fp.seek(zip_ref.start_dir)
+        zinfo.header_offset = zip_ref.fp.tell()
+        zip_ref.fp.write(zinfo.FileHeader(zip64))
+        zip_ref.fp.write(raw_data)
+        zip_ref.filelist.append(zinfo)
+        zip_ref.NameToInfo[zinfo.filename] = zinfo
+        zip_ref.start_dir = zip_ref.fp.tell()
+
+
+def _probe_raw_copy():
+    """Copies a small entry with write_raw_entry and checks the result."""
+    data = b"lua-manifest-updater raw copy probe " * 8
+    source = io.BytesIO()
+    with zipfile.ZipFile(source, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.writestr("probe.lua", data)
+    target = io.BytesIO()
+    with zipfile.ZipFile(source) as source_zip:
+        source_info = source_zip.getinfo("probe.lua")
+        raw_data = _read_raw_from(source, source_info)
+        with zipfile.ZipFile(target, "w") as zip_ref:
+            write_raw_entry(zip_ref, source_info, raw_data)
+    with zipfile.ZipFile(target) as zip_ref:
+        return zip_ref.testzip() is None and zip_ref.read("probe.lua") == data
+
+
+def raw_copy_supported():
+    """Returns True if write_raw_entry works with this Python's zipfile.
+
+    write_raw_entry uses zipfile internals, so it is tried once on a small
+    in-memory archive and the answer is cached. When it fails, write_output_zip
+    decompresses and recompresses entries instead.
+    """
+    global _raw_copy_support
+    if _raw_copy_support is None:
+        try:
+            _raw_copy_support = _probe_raw_copy()
+        except Exception:
+            _raw_copy_support = False
+    return _raw_copy_support
+
+
+def _read_existing_entries(zip_path):
+    """Returns {name: ZipInfo} from a zip's central directory, or {} if unusable."""
+    if not os.path.isfile(zip_path):
+        return {}
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            return {file_info.filename: file_info for file_info in zip_ref.infolist()}
+    except (zipfile.BadZipFile, OSError):
+        return {}
+
+
+def compression_policy(
+    manifest_method=zipfile.ZIP_STORED,
+    manifest_level=None,
+    lua_method=zipfile.ZIP_DEFLATED,
+    lua_level=LUA_COMPRESS_LEVEL,
+):
+    """Builds a per-entry compression policy for write_output_zip.
+
+    Steam .manifest files are already compressed, so by default they are
+    stored as-is and only the Lua script is deflated.
+
+    Args:
+        manifest_method (int): zipfile compression method for .manifest files.
+        manifest_level (int): Compression level for .manifest files, or None.
+        lua_method (int): zipfile compression method for the Lua script.
+        lua_level (int): Compression level for the Lua script, or None.
+
+    Returns:
+        function: Maps an entry name to a (method, level) tuple.
+    """
+
+    def policy(arcname):
+        if arcname.endswith(".manifest"):
+            return manifest_method, manifest_level
+        return lua_method, lua_level
+
+    return policy
+
+
+DEFAULT_COMPRESSION = compression_policy()
+
+
+def _compress_entry(arcname, data, method, level):
+    """Compresses one entry's data; returns (ZipInfo, compressed bytes)."""
+    zinfo = zipfile.ZipInfo(arcname, time.localtime(time.time())[:6])
+    zinfo.external_attr = 0o600 << 16
+    zinfo.compress_type = method
+    zinfo.CRC = zlib.crc32(data)
+    zinfo.file_size = len(data)
+    if method == zipfile.ZIP_STORED:
+        return zinfo, data
+    if method != zipfile.ZIP_DEFLATED:
+        raise ValueError(f"Parallel compression does not support method {method}")
+    compressor = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15
+    )
+    return zinfo, compressor.compress(data) + compressor.flush()
+
+
+def _map_in_window(executor, function, items, window):
+    """Like executor.map, but submits at most ``window`` items ahead of the caller.
+
+    Results are yielded in order. Only the results of submitted items are held
+    in memory, so a slow consumer does not make every result pile up. Each
+    call runs in a copy of the caller's context.
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(submit_in_context(executor, function, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def _write_stream_entry(zip_ref, arcname, source, method, level):
+    """Copies a binary stream into a new zip entry through a fixed-size buffer."""
+    size = getattr(source, "file_size", None)
+    if size is None:
+        try:
+            size = os.fstat(source.fileno()).st_size
+        except (AttributeError, OSError):
+            size = None
+    zinfo = zipfile.ZipInfo(arcname, time.localtime(time.time())[:6])
+    zinfo.external_attr = 0o600 << 16
+    zinfo.compress_type = method
+    if hasattr(zinfo, "compress_level"):
+        zinfo.compress_level = level
+    else:
+        zinfo._compresslevel = level  # No public attribute before Python 3.13.
+    zinfo.file_size = size or 0
+    with source, zip_ref.open(zinfo, "w", force_zip64=size is None) as target:
+        shutil.copyfileobj(source, target, EXTRACT_BUFFER_SIZE)
+
+
+def _write_loaded_entry(zip_ref, arcname, data, method, level):
+    """Writes an entry loaded as bytes or as a binary stream (see write_output_zip)."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        zip_ref.writestr(arcname, data, compress_type=method, compresslevel=level)
+    else:
+        _write_stream_entry(zip_ref, arcname, data, method, level)
+
+
+def _read_entry_data(data):
+    """Returns the bytes of an entry loaded as bytes or as a binary stream."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return data
+    with data:
+        return data.read()
+
+
+def _open_reused_entry(zip_path, file_info):
+    """Opens an entry of the previous output zip for decompressing and rewriting."""
+    with zipfile.ZipFile(zip_path) as source_zip:
+        # The file stays open until the returned stream is closed.
+        stream = source_zip.open(file_info.filename)
+    stream.file_size = file_info.file_size
+    return stream
+
+
+def write_output_zip(
+    output_zip_path,
+    entries,
+    status_callback,
+    incremental=True,
+    compression=None,
+    compress_workers=0,
+):
+    """Writes the output zip, skipping or reusing work when it is already current.
+
+    When ``incremental`` is set, the central directory of an existing output
+    zip is compared with ``entries`` first. If names and CRCs all match, the
+    file is left alone. Otherwise the zip is rebuilt, copying entries that did
+    not change byte-for-byte from the old zip instead of recompressing them.
+    If raw_copy_supported() is False, they are decompressed and written again.
+
+    Args:
+        output_zip_path (str): Path for the output zip file.
+        entries (list): (arcname, crc, load) tuples. ``crc`` is the expected
+            CRC-32, or None if the name alone identifies the content (as for
+            "<depot>_<manifest>.manifest" files). ``load()`` returns the
+            entry's bytes, or a binary file object that is then streamed
+            into the zip, and is only called if the entry must be written.
+        status_callback (function): Callback to report status.
+        incremental (bool): Compare with and reuse an existing output zip.
+        compression (function): Per-entry policy mapping an entry name to a
+            (method, level) tuple; see compression_policy. Defaults to
+            DEFAULT_COMPRESSION.
+        compress_workers (int): If greater than 1, load and compress new
+            entries on a thread pool of this size and assemble the archive
+            from the results. At most COMPRESS_WINDOW_PER_WORKER entries per
+            worker are in flight at a time. Only ZIP_STORED and ZIP_DEFLATED
+            are supported. Ignored if raw_copy_supported() is False.
+
+    Returns:
+        bool: True if the output is up to date, False on error.
+    """
+    with stage_timer(STAGE_ZIP, entries=len(entries)) as event:
+        compression = compression or DEFAULT_COMPRESSION
+        temp_zip_path = None
+        zip_name = os.path.basename(output_zip_path)
+        try:
+            existing = _read_existing_entries(output_zip_path) if incremental else {}
+            reusable = {
+                arcname
+                for arcname, crc, _ in entries
+                if arcname in existing and (crc is None or existing[arcname].CRC == crc)
+            }
+            if existing and reusable == set(existing) and len(reusable) == len(entries):
+                event.update(ok=True, skipped=True, reused=len(reusable))
+                status_callback(f"{zip_name} is already up to date.", "lightgreen")
+                return True
+
+            status_callback(f"Creating final zip: {zip_name}...", "orange")
+            os.makedirs(os.path.dirname(output_zip_path), exist_ok=True)
+            temp_zip_path = (
+                f"{output_zip_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            )
+
+            def prepare(entry):
+                arcname, _crc, load = entry
+                method, level = compression(arcname)
+                return _compress_entry(arcname, _read_entry_data(load()), method, level)
+
+            new_entries = [entry for entry in entries if entry[0] not in reusable]
+            raw_copy = raw_copy_supported()
+            executor = None
+            prepared = None
+            if raw_copy and compress_workers > 1 and len(new_entries) > 1:
+                executor = ThreadPoolExecutor(max_workers=compress_workers)
+                prepared = _map_in_window(
+                    executor,
+                    prepare,
+                    new_entries,
+                    compress_workers * COMPRESS_WINDOW_PER_WORKER,
+                )
+
+            try:
+                with zipfile.ZipFile(
+                    temp_zip_path, "w", zipfile.ZIP_DEFLATED
+                ) as zip_ref:
+                    for arcname, _crc, load in entries:
+                        if arcname in reusable and raw_copy:
+                            old_info = existing[arcname]
+                            raw_data = read_raw_entry(output_zip_path, old_info)
+                            write_raw_entry(zip_ref, old_info, raw_data)
+                        elif arcname in reusable:
+                            method, level = compression(arcname)
+                            _write_stream_entry(
+                                zip_ref,
+                                arcname,
+                                _open_reused_entry(output_zip_path, existing[arcname]),
+                                method,
+                                level,
+                            )
+                        elif prepared is not None:
+                            write_raw_entry(zip_ref, *next(prepared))
+                        else:
+                            method, level = compression(arcname)
+                            _write_loaded_entry(zip_ref, arcname, load(), method, level)
+            finally:
+                if executor is not None:
+                    executor.shutdown(wait=True)
+            os.replace(temp_zip_path, output_zip_path)
+            event.update(
+                ok=True,
+                skipped=False,
+                reused=len(reusable),
+                bytes=os.path.getsize(output_zip_path),
+            )
+
+            if reusable:
+                status_callback(
+                    f"Successfully updated {zip_name} "
+                    f"({len(entries) - len(reusable)} of {len(entries)} entries changed)",
+                    "lightgreen",
+                )
+            else:
+                status_callback(f"Successfully created {zip_name}", "lightgreen")
+            return True
+        except Exception as e:
+            status_callback(f"Error creating zip file: {e}", "red")
+            if temp_zip_path:
+                delete_item(temp_zip_path)
+            return False
+
+
+def _read_file_bytes(path):
+    """Returns the content of a file."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def zip_files_gui(
+    output_zip_path,
+    updated_lua_path,
+    game_id,
+    extracted_manifest_paths,
+    status_callback,
+    **zip_options,
+):
+    """Zips the updated lua file and extracted manifest files.
+
+    Args:
+        output_zip_path (str): Path for the output zip file.
+        updated_lua_path (str): Path to the updated Lua file.
+        game_id (str): The game ID.
+        extracted_manifest_paths (list): List of paths to extracted .manifest files.
+        status_callback (function): Callback to report status.
+        **zip_options: incremental, compression and compress_workers, passed on
+            to write_output_zip.
+
+    Returns:
+        bool: True if zipping was successful, False otherwise.
+    """
+    if not updated_lua_path or not os.path.exists(updated_lua_path):
+        status_callback(
+            "Error: Temporary updated Lua file not found for zipping.", "red"
+        )
+        return False
+    lua_bytes = _read_file_bytes(updated_lua_path)
+
+    entries = [(f"{game_id}.lua", zlib.crc32(lua_bytes), lambda: lua_bytes)]
+    for manifest_path in extracted_manifest_paths:
+        if os.path.exists(manifest_path):
+            entries.append(
+                (
+                    os.path.basename(manifest_path),
+                    None,
+                    lambda path=manifest_path: open(path, "rb"),
+                )
+            )
+
+    if len(entries) == 1 and extracted_manifest_paths:
+        status_callback(
+            "Warning: No extracted .manifest files were added to the zip (they might be missing).",
+            "orange",
+        )
+
+    return write_output_zip(output_zip_path, entries, status_callback, **zip_options)
+
+
+def _lua_entry(game_id, updated_lua_content):
+    """Returns the write_output_zip entry for the updated Lua source."""
+    lua_bytes = updated_lua_content.encode("utf-8")
+    return f"{game_id}.lua", zlib.crc32(lua_bytes), lambda: lua_bytes
+
+
+def _open_manifest_entry(source_zip, file_info):
+    """Opens an archive entry for streaming into the output zip.
+
+    The stream carries the entry's uncompressed size as ``file_size`` so the
+    output entry gets the right (ZIP64 or not) header.
+    """
+    stream = source_zip.open(file_info)
+    stream.file_size = file_info.file_size
+    return stream
+
+
+def zip_from_archive_gui(
+    output_zip_path,
+    updated_lua_content,
+    game_id,
+    source_zip,
+    status_callback,
+    manifest_store=None,
+    depot_ids=None,
+    **zip_options,
+):
+    """Writes the output zip straight from a downloaded archive, without temp files.
+
+    Manifest entries are streamed from ``source_zip`` into the output archive
+    one at a time, within the limits set with configure_extraction, and the
+    updated Lua is written from memory. Selecting the entries is reported as
+    the extract stage; streaming them is part of the zip stage.
+
+    Args:
+        output_zip_path (str): Path for the output zip file.
+        updated_lua_content (str): The updated Lua source.
+        game_id (str): The game ID.
+        source_zip (zipfile.ZipFile): The downloaded branch archive.
+        status_callback (function): Callback to report status.
+        manifest_store (ManifestStore): Optional store to read manifests from
+            and to add the ones it lacks to.
+        depot_ids (set): If given, only the manifests of these depots are
+            written (see lua_depot_ids).
+        **zip_options: incremental, compression and compress_workers, passed on
+            to write_output_zip.
+
+    Returns:
+        bool: True if zipping was successful, False otherwise.
+    """
+    with stage_timer(STAGE_EXTRACT) as event:
+        try:
+            selected = select_manifest_entries(source_zip, depot_ids)
+        except ArchiveLimitError as e:
+            status_callback(f"Error: Archive rejected: {e}.", "red")
+            return False
+        event.update(
+            ok=True,
+            entries=len(selected),
+            bytes=sum(file_info.file_size for file_info in selected),
+        )
+    manifest_entries = {
+        os.path.basename(file_info.filename): file_info for file_info in selected
+    }
+
+    def load_manifest(arcname, file_info):
+        if manifest_store is not None:
+            stored_path = manifest_store.ensure(
+                arcname, lambda: source_zip.open(file_info)
+            )
+            if stored_path:
+                return open(stored_path, "rb")
+        return _open_manifest_entry(source_zip, file_info)
+
+    entries = [_lua_entry(game_id, updated_lua_content)]
+    entries.extend(
+        (arcname, file_info.CRC, lambda a=arcname, i=file_info: load_manifest(a, i))
+        for arcname, file_info in manifest_entries.items()
+    )
+    return write_output_zip(output_zip_path, entries, status_callback, **zip_options)
+
+
+def zip_from_branch_files_gui(
+    output_zip_path,
+    updated_lua_content,
+    game_id,
+    repo,
+    branch,
+    manifest_paths,
+    status_callback,
+    manifest_store=None,
+    **zip_options,
+):
+    """Writes the output zip, fetching only the listed manifests from the branch.
+
+    Manifests already present in an existing output zip, or in
+    ``manifest_store``, are reused and not fetched again.
+
+    Args:
+        output_zip_path (str): Path for the output zip file.
+        updated_lua_content (str): The updated Lua source.
+        game_id (str): The game ID.
+        repo (str): GitHub repository path.
+        branch (str): Branch name.
+        manifest_paths (list): Paths of the .manifest files inside the branch.
+        status_callback (function): Callback to report status.
+        manifest_store (ManifestStore): Optional store to read manifests from
+            and to add fetched ones to.
+        **zip_options: incremental, compression and compress_workers, passed on
+            to write_output_zip.
+
+    Returns:
+        bool: True if zipping was successful, False otherwise.
+    """
+
+    def download_manifest(path):
+        data = fetch_branch_file(repo, branch, path, status_callback)
+        if data is None:
+            raise RuntimeError(f"could not fetch {os.path.basename(path)}")
+        return data
+
+    def fetch_manifest(path):
+        if manifest_store is None:
+            return download_manifest(path)
+        return manifest_store.fetch(path, lambda: download_manifest(path))
+
+    manifest_entries = {os.path.basename(path): path for path in manifest_paths}
+    entries = [_lua_entry(game_id, updated_lua_content)]
+    entries.extend(
+        (arcname, None, lambda path=path: fetch_manifest(path))
+        for arcname, path in manifest_entries.items()
+    )
+    return write_output_zip(output_zip_path, entries, status_callback, **zip_options)
+
+
+class SteamInfoCache:
+    """Persistent cache of Steam store metadata and capsule images by app ID.
+
+    Entries expire after ``ttl`` seconds. Once more than ``max_entries`` entries
+    or ``max_bytes`` of images are stored, the least recently used entries are
+    evicted. Call load() early (e.g. from a background thread at startup) so
+    that later lookups are served from memory.
+    """
+
+    def __init__(
+        self,
+        cache_dir=None,
+        ttl=STEAM_INFO_TTL,
+        max_entries=STEAM_INFO_MAX_ENTRIES,
+        max_bytes=STEAM_INFO_MAX_BYTES,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._index = {}
+        self._images = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _ensure_dir(self):
+        if self.cache_dir is None:
+            self.cache_dir = get_cache_dir("steam")
+        else:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        return self.cache_dir
+
+    def _index_path(self):
+        return os.path.join(self._ensure_dir(), "index.json")
+
+    def _image_path(self, app_id):
+        return os.path.join(self._ensure_dir(), f"{app_id}.png")
+
+    def load(self):
+        """Loads the index and all cached images into memory."""
+        with self._lock:
+            self._load_locked()
+
+    def _load_locked(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._index = {}
+        except Exception as e:
+            print(f"Warn: Error loading Steam info cache: {e}")
+            self._index = {}
+        now = time.time()
+        for app_id, entry in list(self._index.items()):
+            if now - entry["fetched_at"] > self.ttl:
+                self._remove_locked(app_id)
+                continue
+            if entry.get("image_size"):
+                try:
+                    with open(self._image_path(app_id), "rb") as f:
+                        self._images[app_id] = f.read()
+                except OSError:
+                    entry["image_size"] = 0
+
+    def _save_locked(self):
+        temp_path = f"{self._index_path()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._index, f)
+            os.replace(temp_path, self._index_path())
+        except Exception as e:
+            print(f"Warn: Error saving Steam info cache: {e}")
+
+    def _remove_locked(self, app_id):
+        self._index.pop(app_id, None)
+        self._images.pop(app_id, None)
+        delete_item(self._image_path(app_id))
+
+    def get(self, app_id):
+        """Returns the cached info for an app ID, or None if missing or expired.
+
+        Returns:
+            dict or None: Entry with "title", "description", "image_url",
+                "fetched_at" and "image" (PNG bytes or None).
+        """
+        app_id = str(app_id)
+        with self._lock:
+            self._load_locked()
+            entry = self._index.get(app_id)
+            if not entry:
+                return None
+            if time.time() - entry["fetched_at"] > self.ttl:
+                self._remove_locked(app_id)
+                self._save_locked()
+                return None
+            entry["last_used"] = time.time()
+            info = dict(entry)
+            info["image"] = self._images.get(app_id)
+            return info
+
+    def put(self, app_id, title, description, image_url, image_png=None):
+        """Stores info for an app ID, replacing any previous entry.
+
+        Args:
+            app_id (str): Steam app ID.
+            title (str): Game title, if known.
+            description (str): Text shown for the game.
+            image_url (str): Capsule image URL, if any.
+            image_png (bytes): Resized capsule image as PNG, if any.
+        """
+        app_id = str(app_id)
+        with self._lock:
+            self._load_locked()
+            now = time.time()
+            self._index[app_id] = {
+                "title": title,
+                "description": description,
+                "image_url": image_url,
+                "image_size": len(image_png) if image_png else 0,
+                "fetched_at": now,
+                "last_used": now,
+            }
+            if image_png:
+                try:
+                    with open(self._image_path(app_id), "wb") as f:
+                        f.write(image_png)
+                    self._images[app_id] = image_png
+                except OSError as e:
+                    print(f"Warn: Error caching image for {app_id}: {e}")
+                    self._index[app_id]["image_size"] = 0
+            else:
+                self._images.pop(app_id, None)
+                delete_item(self._image_path(app_id))
+            self._evict_locked()
+            self._save_locked()
+
+    def _evict_locked(self):
+        total = sum(entry["image_size"] for entry in self._index.values())
+        by_age = sorted(self._index.items(), key=lambda item: item[1]["last_used"])
+        for app_id, entry in by_age:
+            if len(self._index) <= self.max_entries and total <= self.max_bytes:
+                break
+            total -= entry["image_size"]
+            self._remove_locked(app_id)
+
+
+_STEAM_DESC_DIV_RE = re.compile(
+    r"""<div\b[^>]*\bclass\s*=\s*["']?[^"'>]*\bdesc\b""", re.IGNORECASE
+)
+
+
+class _SteamWidgetParser(HTMLParser):
+    """Streaming parser that collects the parts of a Steam widget's desc block.
+
+    Mirrors the BeautifulSoup lookups used for the widget: the first
+    ``div.desc``, the first ``img.capsule`` and the first ``a`` inside it, and a
+    ``span.title`` inside that link.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.found = False
+        self.done = False
+        self.image_url = None
+        self.image_alt = ""
+        self.has_capsule = False
+        self.has_link = False
+        self.title_parts = None
+        self.link_parts = []
+        self.desc_parts = []
+        self._div_depth = 0
+        self._link_depth = 0
+        self._link_seen = False
+        self._title_depth = 0
+
+    @staticmethod
+    def _classes(attrs):
+        for name, value in attrs:
+            if name == "class" and value:
+                return value.split()
+        return ()
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if not self.found:
+            if tag == "div" and "desc" in self._classes(attrs):
+                self.found = True
+                self._div_depth = 1
+            return
+        if tag == "div":
+            self._div_depth += 1
+        elif tag == "img" and not self.has_capsule:
+            if "capsule" in self._classes(attrs):
+                self.has_capsule = True
+                attr_map = dict(attrs)
+                self.image_url = attr_map.get("src") or None
+                self.image_alt = attr_map.get("alt") or ""
+        elif tag == "a":
+            if self._link_depth:
+                self._link_depth += 1
+            elif not self._link_seen:
+                self._link_seen = True
+                self.has_link = True
+                self._link_depth = 1
+        elif tag == "span" and self._link_depth:
+            if self._title_depth:
+                self._title_depth += 1
+            elif self.title_parts is None and "title" in self._classes(attrs):
+                self.title_parts = []
+                self._title_depth = 1
+
+    def handle_endtag(self, tag):
+        if self.done or not self.found:
+            return
+        if tag == "div":
+            self._div_depth -= 1
+            if self._div_depth == 0:
+                self.done = True
+        elif tag == "a" and self._link_depth:
+            self._link_depth -= 1
+        elif tag == "span" and self._title_depth:
+            self._title_depth -= 1
+
+    def handle_data(self, data):
+        if self.done or not self.found:
+            return
+        text = data.strip()
+        if not text:
+            return
+        self.desc_parts.append(text)
+        if self._link_depth:
+            self.link_parts.append(text)
+        if self._title_depth:
+            self.title_parts.append(text)
+
+
+def _parse_steam_widget_fast(html):
+    """Extracts the widget's desc block parts with the streaming parser.
+
+    Returns:
+        dict or None: The parts (see parse_steam_widget), or None if no
+            ``div.desc`` was found.
+    """
+    match = _STEAM_DESC_DIV_RE.search(html)
+    if not match:
+        return None
+    parser = _SteamWidgetParser()
+    for offset in range(match.start(), len(html), STEAM_WIDGET_PARSE_CHUNK):
+        parser.feed(html[offset : offset + STEAM_WIDGET_PARSE_CHUNK])
+        if parser.done:
+            break
+    if not parser.found:
+        return None
+    return {
+        "image_url": parser.image_url,
+        "image_alt": parser.image_alt,
+        "has_link": parser.has_link,
+        "title": (
+            "".join(parser.title_parts) if parser.title_parts is not None else None
+        ),
+        "link_text": "".join(parser.link_parts),
+        "desc_text": " ".join(parser.desc_parts),
+    }
+
+
+def _parse_steam_widget_bs4(html):
+    """Extracts the widget's desc block parts with BeautifulSoup."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    desc_div = soup.find("div", class_="desc")
+    if not desc_div:
+        return None
+    img_tag = desc_div.find("img", class_="capsule")
+    link_tag = desc_div.find("a")
+    name_span = link_tag.find("span", class_="title") if link_tag else None
+    return {
+        "image_url": (img_tag.get("src") or None) if img_tag else None,
+        "image_alt": img_tag.get("alt", "") if img_tag else "",
+        "has_link": link_tag is not None,
+        "title": name_span.get_text(strip=True) if name_span else None,
+        "link_text": link_tag.get_text(strip=True) if link_tag else "",
+        "desc_text": desc_div.get_text(separator=" ", strip=True),
+    }
+
+
+def parse_steam_widget(html, game_id):
+    """Extracts title, description and capsule image URL from Steam widget HTML.
+
+    Uses a lightweight streaming parser and only falls back to BeautifulSoup
+    when that parser fails or finds no desc block.
+
+    Args:
+        html (str): The widget page HTML.
+        game_id (str): Steam app ID, used for the fallback description.
+
+    Returns:
+        tuple or None: (title, description, image_url), or None if the page has
+            no game info.
+    """
+    try:
+        parts = _parse_steam_widget_fast(html)
+    except Exception as e:
+        print(f"Warn: Fast widget parse failed for {game_id}: {e}")
+        parts = None
+    if parts is None:
+        parts = _parse_steam_widget_bs4(html)
+    if parts is None:
+        return None
+
+    title = parts["title"]
+    description = None
+    if parts["has_link"]:
+        description = title if title is not None else parts["link_text"]
+
+    if not description or len(description) < 5:
+        description = parts["desc_text"]
+        if parts["image_alt"]:
+            description = description.replace(parts["image_alt"], "").strip()
+
+    if not description:
+        description = f"Game ID: {game_id}"
+    return title, description, parts["image_url"]
+
+
+def fetch_steam_app_info(game_id):
+    """Fetches a game's title, description and capsule image URL from Steam.
+
+    Args:
+        game_id (str): Steam app ID.
+
+    Returns:
+        tuple: (title, description, image_url, error_msg). On failure
+            error_msg is set and the other values may be None.
+    """
+    widget_url = f"https://store.steampowered.com/widget/{game_id}/"
+    headers = {"User-Agent": "Mozilla/5.0", "Accept-Language": "en-US,en;q=0.5"}
+    title, image_url, description, error_msg = None, None, None, None
+
+    try:
+        response = http_get(widget_url, headers=headers, timeout=10)
+        response.raise_for_status()
+        parsed = parse_steam_widget(response.text, game_id)
+        if parsed:
+            title, description, image_url = parsed
+        else:
+            error_msg = f"Game info not found for ID: {game_id}"
+
+    except requests.exceptions.RequestException as e:
+        error_msg = f"Network error fetching game info for {game_id}."
+        print(f"{error_msg} Details: {e}")
+    except Exception as e:
+        error_msg = f"Error parsing game info for {game_id}."
+        print(f"{error_msg} Details: {e}")
+
+    return title, description, image_url, error_msg
+
+
+def find_lua_files(inputs):
+    """Expands a list of files and directories into .lua file paths.
+
+    Args:
+        inputs (list): Paths to .lua files and/or directories to search recursively.
+
+    Returns:
+        list: Unique .lua file paths, in the order they were found.
+    """
+    found = []
+    seen = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = []
+            for root, _dirs, files in os.walk(item):
+                for name in files:
+                    if name.lower().endswith(".lua"):
+                        candidates.append(os.path.join(root, name))
+            candidates.sort()
+        elif os.path.isfile(item) and item.lower().endswith(".lua"):
+            candidates = [item]
+        else:
+            continue
+        for path in candidates:
+            key = os.path.normcase(os.path.abspath(path))
+            if key not in seen:
+                seen.add(key)
+                found.append(path)
+    return found
+
+
+def read_lua_text(path):
+    """Reads a Lua file once and returns its text.
+
+    Files of LUA_MMAP_THRESHOLD bytes or more are memory-mapped and decoded
+    straight from the mapping, without an intermediate bytes copy.
+
+    Args:
+        path (str): Path to the .lua file.
+
+    Returns:
+        str: The file content, decoded as UTF-8.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < LUA_MMAP_THRESHOLD:
+            return f.read().decode("utf-8")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return str(view, "utf-8")
+
+
+def inventory_lua_file(lua_path):
+    """Reads the game ID and all depot/manifest pairs of one Lua file.
+
+    Args:
+        lua_path (str): Path to the .lua file.
+
+    Returns:
+        dict: Record with keys "lua_path", "game_id", "manifests" (depot ID to
+            manifest ID, see read_lua_manifests), "bytes" and "error" (None
+            unless the file could not be read or has no game ID).
+    """
+    record = {
+        "lua_path": lua_path,
+        "game_id": None,
+        "manifests": {},
+        "bytes": 0,
+        "error": None,
+    }
+    try:
+        record["bytes"] = os.path.getsize(lua_path)
+        content = read_lua_text(lua_path)
+    except Exception as e:
+        record["error"] = f"Error reading Lua file: {e}"
+        return record
+    record["game_id"], record["manifests"] = read_lua_manifests(content)
+    if not record["game_id"]:
+        record["error"] = "Game ID not found in the Lua file."
+    return record
+
+
+def _inventory_chunk(lua_paths):
+    """Process pool task: inventories a chunk of Lua files."""
+    return [inventory_lua_file(lua_path) for lua_path in lua_paths]
+
+
+def inventory_lua_files(lua_paths, workers=None, chunk_files=LUA_SCAN_CHUNK_FILES):
+    """Inventories many Lua files, parsing them in a process pool.
+
+    The files are handed to the pool in chunks of ``chunk_files`` so that
+    tens of thousands of small files do not cost one task each. Inputs that
+    fit in a single chunk are parsed in this process.
+
+    Args:
+        lua_paths (list): Paths to .lua files and/or directories containing them.
+        workers (int): Maximum worker processes; defaults to the CPU count.
+            1 parses everything in this process.
+        chunk_files (int): Files per pool task.
+
+    Returns:
+        list: One record per .lua file (see inventory_lua_file), in input order.
+    """
+    lua_files = find_lua_files(lua_paths)
+    chunk_files = max(1, chunk_files)
+    chunks = [
+        lua_files[start : start + chunk_files]
+        for start in range(0, len(lua_files), chunk_files)
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        return _inventory_chunk(lua_files)
+    records = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_records in executor.map(_inventory_chunk, chunks):
+            records.extend(chunk_records)
+    return records
+
+
+def summarize_lua_inventory(records):
+    """Condenses inventory records into library-wide totals.
+
+    Args:
+        records (list): Records as returned by inventory_lua_files.
+
+    Returns:
+        dict: "files", "bytes", "invalid", "games" (distinct game IDs),
+            "duplicate_games" (game IDs found in more than one file),
+            "depots" (distinct depot IDs) and "manifests" (setManifestid
+            calls in total).
+    """
+    files_per_game = {}
+    depots = set()
+    manifests = 0
+    for record in records:
+        if record["game_id"]:
+            files_per_game[record["game_id"]] = (
+                files_per_game.get(record["game_id"], 0) + 1
+            )
+        depots.update(record["manifests"])
+        manifests += len(record["manifests"])
+    return {
+        "files": len(records),
+        "bytes": sum(record["bytes"] for record in records),
+        "invalid": sum(1 for record in records if record["error"]),
+        "games": len(files_per_game),
+        "duplicate_games": sorted(
+            game_id for game_id, count in files_per_game.items() if count > 1
+        ),
+        "depots": len(depots),
+        "manifests": manifests,
+    }
+
+
+def format_inventory_summary(summary):
+    """Formats a summarize_lua_inventory result as a short text block."""
+    lines = [
+        f"Files: {summary['files']} ({_format_mb(summary['bytes'])} MB)  "
+        f"Invalid: {summary['invalid']}",
+        f"Games: {summary['games']}  Depots: {summary['depots']}  "
+        f"Manifest IDs: {summary['manifests']}",
+    ]
+    if summary["duplicate_games"]:
+        shown = ", ".join(summary["duplicate_games"][:10])
+        more = len(summary["duplicate_games"]) - 10
+        lines.append(
+            f"Games in several files: {shown}"
+            + (f" (+{more} more)" if more > 0 else "")
+        )
+    return "\n".join(lines)
+
+
+def print_status(message, color="white"):
+    """Default status callback for headless runs; prints the message to stdout."""
+    print(message, flush=True)
+
+
+def _archive_manifest_names(zip_path):
+    """Returns the names of all manifests in a zip, or [] if it is unreadable."""
+    try:
+        with zipfile.ZipFile(zip_path) as zip_ref:
+            return [file_info.filename for file_info in list_manifest_entries(zip_ref)]
+    except (zipfile.BadZipFile, OSError):
+        return []
+
+
+def branch_manifest_paths(branch_files):
+    """Returns the manifest paths in a branch listing, skipping unsafe paths.
+
+    Args:
+        branch_files (list): Entries as returned by list_branch_files.
+
+    Returns:
+        list: Relative paths of the branch's .manifest files.
+    """
+    return [
+        entry["path"]
+        for entry in branch_files
+        if entry["path"].endswith(".manifest")
+        and not entry["path"].startswith("/")
+        and ".." not in entry["path"]
+    ]
+
+
+def open_source_archive(archive, game_id, status_callback):
+    """Opens a downloaded branch archive for reading.
+
+    Args:
+        archive: Open binary file (or path) with the branch zip.
+        game_id (str): The game ID, used in messages.
+        status_callback (function): Callback to report status.
+
+    Returns:
+        zipfile.ZipFile or None: The opened archive, or None if it is invalid.
+    """
+    status_callback("Extracting files...", "orange")
+    try:
+        return zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        status_callback(
+            f"Error: Downloaded file '{game_id}.zip' is not a valid zip archive.",
+            "red",
+        )
+        return None
+
+
+def rewrite_lua_manifests(
+    lua_content,
+    manifest_names,
+    game_id,
+    repo,
+    status_callback,
+    where="archive",
+    manifest_index=None,
+    depot_ids=None,
+):
+    """Records a branch's manifests and rewrites the Lua source with their IDs.
+
+    Args:
+        lua_content (str): The original Lua source.
+        manifest_names (list): Every manifest name or path in the branch.
+        game_id (str): The game ID (branch name).
+        repo (str): Repository the manifests came from.
+        status_callback (function): Callback to report status.
+        where (str): "archive" or "branch", used in messages.
+        manifest_index (ManifestIndex): Optional index to record the full
+            listing in.
+        depot_ids (set): Only keep manifests of these depots (None keeps all).
+
+    Returns:
+        tuple: (updated Lua source, list of the manifest names that were kept).
+    """
+    if not manifest_names:
+        status_callback(f"No manifest files found in the {where} to process.", "orange")
+    record_branch_manifests(manifest_index, game_id, repo, manifest_names)
+    manifest_names = select_manifest_names(manifest_names, depot_ids)
+    status_callback("Updating Lua file with new Manifest IDs...", "orange")
+    updated_content = update_lua_content(lua_content, manifest_names, status_callback)
+    return updated_content, manifest_names
+
+
+def write_update_zip(
+    output_zip_path,
+    updated_lua_content,
+    game_id,
+    status_callback,
+    source_zip=None,
+    repo=None,
+    manifest_paths=None,
+    manifest_store=None,
+    depot_ids=None,
+    **zip_options,
+):
+    """Writes the output zip from an open archive or from branch file paths.
+
+    With ``source_zip`` the manifests are streamed from the downloaded archive
+    (see zip_from_archive_gui); otherwise ``manifest_paths`` are fetched from
+    ``repo`` (see zip_from_branch_files_gui).
+
+    Returns:
+        bool: True on success, False on failure.
+    """
+    if source_zip is not None:
+        return zip_from_archive_gui(
+            output_zip_path,
+            updated_lua_content,
+            game_id,
+            source_zip,
+            status_callback,
+            manifest_store=manifest_store,
+            depot_ids=depot_ids,
+            **zip_options,
+        )
+    return zip_from_branch_files_gui(
+        output_zip_path,
+        updated_lua_content,
+        game_id,
+        repo,
+        game_id,
+        manifest_paths,
+        status_callback,
+        manifest_store=manifest_store,
+        **zip_options,
+    )
+
+
+def _update_from_buffer(
+    archive,
+    lua_content,
+    game_id,
+    final_zip_path,
+    report,
+    result,
+    zip_options,
+    manifest_store,
+    manifest_index,
+    depot_ids,
+):
+    """In-memory variant of the pipeline used by update_single_lua.
+
+    Closes ``archive`` (an open binary file with the branch zip) when done.
+    """
+    with archive:
+        source_zip = open_source_archive(archive, game_id, report)
+        if source_zip is None:
+            return False
+
+        with source_zip:
+            updated_content, _ = rewrite_lua_manifests(
+                lua_content,
+                [file_info.filename for file_info in list_manifest_entries(source_zip)],
+                game_id,
+                result["repo"],
+                report,
+                manifest_index=manifest_index,
+                depot_ids=depot_ids,
+            )
+            result["changed"] = updated_content != lua_content
+            return write_update_zip(
+                final_zip_path,
+                updated_content,
+                game_id,
+                report,
+                source_zip=source_zip,
+                manifest_store=manifest_store,
+                depot_ids=depot_ids,
+                **zip_options,
+            )
+
+
+def update_single_lua(
+    original_lua_path,
+    repo_path,
+    output_base_dir,
+    status_callback,
+    in_memory=False,
+    cache=None,
+    ids_only=False,
+    dry_run=False,
+    race_repos=None,
+    race_strategy=RACE_FIRST,
+    zip_options=None,
+    monitor=None,
+    manifest_store=None,
+    manifest_index=None,
+    include_extras=False,
+):
+    """Runs download, extraction, Lua update and zipping for one .lua file.
+
+    This is the GUI-free pipeline shared by the app and by batch runs. Each call
+    works in its own temporary directory, so several calls can run concurrently.
+
+    Args:
+        original_lua_path (str): Path to the .lua file to update.
+        repo_path (str): GitHub repository path ("username/repository").
+        output_base_dir (str): Directory to write the final <game_id>.zip into.
+        status_callback (function): Callback to report status (message, color).
+        in_memory (bool): Keep the downloaded archive in a spooled buffer and
+            stream manifests directly into the output zip instead of going
+            through a temporary directory.
+        cache (ArchiveCache): Optional archive cache. Unchanged branches are
+            answered with 304 Not Modified and read from the cache.
+        ids_only (bool): Learn the new manifest IDs from the branch file listing
+            instead of downloading the branch archive. Manifest files are then
+            fetched one by one, and only when the output zip is written.
+        dry_run (bool): With ids_only, only report whether the Lua would change
+            and write no output.
+        race_repos (list): Query all of these repositories at once and use the
+            archive picked by ``race_strategy`` (see race_repositories) instead
+            of ``repo_path``. Runs in memory and bypasses the archive cache.
+            Ignored with ids_only, which never downloads archives.
+        race_strategy (str): RACE_FIRST or RACE_NEWEST.
+        zip_options (dict): Options for writing the output zip (incremental,
+            compression, compress_workers); see write_output_zip.
+        monitor (TransferMonitor): Optional monitor to report the progress of
+            archive downloads to.
+        manifest_store (ManifestStore): Optional store that manifests are
+            extracted into and zipped from. Manifests it already holds are
+            neither extracted nor fetched again.
+        manifest_index (ManifestIndex): Optional index to record the branch's
+            current manifest IDs in.
+        include_extras (bool): Also extract and zip manifests of depots the
+            Lua file does not reference. By default only the manifests of
+            depots named in its addappid/setManifestid calls are read from the
+            archive (or fetched, with ids_only) and zipped.
+
+    Returns:
+        dict: Result with keys "lua_path", "game_id", "success", "output_path",
+            "error", "duration", "changed" (True/False when known, else None)
+            and "repo" (the repository that was used).
+    """
+    result = {
+        "lua_path": original_lua_path,
+        "game_id": None,
+        "success": False,
+        "output_path": None,
+        "error": None,
+        "duration": 0.0,
+        "changed": None,
+        "repo": repo_path,
+    }
+    start_time = time.monotonic()
+    zip_options = zip_options or {}
+
+    def report(message, color="white"):
+        if color == "red":
+            result["error"] = message
+        status_callback(message, color)
+
+    temp_base_dir = None
+    metrics_token = None
+    pin_token = None
+    try:
+        if manifest_store is not None:
+            pin_token = manifest_store.hold()
+        report(f"Reading file: {os.path.basename(original_lua_path)}", "orange")
+        try:
+            if not os.path.isfile(original_lua_path):
+                report(
+                    f"Error: Input file disappeared: {os.path.basename(original_lua_path)}",
+                    "red",
+                )
+                return result
+            with open(original_lua_path, "r", encoding="utf-8") as f:
+                content = f.read()
+            game_id = get_game_id_from_content(content)
+            if not game_id:
+                report("Error: Game ID not found in the Lua file.", "red")
+                return result
+            result["game_id"] = game_id
+            depot_ids = None if include_extras else lua_depot_ids(content)
+            metrics_token = set_job_fields(game_id=game_id, lua_path=original_lua_path)
+            report(f"Found Game ID: {game_id}", "lightblue")
+        except Exception as e:
+            report(f"Error reading input Lua file: {e}", "red")
+            return result
+
+        final_zip_path = os.path.join(output_base_dir, f"{game_id}.zip")
+        url = archive_url(repo_path, game_id)
+        if race_repos and not ids_only:
+            raced = race_repositories(
+                race_repos, game_id, report, strategy=race_strategy, monitor=monitor
+            )
+            if raced is None:
+                return result
+            result["repo"], archive = raced
+            if not _update_from_buffer(
+                archive,
+                content,
+                game_id,
+                final_zip_path,
+                report,
+                result,
+                zip_options,
+                manifest_store,
+                manifest_index,
+                depot_ids,
+            ):
+                return result
+            result["success"] = True
+            result["output_path"] = final_zip_path
+            result["error"] = None
+            return result
+
+        report(f"Using repo: {repo_path} for branch {game_id}", "lightblue")
+
+        if ids_only:
+            branch_files = list_branch_files(repo_path, game_id, report)
+            if branch_files is None:
+                return result
+            updated_content, manifest_paths = rewrite_lua_manifests(
+                content,
+                branch_manifest_paths(branch_files),
+                game_id,
+                repo_path,
+                report,
+                where="branch",
+                manifest_index=manifest_index,
+                depot_ids=depot_ids,
+            )
+            result["changed"] = updated_content != content
+            if not dry_run and not write_update_zip(
+                final_zip_path,
+                updated_content,
+                game_id,
+                report,
+                repo=repo_path,
+                manifest_paths=manifest_paths,
+                manifest_store=manifest_store,
+                **zip_options,
+            ):
+                return result
+            result["success"] = True
+            result["output_path"] = None if dry_run else final_zip_path
+            result["error"] = None
+            return result
+
+        if in_memory:
+            if cache is not None:
+                cached_path = download_archive_cached(
+                    url, repo_path, game_id, cache, report, monitor=monitor
+                )
+                archive = open(cached_path, "rb") if cached_path else None
+            else:
+                archive = download_to_buffer(
+                    url, f"{game_id}.zip", report, monitor=monitor
+                )
+            if archive is None:
+                report(
+                    f"Download from GitHub ({repo_path}, branch {game_id}) failed.",
+                    "red",
+                )
+                return result
+            if not _update_from_buffer(
+                archive,
+                content,
+                game_id,
+                final_zip_path,
+                report,
+                result,
+                zip_options,
+                manifest_store,
+                manifest_index,
+                depot_ids,
+            ):
+                return result
+            result["success"] = True
+            result["output_path"] = final_zip_path
+            result["error"] = None
+            return result
+
+        temp_root = os.getenv("TEMP") or tempfile.gettempdir()
+        os.makedirs(temp_root, exist_ok=True)
+        temp_base_dir = tempfile.mkdtemp(
+            prefix=f"lua_manifest_updater_{game_id}_", dir=temp_root
+        )
+        temp_extract_dir = os.path.join(temp_base_dir, f"extracted_{game_id}")
+        downloaded_zip_path = os.path.join(temp_base_dir, f"downloaded_{game_id}.zip")
+        os.makedirs(temp_extract_dir, exist_ok=True)
+
+        if cache is not None:
+            downloaded_zip_path = download_archive_cached(
+                url, repo_path, game_id, cache, report, monitor=monitor
+            )
+            download_ok = downloaded_zip_path is not None
+        else:
+            download_ok = download_file(
+                url, downloaded_zip_path, report, monitor=monitor
+            )
+        if not download_ok:
+            report(
+                f"Download from GitHub ({repo_path}, branch {game_id}) failed.", "red"
+            )
+            return result
+
+        if manifest_index is not None and depot_ids is not None:
+            record_branch_manifests(
+                manifest_index,
+                game_id,
+                repo_path,
+                _archive_manifest_names(downloaded_zip_path),
+            )
+        extracted_manifest_paths = extract_files_gui(
+            downloaded_zip_path, temp_extract_dir, report, manifest_store, depot_ids
+        )
+        if extracted_manifest_paths is None:
+            return result
+
+        if not extracted_manifest_paths:
+            report("No manifest files found in the archive to process.", "orange")
+        if depot_ids is None:
+            record_branch_manifests(
+                manifest_index, game_id, repo_path, extracted_manifest_paths
+            )
+
+        temp_updated_lua_path = update_lua_file_gui(
+            original_lua_path,
+            extracted_manifest_paths,
+            game_id,
+            temp_base_dir,
+            report,
+        )
+        if not temp_updated_lua_path:
+            return result
+
+        if not zip_files_gui(
+            final_zip_path,
+            temp_updated_lua_path,
+            game_id,
+            extracted_manifest_paths,
+            report,
+            **zip_options,
+        ):
+            return result
+
+        result["success"] = True
+        result["output_path"] = final_zip_path
+        result["error"] = None
+        return result
+    except Exception as e:
+        report(f"An unexpected error occurred: {e}", "red")
+        import traceback
+
+        traceback.print_exc()
+        return result
+    finally:
+        if temp_base_dir and os.path.exists(temp_base_dir):
+            status_callback("Cleaning up temporary files...", "gray")
+            delete_item(temp_base_dir)
+        if pin_token is not None:
+            manifest_store.release(pin_token)
+        if metrics_token is not None:
+            reset_job_fields(metrics_token)
+        result["duration"] = time.monotonic() - start_time
+
+
+def batch_update(
+    lua_paths,
+    repo_path,
+    output_base_dir,
+    max_workers=BATCH_MAX_WORKERS,
+    status_callback=print_status,
+    in_memory=False,
+    cache=None,
+    ids_only=False,
+    dry_run=False,
+    race_repos=None,
+    race_strategy=RACE_FIRST,
+    zip_options=None,
+    monitor=None,
+    manifest_store=None,
+    manifest_index=None,
+    include_extras=False,
+):
+    """Updates many .lua files concurrently using a bounded worker pool.
+
+    Args:
+        lua_paths (list): Paths to .lua files and/or directories containing them.
+        repo_path (str): GitHub repository path ("username/repository").
+        output_base_dir (str): Directory to write the final zip files into.
+        max_workers (int): Maximum number of files processed at the same time.
+        status_callback (function): Callback to report status (message, color).
+            Messages are prefixed with the name of the file they belong to.
+        in_memory (bool): Use the in-memory pipeline (see update_single_lua).
+        cache (ArchiveCache): Optional archive cache shared by all workers.
+        ids_only (bool): Use the branch file listing (see update_single_lua).
+        dry_run (bool): With ids_only, only report which Lua files would change.
+        race_repos (list): Race these repositories per file (see update_single_lua).
+        race_strategy (str): RACE_FIRST or RACE_NEWEST.
+        zip_options (dict): Options for writing the output zips; see
+            write_output_zip.
+        monitor (TransferMonitor): Optional monitor for all downloads of the
+            batch; its totals are added to the final summary.
+        manifest_store (ManifestStore): Optional manifest store shared by all
+            workers, so a depot used by several games is handled once.
+        manifest_index (ManifestIndex): Optional index to record the current
+            manifest IDs of every processed branch in.
+        include_extras (bool): Also zip manifests the Lua files do not
+            reference (see update_single_lua).
+
+    Returns:
+        list: One result dict per .lua file (see update_single_lua), in input order.
+    """
+    lua_files = find_lua_files(lua_paths)
+    if not lua_files:
+        status_callback("No .lua files found to process.", "orange")
+        return []
+
+    os.makedirs(output_base_dir, exist_ok=True)
+    ensure_http_pool(max_workers)
+    status_callback(
+        f"Processing {len(lua_files)} Lua file(s) with up to {max_workers} workers...",
+        "lightblue",
+    )
+
+    def run_one(lua_path):
+        prefix = os.path.basename(lua_path)
+        return update_single_lua(
+            lua_path,
+            repo_path,
+            output_base_dir,
+            lambda message, color="white": status_callback(
+                f"[{prefix}] {message}", color
+            ),
+            in_memory=in_memory,
+            cache=cache,
+            ids_only=ids_only,
+            dry_run=dry_run,
+            race_repos=race_repos,
+            race_strategy=race_strategy,
+            zip_options=zip_options,
+            monitor=monitor,
+            manifest_store=manifest_store,
+            manifest_index=manifest_index,
+            include_extras=include_extras,
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(run_one, lua_files))
+
+    succeeded = sum(1 for r in results if r["success"])
+    summary = f" ({format_transfer_summary(monitor.snapshot())})" if monitor else ""
+    status_callback(
+        f"Batch finished: {succeeded}/{len(results)} succeeded{summary}.",
+        "lime" if succeeded == len(results) else "orange",
+    )
+    return results
+
+
+def format_batch_report(results):
+    """Formats batch results as a human-readable text report.
+
+    Args:
+        results (list): Result dicts as returned by batch_update.
+
+    Returns:
+        str: The report text.
+    """
+    succeeded = [r for r in results if r["success"]]
+    failed = [r for r in results if not r["success"]]
+    total_time = sum(r["duration"] for r in results)
+    lines = [
+        f"{APP_NAME} batch report",
+        f"Total: {len(results)}  Succeeded: {len(succeeded)}  Failed: {len(failed)}",
+        f"Cumulative processing time: {total_time:.1f}s",
+        "",
+    ]
+    for r in results:
+        name = os.path.basename(r["lua_path"])
+        game = r["game_id"] or "?"
+        if r["success"] and not r["output_path"]:
+            state = "outdated" if r.get("changed") else "up to date"
+            lines.append(f"DRY   {name} (game {game}): {state}")
+        elif r["success"]:
+            lines.append(f"OK    {name} (game {game}) -> {r['output_path']}")
+        else:
+            lines.append(f"FAIL  {name} (game {game}): {r['error'] or 'unknown error'}")
+    return "\n".join(lines)
+
+
+def write_batch_report(results, report_path):
+    """Writes batch results to a JSON file.
+
+    Args:
+        results (list): Result dicts as returned by batch_update.
+        report_path (str): Path of the JSON report to write.
+
+    Returns:
+        bool: True if the report was written, False otherwise.
+    """
+    try:
+        report_dir = os.path.dirname(report_path)
+        if report_dir:
+            os.makedirs(report_dir, exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+        return True
+    except Exception as e:
+        print(f"Warn: Error writing batch report {report_path}: {e}")
+        return False
+
+
+class ManifestIndex:
+    """Persistent SQLite index of the newest known manifest IDs per game.
+
+    Maps each app ID to its depot IDs, their current manifest IDs and the
+    repository they came from. Every update run records what it learned
+    about the games it processed, so the index is refreshed incrementally
+    and scan_lua_files can tell which Lua files are outdated without any
+    network access. Safe to share between threads.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), MANIFEST_INDEX_FILE)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS apps ("
+                "app_id TEXT PRIMARY KEY, repo TEXT, checked REAL, changed REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS depots ("
+                "app_id TEXT NOT NULL, depot_id TEXT NOT NULL, "
+                "manifest_id TEXT NOT NULL, PRIMARY KEY (app_id, depot_id)) "
+                "WITHOUT ROWID"
+            )
+
+    def record(self, app_id, repo, manifest_map):
+        """Stores the manifest IDs a branch currently has.
+
+        Only depots whose manifest ID changed are written.
+
+        Args:
+            app_id (str): The game ID (branch name).
+            repo (str): Repository the manifests came from.
+            manifest_map (dict): Depot ID (str) to manifest ID (str), as
+                returned by build_manifest_map.
+
+        Returns:
+            bool: True if the game's depots changed since the last record.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            old = dict(
+                self._conn.execute(
+                    "SELECT depot_id, manifest_id FROM depots WHERE app_id = ?",
+                    (app_id,),
+                )
+            )
+            changed = old != manifest_map
+            if changed:
+                self._conn.executemany(
+                    "DELETE FROM depots WHERE app_id = ? AND depot_id = ?",
+                    [(app_id, depot) for depot in old if depot not in manifest_map],
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO depots VALUES (?, ?, ?)",
+                    [
+                        (app_id, depot, manifest_id)
+                        for depot, manifest_id in manifest_map.items()
+                        if old.get(depot) != manifest_id
+                    ],
+                )
+            row = self._conn.execute(
+                "SELECT changed FROM apps WHERE app_id = ?", (app_id,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO apps VALUES (?, ?, ?, ?)",
+                (app_id, repo, now, now if changed or not row else row[0]),
+            )
+        return changed
+
+    def get(self, app_id):
+        """Returns what is known about a game, or None if it was never recorded.
+
+        Returns:
+            dict or None: Entry with "app_id", "repo", "checked" and "changed"
+                (Unix times) and "depots" (depot ID to manifest ID).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT repo, checked, changed FROM apps WHERE app_id = ?", (app_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            depots = dict(
+                self._conn.execute(
+                    "SELECT depot_id, manifest_id FROM depots WHERE app_id = ?",
+                    (app_id,),
+                )
+            )
+        repo, checked, changed = row
+        return {
+            "app_id": app_id,
+            "repo": repo,
+            "checked": checked,
+            "changed": changed,
+            "depots": depots,
+        }
+
+    def close(self):
+        """Closes the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def record_branch_manifests(manifest_index, game_id, repo, manifest_names):
+    """Records a branch's manifests in the index, if there is one.
+
+    A failing index is reported and skipped so it cannot break an update.
+
+    Args:
+        manifest_index (ManifestIndex): The index, or None to do nothing.
+        game_id (str): The game ID (branch name).
+        repo (str): Repository the branch belongs to.
+        manifest_names (list): Manifest file names or paths of the branch.
+    """
+    if manifest_index is None:
+        return
+    try:
+        manifest_index.record(game_id, repo, build_manifest_map(manifest_names))
+    except Exception as e:
+        print(f"Warn: Error updating manifest index for {game_id}: {e}")
+
+
+def compare_with_index(record, manifest_index):
+    """Compares one inventoried Lua file with the manifest index.
+
+    Args:
+        record (dict): Inventory record as returned by inventory_lua_file.
+        manifest_index (ManifestIndex): The index to compare with.
+
+    Returns:
+        dict: Result with keys "lua_path", "game_id", "status" (SCAN_CURRENT,
+            SCAN_OUTDATED, SCAN_UNKNOWN for games not in the index, or
+            SCAN_INVALID), "changes" (dicts with "depot", "old" and "new"),
+            "repo", "checked" and "error".
+    """
+    result = {
+        "lua_path": record["lua_path"],
+        "game_id": record["game_id"],
+        "status": SCAN_INVALID,
+        "changes": [],
+        "repo": None,
+        "checked": None,
+        "error": record["error"],
+    }
+    if result["error"]:
+        return result
+    entry = manifest_index.get(record["game_id"])
+    if entry is None:
+        result["status"] = SCAN_UNKNOWN
+        return result
+    result["repo"] = entry["repo"]
+    result["checked"] = entry["checked"]
+    result["changes"] = [
+        {"depot": depot, "old": manifest_id, "new": entry["depots"][depot]}
+        for depot, manifest_id in record["manifests"].items()
+        if entry["depots"].get(depot, manifest_id) != manifest_id
+    ]
+    result["status"] = SCAN_OUTDATED if result["changes"] else SCAN_CURRENT
+    return result
+
+
+def scan_lua_files(lua_paths, manifest_index, workers=None):
+    """Compares Lua files with the manifest index, without network access.
+
+    A file is outdated when one of its setManifestid calls names an older
+    manifest than the index knows for that depot, i.e. exactly when an
+    update would change it, as of the last time its game was processed.
+
+    Args:
+        lua_paths (list): Paths to .lua files and/or directories containing them.
+        manifest_index (ManifestIndex): The index to compare with.
+        workers (int): Processes used to read the files; see
+            inventory_lua_files.
+
+    Returns:
+        list: One result dict per .lua file (see compare_with_index), in
+            input order.
+    """
+    return [
+        compare_with_index(record, manifest_index)
+        for record in inventory_lua_files(lua_paths, workers=workers)
+    ]
+
+
+def format_scan_report(results):
+    """Formats scan results as a human-readable text report.
+
+    Args:
+        results (list): Result dicts as returned by scan_lua_files.
+
+    Returns:
+        str: The report text.
+    """
+    counts = {
+        status: sum(1 for r in results if r["status"] == status)
+        for status in (SCAN_OUTDATED, SCAN_CURRENT, SCAN_UNKNOWN, SCAN_INVALID)
+    }
+    lines = [
+        f"{APP_NAME} scan report",
+        f"Total: {len(results)}  Outdated: {counts[SCAN_OUTDATED]}  "
+        f"Current: {counts[SCAN_CURRENT]}  Not indexed: {counts[SCAN_UNKNOWN]}  "
+        f"Invalid: {counts[SCAN_INVALID]}",
+        "",
+    ]
+    for r in results:
+        name = os.path.basename(r["lua_path"])
+        game = r["game_id"] or "?"
+        if r["status"] == SCAN_OUTDATED:
+            lines.append(
+                f"OUTDATED  {name} (game {game}): {len(r['changes'])} depot(s) "
+                f"behind {r['repo']}"
+            )
+        elif r["status"] == SCAN_CURRENT:
+            lines.append(f"CURRENT   {name} (game {game})")
+        elif r["status"] == SCAN_UNKNOWN:
+            lines.append(f"UNKNOWN   {name} (game {game}): not in the index yet")
+        else:
+            lines.append(f"INVALID   {name}: {r['error']}")
+    return "\n".join(lines)
+
+
+def load_repo_config(config_path="repo.json"):
+    """Reads repo.json without touching the GUI.
+
+    Args:
+        config_path (str): Path of the repo.json file.
+
+    Returns:
+        tuple: (repos, default_repo) where ``repos`` maps display names to
+            repository paths and ``default_repo`` is the default repository
+            path. Falls back to DEFAULT_REPO if the file is missing or invalid.
+    """
+    try:
+        with open(config_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}, DEFAULT_REPO
+    repos = {key: value for key, value in data.items() if key != "default"}
+    return repos, data.get("default", DEFAULT_REPO)
@@ -0,0 +1,301 @@
+"""Structured stage events for Lua Manifest Updater.
+
+The download, extract, rewrite and zip steps in core.py each emit one event
+per run with the stage name, game ID, duration, bytes and entry counts.
+Events go to every registered sink; a sink is any callable taking the event
+dict. Three sinks are provided: a JSON-lines log, an in-process aggregate and
+a Prometheus text export of that aggregate.
+
+Example:
+    aggregate = AggregateSink()
+    add_sink(aggregate)
+    ...
+    print(format_stage_report(aggregate.snapshot()))
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+STAGE_DOWNLOAD = "download"
+STAGE_EXTRACT = "extract"
+STAGE_REWRITE = "rewrite"
+STAGE_ZIP = "zip"
+METRICS_PREFIX = "lmu"
+
+_sinks = []
+_sinks_lock = threading.Lock()
+_job_fields = contextvars.ContextVar("job_fields", default={})
+
+
+def add_sink(sink):
+    """Registers ``sink`` to receive every stage event."""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink):
+    """Unregisters a sink added with add_sink; unknown sinks are ignored."""
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def emit(event):
+    """Sends ``event`` to every registered sink.
+
+    A failing sink is reported and skipped so it cannot break an update.
+    """
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(event)
+        except Exception as e:
+            print(f"Warn: Metrics sink {sink!r} failed: {e}")
+
+
+def set_job_fields(**fields):
+    """Adds ``fields`` (such as game_id) to events emitted from now on.
+
+    The fields are tracked per thread (and per asyncio task), so concurrent
+    jobs do not mix up their game IDs.
+
+    Returns:
+        contextvars.Token: Pass it to reset_job_fields to undo the change.
+    """
+    return _job_fields.set({**_job_fields.get(), **fields})
+
+
+def reset_job_fields(token):
+    """Restores the job fields that were current before set_job_fields."""
+    _job_fields.reset(token)
+
+
+def submit_in_context(executor, function, *args):
+    """Submits ``function(*args)`` to run in a copy of the current context.
+
+    Pool threads do not inherit context variables, so tasks submitted plainly
+    would emit their events without the job fields.
+
+    Returns:
+        concurrent.futures.Future: The future of the submitted call.
+    """
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+
+@contextmanager
+def job_context(**fields):
+    """Adds ``fields`` to events emitted in this block (see set_job_fields)."""
+    token = set_job_fields(**fields)
+    try:
+        yield
+    finally:
+        reset_job_fields(token)
+
+
+@contextmanager
+def stage_timer(stage, **fields):
+    """Times a block and emits one event for it.
+
+    Yields the event dict, so the block can fill in "bytes", "entries" and
+    any extra fields. "ok" starts out False and must be set to True by the
+    block on success; an exception leaves it False.
+
+    Args:
+        stage (str): Stage name, e.g. STAGE_DOWNLOAD.
+        **fields: Extra fields for the event.
+
+    Yields:
+        dict: The event, with "stage", "game_id", "started", "duration",
+            "bytes", "entries" and "ok" keys.
+    """
+    if not _sinks:
+        yield {}
+        return
+    event = {
+        "stage": stage,
+        "game_id": None,
+        "started": time.time(),
+        "duration": 0.0,
+        "bytes": 0,
+        "entries": 0,
+        "ok": False,
+    }
+    event.update(_job_fields.get())
+    event.update(fields)
+    start = time.perf_counter()
+    try:
+        yield event
+    finally:
+        event["duration"] = time.perf_counter() - start
+        emit(event)
+
+
+class JsonLinesSink:
+    """Appends every event as one JSON object per line to a file."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, event):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+                self._file.flush()
+
+    def close(self):
+        """Closes the log file; later events are dropped."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class AggregateSink:
+    """Keeps running totals per stage in memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def __call__(self, event):
+        with self._lock:
+            totals = self._stages.setdefault(
+                event["stage"],
+                {
+                    "runs": 0,
+                    "failed": 0,
+                    "duration": 0.0,
+                    "max_duration": 0.0,
+                    "bytes": 0,
+                    "entries": 0,
+                },
+            )
+            totals["runs"] += 1
+            if not event.get("ok"):
+                totals["failed"] += 1
+            totals["duration"] += event["duration"]
+            totals["max_duration"] = max(totals["max_duration"], event["duration"])
+            totals["bytes"] += event.get("bytes") or 0
+            totals["entries"] += event.get("entries") or 0
+
+    def reset(self):
+        """Forgets all totals."""
+        with self._lock:
+            self._stages = {}
+
+    def snapshot(self):
+        """Returns a copy of the totals per stage.
+
+        Returns:
+            dict: Maps stage names to dicts with "runs", "failed", "duration",
+                "max_duration", "bytes", "entries" and "throughput" (bytes per
+                second of stage time).
+        """
+        with self._lock:
+            snapshot = {stage: dict(totals) for stage, totals in self._stages.items()}
+        for totals in snapshot.values():
+            totals["throughput"] = (
+                totals["bytes"] / totals["duration"] if totals["duration"] else 0.0
+            )
+        return snapshot
+
+    def prometheus_text(self):
+        """Returns the totals in the Prometheus text exposition format."""
+        return format_prometheus(self.snapshot())
+
+
+def format_stage_report(snapshot):
+    """Formats an AggregateSink snapshot as a human-readable table.
+
+    Args:
+        snapshot (dict): As returned by AggregateSink.snapshot.
+
+    Returns:
+        str: One line per stage.
+    """
+    lines = []
+    for stage, totals in sorted(snapshot.items()):
+        average = totals["duration"] / totals["runs"] if totals["runs"] else 0.0
+        lines.append(
+            f"{stage:<9} runs {totals['runs']:>5}  failed {totals['failed']:>4}  "
+            f"total {totals['duration']:8.2f}s  avg {average:6.3f}s  "
+            f"max {totals['max_duration']:6.2f}s  "
+            f"{totals['bytes'] / (1024 * 1024):9.1f} MB  "
+            f"{totals['throughput'] / (1024 * 1024):7.2f} MB/s  "
+            f"entries {totals['entries']}"
+        )
+    return "\n".join(lines)
+
+
+def format_prometheus(snapshot, prefix=METRICS_PREFIX):
+    """Formats an AggregateSink snapshot in the Prometheus text format.
+
+    Args:
+        snapshot (dict): As returned by AggregateSink.snapshot.
+        prefix (str): Prefix for the metric names.
+
+    Returns:
+        str: The exposition text, ending with a newline.
+    """
+    metrics = [
+        ("stage_runs_total", "counter", "Stage runs by result."),
+        ("stage_duration_seconds", "summary", "Time spent in each stage."),
+        ("stage_bytes_total", "counter", "Bytes handled by each stage."),
+        ("stage_entries_total", "counter", "Entries handled by each stage."),
+    ]
+    samples = {name: [] for name, _kind, _help in metrics}
+    for stage, totals in sorted(snapshot.items()):
+        label = f'stage="{stage}"'
+        samples["stage_runs_total"].append(
+            f'{{{label},result="ok"}} {totals["runs"] - totals["failed"]}'
+        )
+        samples["stage_runs_total"].append(
+            f'{{{label},result="failed"}} {totals["failed"]}'
+        )
+        samples["stage_duration_seconds"].append(
+            f"_sum{{{label}}} {totals['duration']:.6f}"
+        )
+        samples["stage_duration_seconds"].append(f"_count{{{label}}} {totals['runs']}")
+        samples["stage_bytes_total"].append(f"{{{label}}} {totals['bytes']}")
+        samples["stage_entries_total"].append(f"{{{label}}} {totals['entries']}")
+
+    lines = []
+    for name, kind, help_text in metrics:
+        full_name = f"{prefix}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {kind}")
+        lines.extend(f"{full_name}{sample}" for sample in samples[name])
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(aggregate, path):
+    """Writes an AggregateSink's totals to ``path`` for a textfile collector.
+
+    The file is replaced atomically, so a scraper never sees half of it.
+
+    Returns:
+        bool: True if the file was written, False otherwise.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(aggregate.prometheus_text())
+        os.replace(temp_path, path)
+        return True
+    except OSError as e:
+        print(f"Warn: Error writing metrics file {path}: {e}")
+        return False
@@ -0,0 +1,665 @@
+"""Asyncio pipeline that updates many Lua files with bounded resources.
+
+Every file becomes a job that moves through four stages: read the Lua file,
+download the branch archive, rewrite the manifest IDs and write the output zip.
+The stages are connected by bounded queues and each stage has its own
+concurrency limit and thread pool, so thousands of files can be queued while
+only a fixed number of downloads, rewrites and zip writes (and threads) are
+active at any time. A full queue makes the previous stage wait, and a job
+must take one of a fixed number of archive slots before it downloads, so the
+archives held in memory are bounded as well.
+
+Runs are cancellable from any thread and every stage can have a timeout.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from core import (
+    BATCH_MAX_WORKERS,
+    RACE_FIRST,
+    archive_url,
+    branch_manifest_paths,
+    download_archive_cached,
+    download_to_buffer,
+    ensure_http_pool,
+    find_lua_files,
+    format_transfer_summary,
+    get_game_id_from_content,
+    list_branch_files,
+    list_manifest_entries,
+    lua_depot_ids,
+    print_status,
+    open_source_archive,
+    race_repositories,
+    rewrite_lua_manifests,
+    write_update_zip,
+)
+from metrics import STAGE_DOWNLOAD, STAGE_REWRITE, STAGE_ZIP, job_context
+
+STAGE_READ = "read"
+PIPELINE_STAGES = (STAGE_READ, STAGE_DOWNLOAD, STAGE_REWRITE, STAGE_ZIP)
+DEFAULT_STAGE_LIMITS = {
+    STAGE_READ: 4,
+    STAGE_DOWNLOAD: BATCH_MAX_WORKERS,
+    STAGE_REWRITE: 2,
+    STAGE_ZIP: 2,
+}
+DEFAULT_QUEUE_SIZE = 16
+
+
+class PipelineCancelled(Exception):
+    """Raised inside a stage when the job was cancelled or timed out."""
+
+
+class _PipelineJob:
+    """State of one Lua file while it moves through the pipeline."""
+
+    def __init__(self, lua_path, repo_path, status_callback):
+        self.lua_path = lua_path
+        self.cancel_event = threading.Event()
+        self.content = None
+        self.game_id = None
+        self.archive = None
+        self.source_zip = None
+        self.manifest_paths = None
+        self.depot_ids = None
+        self.updated_content = None
+        self.archive_slot = None
+        self.start_time = None
+        self.result = {
+            "lua_path": lua_path,
+            "game_id": None,
+            "success": False,
+            "output_path": None,
+            "error": None,
+            "duration": 0.0,
+            "changed": None,
+            "repo": repo_path,
+        }
+        self._status_callback = status_callback
+
+    def report(self, message, color="white"):
+        """Forwards a status message and remembers the last error.
+
+        Errors reported after the job was cancelled or timed out (by a stage
+        thread winding down) do not replace the reason it was stopped.
+        """
+        if color == "red" and not self.cancel_event.is_set():
+            self.result["error"] = message
+        self._status_callback(message, color)
+
+    def check_cancelled(self):
+        """Raises PipelineCancelled if the job should stop."""
+        if self.cancel_event.is_set():
+            raise PipelineCancelled()
+
+    def close(self):
+        """Releases the downloaded archive and its slot, if any.
+
+        Must be called on the event loop thread.
+        """
+        source_zip, self.source_zip = self.source_zip, None
+        archive, self.archive = self.archive, None
+        for item in (source_zip, archive):
+            if item is not None:
+                try:
+                    item.close()
+                except Exception:
+                    pass
+        slot, self.archive_slot = self.archive_slot, None
+        if slot is not None:
+            slot.release()
+
+
+class UpdatePipeline:
+    """Updates Lua files through bounded read/download/rewrite/zip stages.
+
+    Results have the same shape as those of update_single_lua, so they can be
+    passed to format_batch_report and write_batch_report.
+
+    Args:
+        repo_path (str): GitHub repository path ("username/repository").
+        output_base_dir (str): Directory to write the final zip files into.
+        status_callback (function): Callback to report status (message, color).
+            With more than one file, messages are prefixed with the file name.
+        cache (ArchiveCache): Optional archive cache shared by all jobs.
+        ids_only (bool): Learn manifest IDs from the branch file listing
+            instead of downloading the branch archive (see update_single_lua).
+        dry_run (bool): With ids_only, only report which files would change.
+        race_repos (list): Race these repositories per file (see
+            race_repositories). Ignored with ids_only.
+        race_strategy (str): RACE_FIRST or RACE_NEWEST.
+        zip_options (dict): Options for writing the output zips; see
+            write_output_zip.
+        stage_limits (dict): Maximum concurrent jobs per stage, keyed by stage
+            name. Missing stages use DEFAULT_STAGE_LIMITS.
+        stage_timeouts (dict): Seconds a job may spend in a stage, keyed by
+            stage name. Stages without an entry have no timeout.
+        queue_size (int): Capacity of the queue in front of each stage.
+        max_archives (int): Maximum jobs holding a downloaded archive at once;
+            each keeps up to IN_MEMORY_SPOOL_LIMIT bytes of it in memory.
+            Defaults to the download, rewrite and zip limits added up, so
+            every stage can stay busy but archives do not pile up in queues.
+        progress_callback (function): Called on the event loop thread with the
+            fraction (0 to 1) of job stages done, each time a job leaves a
+            stage. A job that fails early counts its remaining stages as done.
+        monitor (TransferMonitor): Optional monitor for all archive downloads;
+            its totals are added to the batch summary.
+        job_callback (function): Called with (lua_path, message, color) for
+            every status message of a job, e.g. to show per-file status. It
+            runs on the stage threads.
+        manifest_store (ManifestStore): Optional manifest store shared by all
+            jobs; manifests it holds are zipped from it instead of being read
+            from the archive or fetched again.
+        manifest_index (ManifestIndex): Optional index to record the current
+            manifest IDs of every processed branch in.
+        include_extras (bool): Also zip manifests the Lua files do not
+            reference. By default each job works out the depots named in its
+            addappid/setManifestid calls when reading the Lua file, and only
+            their manifests are read from the archive (or fetched) and zipped.
+    """
+
+    def __init__(
+        self,
+        repo_path,
+        output_base_dir,
+        status_callback=print_status,
+        cache=None,
+        ids_only=False,
+        dry_run=False,
+        race_repos=None,
+        race_strategy=RACE_FIRST,
+        zip_options=None,
+        stage_limits=None,
+        stage_timeouts=None,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        max_archives=None,
+        progress_callback=None,
+        monitor=None,
+        job_callback=None,
+        manifest_store=None,
+        manifest_index=None,
+        include_extras=False,
+    ):
+        self.repo_path = repo_path
+        self.output_base_dir = output_base_dir
+        self.status_callback = status_callback
+        self.cache = cache
+        self.ids_only = ids_only
+        self.dry_run = dry_run
+        self.race_repos = race_repos
+        self.race_strategy = race_strategy
+        self.zip_options = zip_options or {}
+        self.stage_limits = dict(DEFAULT_STAGE_LIMITS)
+        for stage, limit in (stage_limits or {}).items():
+            if stage not in PIPELINE_STAGES:
+                raise ValueError(f"Unknown pipeline stage: {stage}")
+            self.stage_limits[stage] = max(1, int(limit))
+        self.stage_timeouts = dict(stage_timeouts or {})
+        for stage in self.stage_timeouts:
+            if stage not in PIPELINE_STAGES:
+                raise ValueError(f"Unknown pipeline stage: {stage}")
+        self.queue_size = max(1, queue_size)
+        if max_archives is None:
+            max_archives = sum(
+                self.stage_limits[stage]
+                for stage in (STAGE_DOWNLOAD, STAGE_REWRITE, STAGE_ZIP)
+            )
+        self.max_archives = max(1, int(max_archives))
+        self.progress_callback = progress_callback
+        self.monitor = monitor
+        self.job_callback = job_callback
+        self.manifest_store = manifest_store
+        self.manifest_index = manifest_index
+        self.include_extras = include_extras
+        self._steps_done = 0
+        self._cancelled = threading.Event()
+        self._jobs = []
+        self._loop = None
+        self._main_task = None
+        self._archive_slots = None
+        self._race_executor = None
+        self._stage_calls = set()
+
+    @property
+    def cancelled(self):
+        """True once cancel() has been called."""
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stops the run as soon as possible. Safe to call from any thread.
+
+        Queued jobs are dropped, running downloads are abandoned and the other
+        running stages stop at their next step. Every unfinished job is
+        reported as cancelled.
+        """
+        self._cancelled.set()
+        for job in list(self._jobs):
+            job.cancel_event.set()
+        loop, task = self._loop, self._main_task
+        if loop is not None and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # The loop has already finished.
+
+    def run(self, lua_paths):
+        """Runs the pipeline to completion in a new event loop.
+
+        Args:
+            lua_paths (list): Paths to .lua files and/or directories containing
+                them.
+
+        Returns:
+            list: One result dict per .lua file, in input order.
+        """
+        return asyncio.run(self.run_async(lua_paths))
+
+    async def run_async(self, lua_paths):
+        """Coroutine version of run(), for callers with their own event loop."""
+        lua_files = find_lua_files(lua_paths)
+        if not lua_files:
+            self.status_callback("No .lua files found to process.", "orange")
+            return []
+
+        os.makedirs(self.output_base_dir, exist_ok=True)
+        ensure_http_pool(self.stage_limits[STAGE_DOWNLOAD])
+
+        prefix_messages = len(lua_files) > 1
+        self._steps_done = 0
+        self._jobs = [
+            _PipelineJob(
+                lua_path,
+                self.repo_path,
+                self._job_status_callback(lua_path, prefix_messages),
+            )
+            for lua_path in lua_files
+        ]
+        if self._cancelled.is_set():
+            for job in self._jobs:
+                job.cancel_event.set()
+        if prefix_messages:
+            limits = ", ".join(
+                f"{stage} {self.stage_limits[stage]}" for stage in PIPELINE_STAGES
+            )
+            self.status_callback(
+                f"Processing {len(lua_files)} Lua file(s) ({limits})...",
+                "lightblue",
+            )
+
+        self._loop = asyncio.get_running_loop()
+        self._main_task = asyncio.ensure_future(self._run_stages())
+        try:
+            await self._main_task
+        except asyncio.CancelledError:
+            if not self._cancelled.is_set():
+                self.cancel()
+                raise
+        finally:
+            self._main_task = None
+            self._loop = None
+            for job in self._jobs:
+                if job.result["error"] is None and not job.result["success"]:
+                    job.result["error"] = "Cancelled."
+                job.close()
+
+        results = [job.result for job in self._jobs]
+        if self._cancelled.is_set():
+            self.status_callback("Update cancelled.", "orange")
+        elif prefix_messages:
+            succeeded = sum(1 for r in results if r["success"])
+            summary = ""
+            if self.monitor is not None:
+                summary = f" ({format_transfer_summary(self.monitor.snapshot())})"
+            self.status_callback(
+                f"Batch finished: {succeeded}/{len(results)} succeeded{summary}.",
+                "lime" if succeeded == len(results) else "orange",
+            )
+        return results
+
+    def _job_status_callback(self, lua_path, prefix_messages):
+        """Returns the status callback used by the job for ``lua_path``."""
+        prefix = f"[{os.path.basename(lua_path)}] " if prefix_messages else ""
+        if self.job_callback is None and not prefix:
+            return self.status_callback
+
+        def report(message, color="white"):
+            if self.job_callback is not None:
+                self.job_callback(lua_path, message, color)
+            self.status_callback(prefix + message, color)
+
+        return report
+
+    async def _run_stages(self):
+        """Starts the stage workers, feeds them all jobs and waits for them."""
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in PIPELINE_STAGES]
+        executors = [
+            ThreadPoolExecutor(
+                max_workers=self.stage_limits[stage],
+                thread_name_prefix=f"pipeline-{stage}",
+            )
+            for stage in PIPELINE_STAGES
+        ]
+        if not self.ids_only:
+            self._archive_slots = asyncio.Semaphore(self.max_archives)
+        if self.race_repos and not self.ids_only:
+            # One pool for every race, so racing N repositories does not
+            # multiply the download threads by N.
+            self._race_executor = ThreadPoolExecutor(
+                max_workers=self.stage_limits[STAGE_DOWNLOAD],
+                thread_name_prefix="pipeline-race",
+            )
+            executors.append(self._race_executor)
+        stage_tasks = []
+        try:
+            for index, stage in enumerate(PIPELINE_STAGES):
+                next_queue = queues[index + 1] if index + 1 < len(queues) else None
+                next_limit = (
+                    self.stage_limits[PIPELINE_STAGES[index + 1]]
+                    if next_queue is not None
+                    else 0
+                )
+                stage_tasks.append(
+                    asyncio.ensure_future(
+                        self._run_stage(
+                            stage,
+                            queues[index],
+                            next_queue,
+                            next_limit,
+                            executors[index],
+                        )
+                    )
+                )
+            for job in self._jobs:
+                await queues[0].put(job)
+            for _ in range(self.stage_limits[PIPELINE_STAGES[0]]):
+                await queues[0].put(None)
+            await asyncio.gather(*stage_tasks)
+        finally:
+            for task in stage_tasks:
+                task.cancel()
+            await asyncio.gather(*stage_tasks, return_exceptions=True)
+            # Calls that have not started were cancelled with their tasks.
+            # Running ones cannot be interrupted, so wait for them without
+            # blocking the event loop before their archives are closed.
+            for executor in executors:
+                executor.shutdown(wait=False)
+            running = [asyncio.wrap_future(call) for call in list(self._stage_calls)]
+            if running:
+                await asyncio.wait(running)
+            self._race_executor = None
+            self._archive_slots = None
+
+    async def _run_stage(self, stage, inbox, outbox, next_limit, executor):
+        """Runs the workers of one stage, then tells the next stage to stop."""
+        workers = [
+            asyncio.ensure_future(self._stage_worker(stage, inbox, outbox, executor))
+            for _ in range(self.stage_limits[stage])
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+        if outbox is not None:
+            for _ in range(next_limit):
+                await outbox.put(None)
+
+    async def _stage_worker(self, stage, inbox, outbox, executor):
+        """Takes jobs from ``inbox`` until it receives None."""
+        stage_function = getattr(self, f"_{stage}_stage")
+        timeout = self.stage_timeouts.get(stage)
+        while True:
+            job = await inbox.get()
+            if job is None:
+                return
+            if job.start_time is None:
+                job.start_time = time.monotonic()
+
+            passed = False
+            timed_out = False
+            try:
+                job.check_cancelled()
+                if stage == STAGE_DOWNLOAD and self._archive_slots is not None:
+                    await self._archive_slots.acquire()
+                    job.archive_slot = self._archive_slots
+                passed = await self._run_with_deadline(
+                    executor, stage_function, job, timeout
+                )
+            except asyncio.TimeoutError:
+                # The stage thread cannot be interrupted; the cancel event
+                # makes it give up at its next step and free its thread. Its
+                # archive is closed once the thread is done with it.
+                timed_out = True
+                job.report(f"Error: {stage} stage timed out after {timeout:g}s.", "red")
+                job.cancel_event.set()
+            except PipelineCancelled:
+                if job.result["error"] is None:
+                    job.result["error"] = "Cancelled."
+            except Exception as e:
+                job.report(f"An unexpected error occurred: {e}", "red")
+
+            if passed and outbox is not None:
+                self._advance_progress(1)
+                await outbox.put(job)
+                continue
+            self._advance_progress(len(PIPELINE_STAGES) - PIPELINE_STAGES.index(stage))
+            if passed:
+                job.result["success"] = True
+                job.result["error"] = None
+            if not timed_out:
+                job.close()
+            job.result["duration"] = time.monotonic() - job.start_time
+
+    async def _run_with_deadline(self, executor, stage_function, job, timeout):
+        """Runs a stage function on ``executor`` and returns its result.
+
+        The ``timeout`` clock starts when the function starts on a worker
+        thread, so time spent waiting for a free thread (for example behind a
+        timed-out call that is still winding down) does not count against the
+        stage's budget.
+
+        Raises:
+            asyncio.TimeoutError: The function ran longer than ``timeout``.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+
+        def mark_started():
+            if not started.done():
+                started.set_result(None)
+
+        def run():
+            loop.call_soon_threadsafe(mark_started)
+            return self._call_stage(stage_function, job)
+
+        call = executor.submit(run)
+        self._stage_calls.add(call)
+        call.add_done_callback(self._stage_calls.discard)
+        future = asyncio.wrap_future(call)
+        if timeout is None:
+            return await future
+        await asyncio.wait({started, future}, return_when=asyncio.FIRST_COMPLETED)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            call.add_done_callback(lambda _call: self._close_on_loop(loop, job))
+            raise
+
+    @staticmethod
+    def _close_on_loop(loop, job):
+        """Closes ``job`` on the event loop thread, from any thread."""
+        try:
+            loop.call_soon_threadsafe(job.close)
+        except RuntimeError:
+            pass  # The loop has finished; run_async closed the job.
+
+    def _advance_progress(self, steps):
+        """Counts ``steps`` job stages as done and reports the new fraction."""
+        self._steps_done += steps
+        if self.progress_callback is not None:
+            total = len(self._jobs) * len(PIPELINE_STAGES)
+            self.progress_callback(self._steps_done / total)
+
+    @staticmethod
+    def _call_stage(stage_function, job):
+        """Runs a stage function with the job's fields attached to its events."""
+        with job_context(game_id=job.game_id, lua_path=job.lua_path):
+            return stage_function(job)
+
+    def _read_stage(self, job):
+        """Reads the Lua file and finds its game ID."""
+        job.report(f"Reading file: {os.path.basename(job.lua_path)}", "orange")
+        try:
+            if not os.path.isfile(job.lua_path):
+                job.report(
+                    f"Error: Input file disappeared: {os.path.basename(job.lua_path)}",
+                    "red",
+                )
+                return False
+            with open(job.lua_path, "r", encoding="utf-8") as f:
+                job.content = f.read()
+        except Exception as e:
+            job.report(f"Error reading input Lua file: {e}", "red")
+            return False
+        job.game_id = get_game_id_from_content(job.content)
+        if not job.game_id:
+            job.report("Error: Game ID not found in the Lua file.", "red")
+            return False
+        job.result["game_id"] = job.game_id
+        if not self.include_extras:
+            job.depot_ids = lua_depot_ids(job.content)
+        job.report(f"Found Game ID: {job.game_id}", "lightblue")
+        return True
+
+    def _download_stage(self, job):
+        """Fetches the branch archive, or only its file listing with ids_only."""
+        game_id = job.game_id
+        if self.race_repos and not self.ids_only:
+            raced = race_repositories(
+                self.race_repos,
+                game_id,
+                job.report,
+                strategy=self.race_strategy,
+                monitor=self.monitor,
+                cancel_event=job.cancel_event,
+                executor=self._race_executor,
+            )
+            if raced is None:
+                return False
+            job.result["repo"], job.archive = raced
+            job.check_cancelled()
+            return True
+
+        job.report(f"Using repo: {self.repo_path} for branch {game_id}", "lightblue")
+        if self.ids_only:
+            branch_files = list_branch_files(self.repo_path, game_id, job.report)
+            if branch_files is None:
+                return False
+            job.manifest_paths = branch_manifest_paths(branch_files)
+            job.check_cancelled()
+            return True
+
+        url = archive_url(self.repo_path, game_id)
+        if self.cache is not None:
+            cached_path = download_archive_cached(
+                url,
+                self.repo_path,
+                game_id,
+                self.cache,
+                job.report,
+                cancel_event=job.cancel_event,
+                monitor=self.monitor,
+            )
+            job.archive = open(cached_path, "rb") if cached_path else None
+        else:
+            job.archive = download_to_buffer(
+                url,
+                f"{game_id}.zip",
+                job.report,
+                cancel_event=job.cancel_event,
+                monitor=self.monitor,
+            )
+        job.check_cancelled()
+        if job.archive is None:
+            job.report(
+                f"Download from GitHub ({self.repo_path}, branch {game_id}) failed.",
+                "red",
+            )
+            return False
+        return True
+
+    def _rewrite_stage(self, job):
+        """Reads the manifest names and rewrites the Lua content."""
+        if job.manifest_paths is None:
+            job.source_zip = open_source_archive(job.archive, job.game_id, job.report)
+            if job.source_zip is None:
+                return False
+            manifest_names = [
+                file_info.filename
+                for file_info in list_manifest_entries(job.source_zip)
+            ]
+            where = "archive"
+        else:
+            manifest_names = job.manifest_paths
+            where = "branch"
+        job.check_cancelled()
+        job.updated_content, manifest_names = rewrite_lua_manifests(
+            job.content,
+            manifest_names,
+            job.game_id,
+            job.result["repo"],
+            job.report,
+            where=where,
+            manifest_index=self.manifest_index,
+            depot_ids=job.depot_ids,
+        )
+        if job.manifest_paths is not None:
+            job.manifest_paths = manifest_names
+        job.result["changed"] = job.updated_content != job.content
+        return True
+
+    def _zip_stage(self, job):
+        """Writes <game_id>.zip into the output directory."""
+        if self.ids_only and self.dry_run:
+            return True
+        final_zip_path = os.path.join(self.output_base_dir, f"{job.game_id}.zip")
+        pins = nullcontext()
+        if self.manifest_store is not None:
+            pins = self.manifest_store.pinned()
+        with pins:
+            written = write_update_zip(
+                final_zip_path,
+                job.updated_content,
+                job.game_id,
+                job.report,
+                source_zip=job.source_zip,
+                repo=self.repo_path,
+                manifest_paths=job.manifest_paths,
+                manifest_store=self.manifest_store,
+                depot_ids=job.depot_ids,
+                **self.zip_options,
+            )
+        if written:
+            job.result["output_path"] = final_zip_path
+        return written
+
+
+def run_pipeline(lua_paths, repo_path, output_base_dir, **options):
+    """Updates Lua files with an UpdatePipeline and returns the results.
+
+    Args:
+        lua_paths (list): Paths to .lua files and/or directories containing them.
+        repo_path (str): GitHub repository path ("username/repository").
+        output_base_dir (str): Directory to write the final zip files into.
+        **options: Passed on to UpdatePipeline.
+
+    Returns:
+        list: One result dict per .lua file, in input order.
+    """
+    return UpdatePipeline(repo_path, output_base_dir, **options).run(lua_paths)
@@ -0,0 +1,83 @@
+"""Shared pytest fixtures: a local fake GitHub and an isolated cache directory."""
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "bench"))
+
+import pytest  # noqa: E402
+
+import core  # noqa: E402
+from fake_github import branch_depots, start_server  # noqa: E402
+
+TEST_MANIFESTS = 6
+TEST_MANIFEST_SIZE = 4096
+TEST_REPO = "tests/manifests"
+
+
+@pytest.fixture(scope="session")
+def fake_github_server():
+    server, base_url = start_server(
+        manifests=TEST_MANIFESTS, manifest_size=TEST_MANIFEST_SIZE
+    )
+    core.configure_github(web_url=base_url, api_url=base_url, raw_url=base_url)
+    yield server
+    server.shutdown()
+    core.configure_github(
+        web_url=core.GITHUB_WEB_URL,
+        api_url=core.GITHUB_API_URL,
+        raw_url=core.GITHUB_RAW_URL,
+    )
+
+
+@pytest.fixture
+def fake_github(fake_github_server):
+    """The FakeGitHub behind the server, with a fresh request log."""
+    fake = fake_github_server.fake
+    fake.requests.clear()
+    fake.digest = False
+    yield fake
+    fake.digest = False
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    """Points get_cache_dir at a directory private to the test."""
+    monkeypatch.delenv("LOCALAPPDATA", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def make_lua(tmp_path):
+    """Returns a function that writes a Lua file for a fake GitHub branch.
+
+    The file adds the game and ``depots`` of its branch (all of them by
+    default) with outdated manifest IDs.
+    """
+
+    def make(game_id, depots=None, directory=None):
+        pairs = branch_depots(str(game_id), TEST_MANIFESTS)
+        if depots is not None:
+            pairs = pairs[:depots]
+        lines = [f"addappid({game_id})"]
+        for depot, _manifest_id in pairs:
+            lines.append(f'addappid({depot}, 1, "key{depot}")')
+            lines.append(f'setManifestid({depot}, "1", 0)')
+        directory = directory or tmp_path / "lua"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{game_id}.lua"
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return str(path)
+
+    return make
+
+
+def branch_manifest_names(game_id, depots=None):
+    """Returns the manifest names of a fake GitHub branch."""
+    pairs = branch_depots(str(game_id), TEST_MANIFESTS)
+    if depots is not None:
+        pairs = pairs[:depots]
+    return [f"{depot}_{manifest_id}.manifest" for depot, manifest_id in pairs]
@@ -0,0 +1,37 @@
+"""Tests for the GUI's thread-safe status channel."""
+
+import pytest
+
+pytest.importorskip("customtkinter")
+pytest.importorskip("tkinterdnd2")
+
+from app import JOB_DONE, JOB_RUNNING, StatusChannel  # noqa: E402
+
+
+def test_status_channel_keeps_only_the_newest_updates():
+    channel = StatusChannel()
+    channel.post("first")
+    channel.post("second", "green")
+    channel.set_progress(0.5)
+    channel.set_progress(1.5)
+
+    message, progress, transfer, jobs = channel.drain()
+    assert message == ("second", "green")
+    assert progress == 1.0
+    assert transfer is None
+    assert jobs == {}
+    assert channel.drain() == (None, None, None, {})
+    assert channel.last_message == ("second", "green")
+
+
+def test_status_channel_keeps_the_newest_status_per_job():
+    channel = StatusChannel()
+    channel.post_job("a.lua", "Downloading...")
+    channel.post_job("a.lua", "Done", "green", state=JOB_DONE)
+    channel.post_job("b.lua", "Queued")
+
+    assert channel.drain()[3] == {
+        "a.lua": ("Done", "green", JOB_DONE),
+        "b.lua": ("Queued", "white", JOB_RUNNING),
+    }
+    assert channel.drain()[3] == {}
@@ -0,0 +1,87 @@
+"""Tests for the fake GitHub and the pipeline benchmark helpers."""
+
+import urllib.error
+import urllib.request
+
+import pytest
+
+from bench_pipeline import compare, format_size, parse_size, summarize
+from conftest import TEST_MANIFESTS, TEST_REPO
+
+
+def _get(server, path, headers=None):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    request = urllib.request.Request(url, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers, error.read()
+
+
+def _archive_path(branch):
+    return f"/{TEST_REPO}/archive/refs/heads/{branch}.zip"
+
+
+def test_fake_github_serves_ranges_and_conditional_requests(
+    fake_github_server, fake_github
+):
+    data, etag = fake_github.archive("900")
+    middle = len(data) // 2
+
+    status, headers, body = _get(
+        fake_github_server, _archive_path("900"), {"Range": f"bytes={middle}-"}
+    )
+    assert (status, body) == (206, data[middle:])
+    assert headers["Content-Range"] == f"bytes {middle}-{len(data) - 1}/{len(data)}"
+
+    status, _headers, body = _get(
+        fake_github_server,
+        _archive_path("900"),
+        {"Range": f"bytes={middle}-", "If-Range": '"stale"'},
+    )
+    assert (status, body) == (200, data)
+
+    status, _headers, _body = _get(
+        fake_github_server, _archive_path("900"), {"If-None-Match": etag}
+    )
+    assert status == 304
+    assert [path for path, _headers in fake_github.requests] == [
+        _archive_path("900")
+    ] * 3
+
+
+def test_fake_github_lists_one_manifest_per_depot(fake_github):
+    names = [name for name in fake_github.files("901") if name.endswith(".manifest")]
+    assert len(names) == TEST_MANIFESTS
+    assert len({name.split("_")[0] for name in names}) == TEST_MANIFESTS
+
+
+@pytest.mark.parametrize("text", ["512", "1K", "100K", "50M", "2G"])
+def test_size_round_trip(text):
+    assert format_size(parse_size(text)) == text
+
+
+def test_compare_flags_regressions_beyond_threshold(capsys):
+    def scenario(wall, throughput):
+        return summarize(
+            [
+                {"wall": wall, "peak_rss": 100, "throughput": throughput},
+                {"wall": wall * 3, "peak_rss": 120, "throughput": throughput},
+                {"wall": wall * 2, "peak_rss": 110, "throughput": throughput},
+            ]
+        )
+
+    baseline = {"scenarios": {"a": scenario(1.0, 100.0), "b": scenario(1.0, 100.0)}}
+    results = {
+        "scenarios": {
+            "a": scenario(1.05, 100.0),
+            "b": scenario(1.5, 50.0),
+            "c": scenario(1.0, 1.0),
+        }
+    }
+    assert baseline["scenarios"]["a"]["wall"] == 2.0
+    assert compare(results, baseline, threshold=10) == 2
+    output = capsys.readouterr().out
+    assert "(new scenario)" in output
+    assert output.count("REGRESSION") == 2
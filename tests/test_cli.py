@@ -0,0 +1,85 @@
+"""Tests for the command-line interface and its import footprint."""
+
+import json
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+import cli
+from conftest import REPO_ROOT, TEST_REPO
+
+
+@pytest.mark.parametrize(
+    "flags",
+    [["--dry-run"], ["--in-memory"]],
+    ids=["dry-run-without-ids-only", "in-memory-with-pipeline"],
+)
+def test_conflicting_update_flags_are_rejected(tmp_path, capsys, flags):
+    with pytest.raises(SystemExit) as excinfo:
+        cli.main(["update", str(tmp_path), "--repo", TEST_REPO] + flags)
+    assert excinfo.value.code == 2
+    assert f"{flags[0]} requires" in capsys.readouterr().err
+
+
+def test_cli_and_core_import_no_gui_modules():
+    heavy = ["customtkinter", "tkinterdnd2", "tkinter"]
+    code = f"import sys, cli; print([m for m in {heavy!r} if m in sys.modules])"
+    loaded = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    assert loaded == "[]"
+
+
+def test_core_defers_http_and_html_modules():
+    code = (
+        "import sys, core; "
+        "heavy = ['requests', 'urllib3', 'bs4', 'PIL']; "
+        "print([m for m in heavy if m in sys.modules]); "
+        "core.requests.Session; "
+        "print('requests' in sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    assert output == ["[]", "True"]
+
+
+def test_update_then_scan_reports_current_files(tmp_path, fake_github, make_lua):
+    lua_path = make_lua(800)
+    index_path = str(tmp_path / "index.sqlite")
+    report_path = tmp_path / "report.json"
+
+    exit_code = cli.main(
+        [
+            "update",
+            lua_path,
+            "--repo",
+            TEST_REPO,
+            "--out",
+            str(tmp_path / "out"),
+            "--index",
+            index_path,
+            "--report",
+            str(report_path),
+            "--quiet",
+        ]
+    )
+    assert exit_code == 0
+    results = json.loads(report_path.read_text())
+    assert [r["game_id"] for r in results] == ["800"]
+
+    # The original file still has the old IDs; the updated copy is current.
+    assert cli.main(["scan", lua_path, "--index", index_path, "-j", "1"]) == 1
+    with zipfile.ZipFile(results[0]["output_path"]) as zip_ref:
+        updated = zip_ref.extract("800.lua", str(tmp_path / "updated"))
+    assert cli.main(["scan", updated, "--index", index_path, "-j", "1"]) == 0
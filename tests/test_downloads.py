@@ -0,0 +1,179 @@
+"""Tests for the shared HTTP session, resumable downloads and the archive cache."""
+
+import hashlib
+import json
+import threading
+
+import pytest
+
+import core
+from conftest import TEST_REPO
+
+
+def _quiet(message, color):
+    pass
+
+
+def _archive_requests(fake_github):
+    return [headers for path, headers in fake_github.requests if "/archive/" in path]
+
+
+def test_http_session_is_shared_until_reconfigured():
+    session = core.get_http_session()
+    assert core.get_http_session() is session
+    core.configure_http(pool_size=core.HTTP_POOL_SIZE)
+    assert core.get_http_session() is not session
+
+
+@pytest.fixture
+def http_settings(monkeypatch):
+    """Restores the HTTP settings the test changes."""
+    for key, value in list(core._http_settings.items()):
+        monkeypatch.setitem(core._http_settings, key, value)
+    yield core._http_settings
+    core.configure_http()
+
+
+def test_ensure_http_pool_only_grows(http_settings):
+    core.configure_http(pool_size=4, per_host_limit=4)
+    core.ensure_http_pool(2)
+    assert (http_settings["pool_size"], http_settings["per_host_limit"]) == (4, 4)
+    core.ensure_http_pool(12)
+    assert (http_settings["pool_size"], http_settings["per_host_limit"]) == (12, 12)
+
+
+def test_ensure_http_pool_admits_that_many_requests_per_host(http_settings):
+    workers = core.HTTP_PER_HOST_LIMIT * 2
+    core.ensure_http_pool(workers)
+    lock = threading.Lock()
+    active = []
+    peak = []
+    all_in = threading.Barrier(workers, timeout=5)
+
+    def request():
+        with core.host_slot("https://github.com/a/b.zip"):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            try:
+                all_in.wait()
+            except threading.BrokenBarrierError:
+                pass
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=request) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == workers
+
+
+def test_archive_cache_answers_304_from_disk(tmp_path, fake_github):
+    cache = core.ArchiveCache(str(tmp_path / "archives"))
+    url = core.archive_url(TEST_REPO, "420")
+    first = core.download_archive_cached(url, TEST_REPO, "420", cache, _quiet)
+    second = core.download_archive_cached(url, TEST_REPO, "420", cache, _quiet)
+
+    assert first == second
+    with open(second, "rb") as f:
+        assert f.read() == fake_github.archive("420")[0]
+    requests = _archive_requests(fake_github)
+    assert "If-None-Match" not in requests[0]
+    assert requests[1]["If-None-Match"] == fake_github.archive("420")[1]
+
+
+def test_archive_cache_evicts_least_recently_used(tmp_path, fake_github):
+    size = len(fake_github.archive("430")[0])
+    cache = core.ArchiveCache(str(tmp_path / "archives"), max_bytes=int(size * 2.5))
+    for branch in ("430", "431"):
+        url = core.archive_url(TEST_REPO, branch)
+        core.download_archive_cached(url, TEST_REPO, branch, cache, _quiet)
+    assert cache.lookup(TEST_REPO, "430") is not None  # Now used more recently.
+    url = core.archive_url(TEST_REPO, "432")
+    core.download_archive_cached(url, TEST_REPO, "432", cache, _quiet)
+
+    assert cache.lookup(TEST_REPO, "431") is None
+    assert cache.lookup(TEST_REPO, "430") is not None
+    assert cache.lookup(TEST_REPO, "432") is not None
+
+
+def _write_partial(path, url, data, validator):
+    with open(f"{path}.part", "wb") as f:
+        f.write(data[: len(data) // 2])
+    with open(f"{path}.part.json", "w", encoding="utf-8") as f:
+        json.dump({"url": url, "validator": validator, "total": len(data)}, f)
+
+
+def test_interrupted_download_resumes_with_range(tmp_path, fake_github):
+    data, etag = fake_github.archive("410")
+    url = core.archive_url(TEST_REPO, "410")
+    path = str(tmp_path / "410.zip")
+    _write_partial(path, url, data, etag)
+    messages = []
+
+    info = core.download_resumable(url, path, lambda m, c: messages.append(m))
+
+    assert info["size"] == len(data)
+    with open(path, "rb") as f:
+        assert f.read() == data
+    (headers,) = _archive_requests(fake_github)
+    assert headers["Range"] == f"bytes={len(data) // 2}-"
+    assert headers["If-Range"] == etag
+    assert any(message.startswith("Resuming 410.zip") for message in messages)
+
+
+def test_changed_file_restarts_instead_of_resuming(tmp_path, fake_github):
+    data, _etag = fake_github.archive("411")
+    url = core.archive_url(TEST_REPO, "411")
+    path = str(tmp_path / "411.zip")
+    _write_partial(path, url, data, '"an-older-version"')
+
+    info = core.download_resumable(url, path, _quiet)
+
+    assert info["size"] == len(data)
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+
+def test_announced_digest_is_verified(tmp_path, fake_github):
+    fake_github.digest = True
+    data, _etag = fake_github.archive("412")
+    info = core.download_resumable(
+        core.archive_url(TEST_REPO, "412"), str(tmp_path / "412.zip"), _quiet
+    )
+    assert info["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+def test_digest_mismatch_fails_and_leaves_no_file(tmp_path, fake_github, monkeypatch):
+    monkeypatch.setattr(core, "HTTP_BACKOFF_FACTOR", 0)
+    path = tmp_path / "413.zip"
+    with pytest.raises(core.DownloadError, match="checksum mismatch"):
+        core.download_resumable(
+            core.archive_url(TEST_REPO, "413"),
+            str(path),
+            _quiet,
+            expected_sha256="0" * 64,
+        )
+    assert not path.exists()
+
+
+def test_transfer_monitor_reports_fraction_and_eta():
+    snapshots = []
+    monitor = core.TransferMonitor(snapshots.append, interval=0)
+    transfer = monitor.start("a.zip")
+    transfer.restart(0, 1000)
+    transfer.advance(250)
+
+    snapshot = monitor.snapshot()
+    assert snapshot["bytes"] == 250
+    assert snapshot["total"] == 1000
+    assert snapshot["fraction"] == 0.25
+    assert snapshot["eta"] is not None
+    assert snapshot["transfers"][0]["label"] == "a.zip"
+
+    transfer.finish()
+    assert snapshots[-1]["active"] == 0
+    assert snapshots[-1]["finished"] == 1
+    assert snapshots[-1]["received"] == 250
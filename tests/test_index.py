@@ -0,0 +1,125 @@
+"""Tests for the manifest index, offline scans and the Lua inventory."""
+
+import sqlite3
+
+import pytest
+
+import core
+from conftest import TEST_REPO, branch_manifest_names
+
+
+@pytest.fixture
+def index(tmp_path):
+    manifest_index = core.ManifestIndex(str(tmp_path / "index.sqlite"))
+    yield manifest_index
+    manifest_index.close()
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_index_schema(index):
+    with sqlite3.connect(index.path) as conn:
+        tables = {
+            name: [column[1] for column in conn.execute(f"PRAGMA table_info({name})")]
+            for (name,) in conn.execute("SELECT name FROM sqlite_master")
+            if not name.startswith("sqlite_")
+        }
+        depot_keys = [
+            column[1]
+            for column in conn.execute("PRAGMA table_info(depots)")
+            if column[5]
+        ]
+    assert tables == {
+        "apps": ["app_id", "repo", "checked", "changed"],
+        "depots": ["app_id", "depot_id", "manifest_id"],
+    }
+    assert depot_keys == ["app_id", "depot_id"]
+
+
+def test_record_reports_changes_and_replaces_depots(index):
+    assert index.record("10", "a/b", {"11": "1", "12": "2"})
+    first = index.get("10")
+    assert not index.record("10", "a/b", {"11": "1", "12": "2"})
+    assert index.get("10")["changed"] == first["changed"]
+
+    assert index.record("10", "c/d", {"11": "3"})
+    entry = index.get("10")
+    assert entry["depots"] == {"11": "3"}
+    assert entry["repo"] == "c/d"
+    assert index.get("99") is None
+
+
+def test_scan_classifies_files_against_the_index(tmp_path, index):
+    index.record("10", "a/b", {"11": "200"})
+    library = tmp_path / "library"
+    _write(library / "current.lua", 'addappid(10)\nsetManifestid(11, "200")\n')
+    _write(library / "outdated.lua", 'addappid(10)\nsetManifestid(11, "100")\n')
+    _write(library / "unknown.lua", 'addappid(20)\nsetManifestid(21, "1")\n')
+    _write(library / "invalid.lua", "-- nothing here\n")
+
+    results = {
+        result["lua_path"].rsplit("/", 1)[-1]: result
+        for result in core.scan_lua_files([str(library)], index, workers=1)
+    }
+
+    assert {name: r["status"] for name, r in results.items()} == {
+        "current.lua": core.SCAN_CURRENT,
+        "invalid.lua": core.SCAN_INVALID,
+        "outdated.lua": core.SCAN_OUTDATED,
+        "unknown.lua": core.SCAN_UNKNOWN,
+    }
+    assert results["outdated.lua"]["changes"] == [
+        {"depot": "11", "old": "100", "new": "200"}
+    ]
+
+
+def test_update_records_the_full_branch_listing(tmp_path, fake_github, make_lua, index):
+    result = core.update_single_lua(
+        make_lua(570, depots=1),
+        TEST_REPO,
+        str(tmp_path / "out"),
+        lambda m, c: None,
+        manifest_index=index,
+    )
+    assert result["success"]
+    entry = index.get("570")
+    assert entry["repo"] == TEST_REPO
+    assert entry["depots"] == core.build_manifest_map(branch_manifest_names(570))
+
+
+def test_inventory_in_a_process_pool_matches_inline(tmp_path):
+    library = tmp_path / "library"
+    for game_id in range(30, 37):
+        _write(
+            library / f"{game_id}.lua",
+            f'addappid({game_id})\nsetManifestid({game_id + 1}, "{game_id}")\n',
+        )
+    _write(library / "dup" / "30.lua", "addappid(30)\n")
+
+    inline = core.inventory_lua_files([str(library)], workers=1)
+    pooled = core.inventory_lua_files([str(library)], workers=2, chunk_files=3)
+
+    assert pooled == inline
+    summary = core.summarize_lua_inventory(pooled)
+    assert (summary["files"], summary["games"], summary["manifests"]) == (8, 7, 7)
+    assert summary["duplicate_games"] == ["30"]
+
+
+def test_large_lua_files_are_read_through_mmap(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "LUA_MMAP_THRESHOLD", 16)
+    text = 'addappid(40)\n-- "ünïcode" padding\n' * 10
+    path = _write(tmp_path / "40.lua", text)
+    mapped = []
+    real_mmap = core.mmap.mmap
+
+    def tracking_mmap(*args, **kwargs):
+        mapped.append(args)
+        return real_mmap(*args, **kwargs)
+
+    monkeypatch.setattr(core.mmap, "mmap", tracking_mmap)
+    assert core.read_lua_text(path) == text
+    assert mapped
@@ -0,0 +1,81 @@
+"""Tests for the Lua rewrite engine and the helpers built on it."""
+
+import re
+
+import core
+
+
+def test_rewrite_keeps_quoting_spacing_and_extra_arguments():
+    content = (
+        "addappid(10)\n"
+        'setManifestid(11, "100", 0)\n'
+        "setManifestid( '12' ,  '200' )\n"
+        "setManifestid(13,300,1234)\n"
+    )
+    updated, changes = core.LuaRewriter().rewrite(
+        content, {"11": "101", "12": "201", "13": "300"}
+    )
+    assert updated == (
+        "addappid(10)\n"
+        'setManifestid(11, "101", 0)\n'
+        "setManifestid( '12' ,  '201' )\n"
+        "setManifestid(13,300,1234)\n"
+    )
+    assert [(c["app_id"], c["old"], c["new"]) for c in changes] == [
+        ("11", "100", "101"),
+        ("12", "200", "201"),
+    ]
+
+
+def test_calls_in_comments_and_strings_are_left_alone():
+    content = (
+        '-- setManifestid(11, "100")\n'
+        '--[[ setManifestid(11, "100") ]]\n'
+        "local s = 'setManifestid(11, \"100\")'\n"
+        'local t = [[setManifestid(11, "100")]]\n'
+        'obj.setManifestid(11, "100")\n'
+    )
+    updated, changes = core.LuaRewriter().rewrite(content, {"11": "999"})
+    assert updated == content
+    assert changes == []
+
+
+def test_unchanged_content_is_returned_as_is():
+    content = 'setManifestid(11, "100")\n'
+    updated, changes = core.LuaRewriter().rewrite(content, {"11": "100"})
+    assert updated is content
+    assert changes == []
+
+
+class _DepotSizeDirective(core.LuaDirective):
+    name = "setDepotSize"
+    rewrites = True
+
+    def parse(self, args):
+        match = re.fullmatch(r"\s*(\d+)\s*,\s*(\d+)\s*", args)
+        if not match:
+            return None
+        return {"app_id": match.group(1), "size": match.group(2)}
+
+    def rewrite(self, args, parsed, manifest_map):
+        if parsed["app_id"] not in manifest_map:
+            return None
+        return f"{parsed['app_id']}, 0"
+
+
+def test_custom_directives_are_scanned_and_rewritten():
+    rewriter = core.LuaRewriter([core.AddAppIdDirective(), _DepotSizeDirective()])
+    content = "addappid(10)\nsetDepotSize(11, 500)\nsetManifestid(11, 1)\n"
+    assert [name for name, _parsed, _match in rewriter.scan(content)] == [
+        "addappid",
+        "setDepotSize",
+    ]
+    updated, changes = rewriter.rewrite(content, {"11": "2"})
+    assert updated == "addappid(10)\nsetDepotSize(11, 0)\nsetManifestid(11, 1)\n"
+    assert len(changes) == 1
+
+
+def test_read_lua_manifests_and_depot_ids():
+    content = 'addappid(10)\naddappid(11, 1, "k")\nsetManifestid(11, "100")\n'
+    assert core.read_lua_manifests(content) == ("10", {"11": "100"})
+    assert core.lua_depot_ids(content) == {"10", "11"}
@@ -0,0 +1,62 @@
+"""Tests for the shared manifest store."""
+
+import os
+import zipfile
+
+import core
+from conftest import TEST_MANIFESTS, TEST_REPO
+
+
+def _quiet(message, color):
+    pass
+
+
+def _zip_names(path):
+    with zipfile.ZipFile(path) as zip_ref:
+        return sorted(zip_ref.namelist())
+
+
+def test_manifest_store_reuses_manifests_across_runs(tmp_path, fake_github, make_lua):
+    store = core.ManifestStore(str(tmp_path / "store"))
+    lua_path = make_lua(540)
+    for out in ("out1", "out2"):
+        result = core.update_single_lua(
+            lua_path, TEST_REPO, str(tmp_path / out), _quiet, manifest_store=store
+        )
+        assert result["success"], result["error"]
+    stats = store.stats()
+    assert stats["stored"] == TEST_MANIFESTS
+    assert stats["hits"] == TEST_MANIFESTS
+    assert _zip_names(tmp_path / "out2" / "540.zip") == _zip_names(
+        tmp_path / "out1" / "540.zip"
+    )
+
+
+def test_manifest_store_gc_keeps_pinned_blobs(tmp_path, capsys):
+    store = core.ManifestStore(str(tmp_path / "store"), max_bytes=250, grace_seconds=0)
+    with store.pinned():
+        for depot in range(1, 4):
+            store.put(f"{depot}_1.manifest", b"x" * 100)
+        assert len(os.listdir(store.cache_dir)) == 3
+    assert "over its" in capsys.readouterr().out
+    assert store.stats()["bytes"] <= 250
+    assert store.lookup("3_1.manifest") is not None
+
+
+def test_stored_manifests_are_not_fetched_again(tmp_path, fake_github, make_lua):
+    store = core.ManifestStore(str(tmp_path / "store"))
+    lua_path = make_lua(541)
+    for out in ("out1", "out2"):
+        result = core.update_single_lua(
+            lua_path,
+            TEST_REPO,
+            str(tmp_path / out),
+            _quiet,
+            ids_only=True,
+            manifest_store=store,
+        )
+        assert result["success"], result["error"]
+    fetched = [
+        path for path, _headers in fake_github.requests if path.endswith(".manifest")
+    ]
+    assert len(fetched) == TEST_MANIFESTS
@@ -0,0 +1,98 @@
+"""Tests for stage events, job fields and the metrics sinks."""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import core
+import metrics
+from conftest import TEST_MANIFEST_SIZE, TEST_REPO
+from pipeline import run_pipeline
+
+
+@pytest.fixture
+def events():
+    collected = []
+    metrics.add_sink(collected.append)
+    yield collected
+    metrics.remove_sink(collected.append)
+
+
+def test_stage_timer_emits_event_with_job_fields(events):
+    with metrics.job_context(game_id="10", lua_path="10.lua"):
+        with metrics.stage_timer(metrics.STAGE_ZIP, entries=2) as event:
+            event.update(ok=True, bytes=5)
+    with pytest.raises(RuntimeError):
+        with metrics.stage_timer(metrics.STAGE_REWRITE):
+            raise RuntimeError("boom")
+
+    zip_event, rewrite_event = events
+    assert zip_event["stage"] == "zip"
+    assert zip_event["game_id"] == "10"
+    assert zip_event["lua_path"] == "10.lua"
+    assert (zip_event["ok"], zip_event["bytes"], zip_event["entries"]) == (True, 5, 2)
+    assert rewrite_event["game_id"] is None
+    assert rewrite_event["ok"] is False
+
+
+def test_submit_in_context_carries_job_fields(events):
+    def emit_from_worker():
+        with metrics.stage_timer(metrics.STAGE_EXTRACT) as event:
+            event["thread"] = threading.get_ident()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with metrics.job_context(game_id="11"):
+            metrics.submit_in_context(executor, emit_from_worker).result()
+            executor.submit(emit_from_worker).result()
+
+    assert [event["game_id"] for event in events] == ["11", None]
+    assert events[0]["thread"] != threading.get_ident()
+
+
+def test_race_downloads_carry_job_fields(events, fake_github):
+    with metrics.job_context(game_id="620"):
+        repo, archive = core.race_repositories(["a/b"], "620", lambda m, c: None)
+        archive.close()
+    downloads = [e for e in events if e["stage"] == metrics.STAGE_DOWNLOAD]
+    assert downloads and all(e["game_id"] == "620" for e in downloads)
+
+
+def test_pipeline_emits_every_archive_stage(events, tmp_path, fake_github, make_lua):
+    (result,) = run_pipeline(
+        [make_lua(630, depots=2)],
+        TEST_REPO,
+        str(tmp_path / "out"),
+        status_callback=lambda m, c: None,
+    )
+    assert result["success"], result["error"]
+
+    by_stage = {event["stage"]: event for event in events}
+    assert set(by_stage) == {"download", "extract", "rewrite", "zip"}
+    extract = by_stage[metrics.STAGE_EXTRACT]
+    assert extract["ok"] and extract["game_id"] == "630"
+    assert (extract["entries"], extract["bytes"]) == (2, 2 * TEST_MANIFEST_SIZE)
+
+
+def test_aggregate_and_json_lines_sinks(tmp_path):
+    aggregate = metrics.AggregateSink()
+    log_path = tmp_path / "events.jsonl"
+    json_sink = metrics.JsonLinesSink(str(log_path))
+    for sink in (aggregate, json_sink):
+        metrics.add_sink(sink)
+    try:
+        for ok in (True, False):
+            with metrics.stage_timer(metrics.STAGE_DOWNLOAD, url=TEST_REPO) as event:
+                event.update(ok=ok, bytes=100)
+    finally:
+        for sink in (aggregate, json_sink):
+            metrics.remove_sink(sink)
+        json_sink.close()
+
+    totals = aggregate.snapshot()["download"]
+    assert (totals["runs"], totals["failed"], totals["bytes"]) == (2, 1, 200)
+    lines = log_path.read_text().splitlines()
+    assert [json.loads(line)["ok"] for line in lines] == [True, False]
+    text = aggregate.prometheus_text()
+    assert 'lmu_stage_runs_total{stage="download",result="failed"} 1' in text
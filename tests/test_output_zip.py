@@ -0,0 +1,117 @@
+"""Tests for write_output_zip and the raw entry helpers."""
+
+import functools
+import os
+import zipfile
+import zlib
+
+import pytest
+
+import core
+
+
+def _entries(contents):
+    return [
+        (name, zlib.crc32(data), lambda data=data: data)
+        for name, data in contents.items()
+    ]
+
+
+def _tracked(entries, loads):
+    """Wraps the loaders of ``entries`` to record the names they load."""
+
+    def load_and_record(name, load):
+        loads.append(name)
+        return load()
+
+    return [
+        (name, crc, functools.partial(load_and_record, name, load))
+        for name, crc, load in entries
+    ]
+
+
+def _quiet(message, color):
+    pass
+
+
+@pytest.fixture
+def no_raw_copy(monkeypatch):
+    monkeypatch.setattr(core, "_raw_copy_support", False)
+
+
+def test_unchanged_output_is_not_rebuilt(tmp_path):
+    path = str(tmp_path / "out.zip")
+    contents = {"1_1.manifest": b"m" * 100, "1.lua": b"lua"}
+    assert core.write_output_zip(path, _entries(contents), _quiet)
+    os.utime(path, (0, 0))
+    messages = []
+    loads = []
+    entries = _tracked(_entries(contents), loads)
+
+    assert core.write_output_zip(path, entries, lambda m, c: messages.append(m))
+    assert os.path.getmtime(path) == 0
+    assert loads == []
+    assert messages == ["out.zip is already up to date."]
+
+
+def test_changed_crc_rebuilds_and_loads_only_changed_entries(tmp_path):
+    path = str(tmp_path / "out.zip")
+    contents = {"1_1.manifest": b"m" * 100, "1.lua": b"old"}
+    assert core.write_output_zip(path, _entries(contents), _quiet)
+    contents["1.lua"] = b"new"
+    loads = []
+    entries = _tracked(_entries(contents), loads)
+    messages = []
+
+    assert core.write_output_zip(path, entries, lambda m, c: messages.append(m))
+    assert loads == ["1.lua"]
+    assert "(1 of 2 entries changed)" in messages[-1]
+    with zipfile.ZipFile(path) as zip_ref:
+        assert zip_ref.read("1.lua") == b"new"
+
+
+def test_default_policy_stores_manifests_and_deflates_lua(tmp_path):
+    path = str(tmp_path / "out.zip")
+    contents = {"1_1.manifest": b"m" * 1000, "1.lua": b"l" * 1000}
+    assert core.write_output_zip(path, _entries(contents), _quiet)
+    with zipfile.ZipFile(path) as zip_ref:
+        assert zip_ref.getinfo("1_1.manifest").compress_type == zipfile.ZIP_STORED
+        assert zip_ref.getinfo("1.lua").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_raw_copy_supported_on_this_python():
+    assert core.raw_copy_supported()
+
+
+@pytest.mark.parametrize("workers", [0, 3])
+def test_rebuild_with_raw_copies_passes_testzip(tmp_path, workers):
+    path = str(tmp_path / "out.zip")
+    contents = {f"{n}_1.manifest": bytes([n]) * 5000 for n in range(6)}
+    contents["1.lua"] = b"setManifestid(1, 1)\n" * 50
+    policy = core.compression_policy(manifest_method=zipfile.ZIP_DEFLATED)
+    assert core.write_output_zip(path, _entries(contents), _quiet, compression=policy)
+
+    contents["1.lua"] = b"setManifestid(1, 2)\n" * 50
+    assert core.write_output_zip(
+        path,
+        _entries(contents),
+        _quiet,
+        compression=policy,
+        compress_workers=workers,
+    )
+    with zipfile.ZipFile(path) as zip_ref:
+        assert zip_ref.testzip() is None
+        assert {name: zip_ref.read(name) for name in zip_ref.namelist()} == contents
+
+
+def test_rebuild_without_raw_copy_recompresses(tmp_path, no_raw_copy):
+    path = str(tmp_path / "out.zip")
+    contents = {"1_1.manifest": b"m" * 5000, "1.lua": b"old"}
+    assert core.write_output_zip(path, _entries(contents), _quiet)
+
+    contents["1.lua"] = b"new"
+    assert core.write_output_zip(path, _entries(contents), _quiet, compress_workers=2)
+    with zipfile.ZipFile(path) as zip_ref:
+        assert zip_ref.testzip() is None
+        assert zip_ref.read("1_1.manifest") == contents["1_1.manifest"]
+        assert zip_ref.read("1.lua") == b"new"
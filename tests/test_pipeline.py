@@ -0,0 +1,177 @@
+"""Tests for the asyncio update pipeline."""
+
+import asyncio
+import time
+import zipfile
+
+import pytest
+
+import pipeline
+from conftest import TEST_REPO, branch_manifest_names
+from pipeline import STAGE_DOWNLOAD, STAGE_REWRITE, UpdatePipeline, run_pipeline
+
+
+def _quiet(message, color="white"):
+    pass
+
+
+@pytest.mark.parametrize("ids_only", [False, True])
+def test_pipeline_updates_every_file(tmp_path, fake_github, make_lua, ids_only):
+    lua_paths = [make_lua(600), make_lua(601, depots=2)]
+    results = run_pipeline(
+        lua_paths,
+        TEST_REPO,
+        str(tmp_path / "out"),
+        status_callback=_quiet,
+        ids_only=ids_only,
+    )
+
+    assert [r["game_id"] for r in results] == ["600", "601"]
+    assert all(r["success"] for r in results), [r["error"] for r in results]
+    with zipfile.ZipFile(results[1]["output_path"]) as zip_ref:
+        assert sorted(zip_ref.namelist()) == sorted(
+            branch_manifest_names(601, depots=2) + ["601.lua"]
+        )
+
+
+class _StallingPipeline(UpdatePipeline):
+    """Downloads nothing; game 700 stalls long enough to time out."""
+
+    def _download_stage(self, job):
+        time.sleep(1.5 if job.game_id == "700" else 0.1)
+        job.report("stub download failed", "red")
+        return False
+
+
+def test_timeout_only_counts_time_spent_running(tmp_path, make_lua):
+    lua_paths = [make_lua(game_id) for game_id in (700, 701, 702)]
+    results = _StallingPipeline(
+        TEST_REPO,
+        str(tmp_path / "out"),
+        status_callback=_quiet,
+        stage_limits={STAGE_DOWNLOAD: 1},
+        stage_timeouts={STAGE_DOWNLOAD: 0.5},
+    ).run(lua_paths)
+
+    errors = {r["game_id"]: r["error"] for r in results}
+    assert "timed out" in errors["700"]
+    # The other jobs queued behind the stalled one, but did not time out.
+    assert errors["701"] == errors["702"] == "stub download failed"
+
+
+def test_cancel_reports_unfinished_jobs(tmp_path, make_lua):
+    pipeline = _StallingPipeline(
+        TEST_REPO,
+        str(tmp_path / "out"),
+        status_callback=_quiet,
+        stage_limits={STAGE_DOWNLOAD: 1},
+        progress_callback=lambda fraction: pipeline.cancel(),
+    )
+    results = pipeline.run([make_lua(game_id) for game_id in (704, 705, 706)])
+    assert pipeline.cancelled
+    assert not any(r["success"] for r in results)
+    assert results[-1]["error"] == "Cancelled."
+
+
+def test_job_callback_gets_each_files_messages(tmp_path, fake_github, make_lua):
+    lua_paths = [make_lua(610), make_lua(611)]
+    status = []
+    per_job = {}
+    results = run_pipeline(
+        lua_paths,
+        TEST_REPO,
+        str(tmp_path / "out"),
+        status_callback=lambda message, color: status.append(message),
+        job_callback=lambda lua_path, message, color: per_job.setdefault(
+            lua_path, []
+        ).append(message),
+    )
+
+    assert all(r["success"] for r in results), [r["error"] for r in results]
+    assert sorted(per_job) == sorted(lua_paths)
+    for game_id, lua_path in zip(("610", "611"), lua_paths):
+        assert f"Found Game ID: {game_id}" in per_job[lua_path]
+        assert f"[{game_id}.lua] Found Game ID: {game_id}" in status
+
+
+def test_unknown_stage_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        UpdatePipeline(TEST_REPO, str(tmp_path), stage_limits={"unzip": 1})
+
+
+def test_cancel_does_not_block_the_event_loop(tmp_path, make_lua):
+    stalled = _StallingPipeline(
+        TEST_REPO,
+        str(tmp_path / "out"),
+        status_callback=_quiet,
+        stage_limits={STAGE_DOWNLOAD: 1},
+    )
+    ticks = []
+
+    async def run():
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        ticking = asyncio.ensure_future(ticker())
+        asyncio.get_running_loop().call_later(0.2, stalled.cancel)
+        results = await stalled.run_async([make_lua(700)])
+        ticking.cancel()
+        return results
+
+    started = time.monotonic()
+    results = asyncio.run(run())
+    assert results[0]["error"] == "Cancelled."
+    # The stalled download thread runs for 1.5s after the cancel; the loop
+    # keeps ticking while the pipeline waits for it.
+    assert time.monotonic() - started >= 1.4
+    assert len([tick for tick in ticks if tick - started > 0.5]) >= 10
+
+
+class _ArchiveCountingPipeline(UpdatePipeline):
+    """Records how many jobs hold an archive whenever one is rewritten."""
+
+    peak = 0
+
+    def _rewrite_stage(self, job):
+        held = sum(1 for other in self._jobs if other.archive_slot is not None)
+        self.peak = max(self.peak, held)
+        time.sleep(0.05)
+        return super()._rewrite_stage(job)
+
+
+def test_archives_held_in_memory_are_bounded(tmp_path, fake_github, make_lua):
+    counting = _ArchiveCountingPipeline(
+        TEST_REPO,
+        str(tmp_path / "out"),
+        status_callback=_quiet,
+        stage_limits={STAGE_DOWNLOAD: 4, STAGE_REWRITE: 1},
+        max_archives=2,
+    )
+    results = counting.run([make_lua(game_id) for game_id in range(710, 716)])
+    assert all(r["success"] for r in results), [r["error"] for r in results]
+    assert counting.peak == 2
+    assert all(job.archive_slot is None for job in counting._jobs)
+
+
+def test_races_share_one_bounded_pool(tmp_path, fake_github, make_lua, monkeypatch):
+    executors = []
+    race_repositories = pipeline.race_repositories
+
+    def recording_race(*args, executor=None, **kwargs):
+        executors.append(executor)
+        return race_repositories(*args, executor=executor, **kwargs)
+
+    monkeypatch.setattr(pipeline, "race_repositories", recording_race)
+    results = run_pipeline(
+        [make_lua(game_id) for game_id in range(720, 724)],
+        TEST_REPO,
+        str(tmp_path / "out"),
+        status_callback=_quiet,
+        race_repos=["a/one", "b/two", "c/three"],
+        stage_limits={STAGE_DOWNLOAD: 2},
+    )
+    assert all(r["success"] for r in results), [r["error"] for r in results]
+    assert len(executors) == 4 and len(set(map(id, executors))) == 1
+    assert executors[0]._max_workers == 2
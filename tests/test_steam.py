@@ -0,0 +1,48 @@
+"""Tests for the Steam metadata cache and the widget parser."""
+
+import glob
+import os
+
+import pytest
+
+import core
+from conftest import REPO_ROOT
+
+WIDGET_FIXTURES = sorted(
+    glob.glob(os.path.join(REPO_ROOT, "bench", "fixtures", "steam_widget_*.html"))
+)
+
+
+def test_steam_info_cache_persists_until_ttl(tmp_path, monkeypatch):
+    cache = core.SteamInfoCache(str(tmp_path / "steam"), ttl=60)
+    cache.put("10", "Title", "Description", "http://img", b"png")
+
+    reloaded = core.SteamInfoCache(str(tmp_path / "steam"), ttl=60)
+    info = reloaded.get("10")
+    assert (info["title"], info["image"]) == ("Title", b"png")
+
+    now = core.time.time()
+    monkeypatch.setattr(core.time, "time", lambda: now + 61)
+    assert reloaded.get("10") is None
+    assert not (tmp_path / "steam" / "10.png").exists()
+
+
+def test_steam_info_cache_evicts_least_recently_used(tmp_path):
+    cache = core.SteamInfoCache(str(tmp_path / "steam"), max_entries=2)
+    cache.put("1", "One", "d", None)
+    cache.put("2", "Two", "d", None)
+    cache.get("1")
+    cache.put("3", "Three", "d", None)
+    assert cache.get("2") is None
+    assert cache.get("1") is not None and cache.get("3") is not None
+
+
+@pytest.mark.parametrize("path", WIDGET_FIXTURES, ids=os.path.basename)
+def test_fast_widget_parser_matches_beautifulsoup(path):
+    with open(path, "r", encoding="utf-8") as f:
+        html = f.read()
+    assert core._parse_steam_widget_fast(html) == core._parse_steam_widget_bs4(html)
+
+
+def test_widget_without_desc_block_has_no_info():
+    assert core.parse_steam_widget("<html><body></body></html>", "10") is None
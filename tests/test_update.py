@@ -0,0 +1,212 @@
+"""End-to-end tests of update_single_lua and batch_update against a fake GitHub."""
+
+import io
+import os
+import threading
+import zipfile
+
+import pytest
+
+import core
+from conftest import TEST_MANIFESTS, TEST_REPO, branch_manifest_names
+
+
+def _quiet(message, color):
+    pass
+
+
+def _zip_names(path):
+    with zipfile.ZipFile(path) as zip_ref:
+        assert zip_ref.testzip() is None
+        return sorted(zip_ref.namelist())
+
+
+def _archive_requests(fake_github, game_id):
+    # Filtered by branch: downloads of a cancelled race may still be arriving.
+    suffix = f"/archive/refs/heads/{game_id}.zip"
+    return [path for path, _headers in fake_github.requests if path.endswith(suffix)]
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_update_rewrites_lua_and_zips_manifests(
+    tmp_path, fake_github, make_lua, in_memory
+):
+    lua_path = make_lua(500)
+    result = core.update_single_lua(
+        lua_path, TEST_REPO, str(tmp_path / "out"), _quiet, in_memory=in_memory
+    )
+
+    assert result["success"], result["error"]
+    assert result["game_id"] == "500"
+    names = branch_manifest_names(500)
+    assert _zip_names(result["output_path"]) == sorted(names + ["500.lua"])
+    with zipfile.ZipFile(result["output_path"]) as zip_ref:
+        lua = zip_ref.read("500.lua").decode()
+    for name in names:
+        depot, manifest_id = core.parse_manifest_name(name)
+        assert f'setManifestid({depot}, "{manifest_id}", 0)' in lua
+
+
+def test_in_memory_update_skips_the_temp_dir(
+    tmp_path, fake_github, make_lua, monkeypatch
+):
+    def no_temp_dir(*args, **kwargs):
+        raise AssertionError("in-memory updates must not create a temp dir")
+
+    monkeypatch.setattr(core.tempfile, "mkdtemp", no_temp_dir)
+    result = core.update_single_lua(
+        make_lua(501), TEST_REPO, str(tmp_path / "out"), _quiet, in_memory=True
+    )
+    assert result["success"], result["error"]
+    assert result["changed"] is True
+
+
+def test_batch_update_reports_every_file(tmp_path, fake_github, make_lua):
+    make_lua(510)
+    make_lua(511)
+    (tmp_path / "lua" / "broken.lua").write_text("-- no game id\n")
+
+    results = core.batch_update(
+        [str(tmp_path / "lua")],
+        TEST_REPO,
+        str(tmp_path / "out"),
+        max_workers=2,
+        status_callback=_quiet,
+    )
+
+    by_name = {os.path.basename(r["lua_path"]): r for r in results}
+    assert by_name["510.lua"]["success"] and by_name["511.lua"]["success"]
+    assert not by_name["broken.lua"]["success"]
+    assert "Game ID not found" in by_name["broken.lua"]["error"]
+    assert "Succeeded: 2  Failed: 1" in core.format_batch_report(results)
+
+
+def test_find_lua_files_searches_folders_once(tmp_path):
+    for relative in ("b.lua", "a.LUA", "sub/c.lua", "notes.txt"):
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+    single = str(tmp_path / "b.lua")
+
+    found = core.find_lua_files([single, str(tmp_path), str(tmp_path / "notes.txt")])
+    assert [os.path.relpath(p, tmp_path) for p in found] == [
+        "b.lua",
+        "a.LUA",
+        os.path.join("sub", "c.lua"),
+    ]
+
+
+def test_ids_only_fetches_files_without_the_archive(tmp_path, fake_github, make_lua):
+    result = core.update_single_lua(
+        make_lua(520), TEST_REPO, str(tmp_path / "out"), _quiet, ids_only=True
+    )
+    assert result["success"], result["error"]
+    assert _zip_names(result["output_path"]) == sorted(
+        branch_manifest_names(520) + ["520.lua"]
+    )
+    assert _archive_requests(fake_github, 520) == []
+
+
+def test_ids_only_dry_run_writes_nothing(tmp_path, fake_github, make_lua):
+    result = core.update_single_lua(
+        make_lua(521),
+        TEST_REPO,
+        str(tmp_path / "out"),
+        _quiet,
+        ids_only=True,
+        dry_run=True,
+    )
+    assert result["success"]
+    assert result["changed"] is True
+    assert result["output_path"] is None
+    assert not (tmp_path / "out" / "521.zip").exists()
+
+
+def test_race_returns_a_valid_archive(fake_github):
+    raced = core.race_repositories(["a/one", "b/two"], "530", _quiet)
+    assert raced is not None
+    repo, archive = raced
+    with archive, zipfile.ZipFile(archive) as zip_ref:
+        assert repo in ("a/one", "b/two")
+        assert len(core.list_manifest_entries(zip_ref)) == TEST_MANIFESTS
+
+
+def test_cancelled_race_returns_none(fake_github):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    assert (
+        core.race_repositories(["a/one"], "531", _quiet, cancel_event=cancel_event)
+        is None
+    )
+
+
+def test_race_dry_run_writes_nothing(tmp_path, fake_github, make_lua):
+    result = core.update_single_lua(
+        make_lua(532),
+        TEST_REPO,
+        str(tmp_path / "out"),
+        _quiet,
+        ids_only=True,
+        dry_run=True,
+        race_repos=["a/one", "b/two"],
+    )
+    assert result["success"], result["error"]
+    assert result["changed"] is True
+    assert result["output_path"] is None
+    assert not (tmp_path / "out").exists()
+    assert _archive_requests(fake_github, 532) == []
+
+
+def test_extraction_limits_reject_oversized_archives(tmp_path, fake_github, make_lua):
+    core.configure_extraction(max_entries=TEST_MANIFESTS - 1)
+    try:
+        result = core.update_single_lua(
+            make_lua(550), TEST_REPO, str(tmp_path / "out"), _quiet, include_extras=True
+        )
+    finally:
+        core.configure_extraction(max_entries=core.ARCHIVE_MAX_ENTRIES)
+    assert not result["success"]
+    assert "exceed the limit" in result["error"]
+
+
+def test_select_manifest_entries_checks_declared_sizes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_ref:
+        zip_ref.writestr("1_1.manifest", b"x" * 1000)
+        zip_ref.writestr("../2_1.manifest", b"x")
+    core.configure_extraction(max_bytes=999)
+    try:
+        with zipfile.ZipFile(buffer) as zip_ref:
+            with pytest.raises(core.ArchiveLimitError):
+                core.select_manifest_entries(zip_ref)
+            assert [e.filename for e in core.list_manifest_entries(zip_ref)] == [
+                "1_1.manifest"
+            ]
+    finally:
+        core.configure_extraction(max_bytes=core.ARCHIVE_MAX_BYTES)
+
+
+@pytest.mark.parametrize("ids_only", [False, True])
+def test_only_referenced_depots_are_zipped(tmp_path, fake_github, make_lua, ids_only):
+    result = core.update_single_lua(
+        make_lua(560, depots=2),
+        TEST_REPO,
+        str(tmp_path / "out"),
+        _quiet,
+        ids_only=ids_only,
+    )
+    assert result["success"], result["error"]
+    assert _zip_names(result["output_path"]) == sorted(
+        branch_manifest_names(560, depots=2) + ["560.lua"]
+    )
+
+
+def test_include_extras_zips_every_manifest(tmp_path, fake_github, make_lua):
+    result = core.update_single_lua(
+        make_lua(561, depots=2),
+        TEST_REPO,
+        str(tmp_path / "out"),
+        _quiet,
+        include_extras=True,
+    )
+    assert len(_zip_names(result["output_path"])) == TEST_MANIFESTS + 1